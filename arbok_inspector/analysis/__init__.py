@@ -1,2 +1,6 @@
 from .analysis_base import AnalysisBase
-from .prepare_data import prepare_and_avg_data
+from .prepare_data import (
+    prepare_and_avg_data,
+    prepare_and_avg_data_batch,
+    load_run_dataset
+)
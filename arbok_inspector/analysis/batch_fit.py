@@ -0,0 +1,325 @@
+"""
+Module containing the BatchFit class fitting models along one dimension.
+
+Instead of fitting every pixel of a data-array in a Python loop, all 1D traces
+along the fit dimension are fitted at once with a batched Levenberg-Marquardt
+least squares solver. Every iteration evaluates the model, its Jacobian and
+solves the normal equations for all traces with vectorized numpy operations.
+Traces that converged are dropped from the active set, the others keep their
+individual damping parameter. Traces whose damping explodes are dropped as
+well, but are not reported as converged.
+"""
+from __future__ import annotations
+from typing import Callable
+
+import numpy as np
+import xarray as xr
+
+from arbok_inspector.analysis.analysis_base import AnalysisBase
+
+class FitModel:
+    """Model function with parameter names and a vectorized initial guess"""
+    def __init__(
+            self,
+            name: str,
+            param_names: list[str],
+            function: Callable[[np.ndarray, np.ndarray], np.ndarray],
+            guess: Callable[[np.ndarray, np.ndarray], np.ndarray],
+            expression: str = ''
+            ):
+        """
+        Constructor for FitModel class
+
+        Args:
+            name (str): Name of the model
+            param_names (list[str]): Names of the fit parameters
+            function (Callable): Takes x of shape (M,) and parameters of shape
+                (N, P) and returns the model of shape (N, M)
+            guess (Callable): Takes x of shape (M,) and y of shape (N, M) and
+                returns initial parameters of shape (N, P)
+            expression (str): Human readable model expression
+        """
+        self.name = name
+        self.param_names = param_names
+        self.function = function
+        self.guess = guess
+        self.expression = expression
+
+def _rabi(x, p):
+    amplitude, frequency, phase, offset = (p[:, [i]] for i in range(4))
+    return amplitude * np.cos(2*np.pi*frequency*x + phase) + offset
+
+def _ramsey(x, p):
+    amplitude, frequency, phase, t2, offset = (p[:, [i]] for i in range(5))
+    return amplitude * np.exp(-x/t2) * np.cos(2*np.pi*frequency*x + phase) + offset
+
+def _t1(x, p):
+    amplitude, t1, offset = (p[:, [i]] for i in range(3))
+    return amplitude * np.exp(-x/t1) + offset
+
+def _guess_oscillation(x, y):
+    """Guess amplitude, frequency, phase and offset from the FFT peak"""
+    n_points = x.size
+    offset = np.nanmean(y, axis=1)
+    centered = np.nan_to_num(y - offset[:, None])
+    dx = (x[-1] - x[0]) / max(n_points - 1, 1)
+    spectrum = np.fft.rfft(centered, axis=1)
+    freqs = np.fft.rfftfreq(n_points, dx if dx != 0 else 1.)
+    peak = np.argmax(np.abs(spectrum[:, 1:]), axis=1) + 1
+    peak_values = spectrum[np.arange(len(peak)), peak]
+    frequency = freqs[peak]
+    amplitude = 2 * np.abs(peak_values) / n_points
+    phase = np.angle(peak_values) - 2*np.pi*frequency*x[0]
+    return amplitude, frequency, phase, offset
+
+def _guess_rabi(x, y):
+    amplitude, frequency, phase, offset = _guess_oscillation(x, y)
+    return np.stack([amplitude, frequency, phase, offset], axis=1)
+
+def _guess_ramsey(x, y):
+    amplitude, frequency, phase, offset = _guess_oscillation(x, y)
+    t2 = np.full_like(amplitude, (x[-1] - x[0]) / 2)
+    return np.stack([2*amplitude, frequency, phase, t2, offset], axis=1)
+
+def _guess_t1(x, y):
+    n_tail = max(1, x.size // 10)
+    offset = np.nanmean(y[:, -n_tail:], axis=1)
+    amplitude = np.nanmean(y[:, :n_tail], axis=1) - offset
+    t1 = np.full_like(amplitude, (x[-1] - x[0]) / 3)
+    return np.stack([amplitude, t1, offset], axis=1)
+
+FIT_MODELS: dict[str, FitModel] = {
+    'rabi': FitModel(
+        'rabi',
+        ['amplitude', 'frequency', 'phase', 'offset'],
+        _rabi, _guess_rabi,
+        'A cos(2 pi f x + phi) + c'),
+    'ramsey': FitModel(
+        'ramsey',
+        ['amplitude', 'frequency', 'phase', 't2', 'offset'],
+        _ramsey, _guess_ramsey,
+        'A exp(-x/T2) cos(2 pi f x + phi) + c'),
+    't1': FitModel(
+        't1',
+        ['amplitude', 't1', 'offset'],
+        _t1, _guess_t1,
+        'A exp(-x/T1) + c'),
+}
+
+class BatchFit(AnalysisBase):
+    """
+    Fits a model along one dimension of a data-array for every index of the
+    remaining dimensions at once.
+    """
+    def __init__(
+            self,
+            xr_data: xr.DataArray,
+            model: str | FitModel,
+            fit_axis: str,
+            run_id: int | None = None
+            ):
+        """
+        Constructor for BatchFit class
+
+        Args:
+            xr_data (xr.DataArray): Data to fit
+            model (str | FitModel): Model or name of a model in FIT_MODELS
+            fit_axis (str): Dimension (or keyword of the dimension) to fit along
+            run_id (int | None): Run ID of the data, taken from attrs if None
+        """
+        self.xr_data = xr_data
+        self.run_id = run_id if run_id is not None else xr_data.attrs.get('run_id')
+        if isinstance(model, str):
+            if model not in FIT_MODELS:
+                raise ValueError(
+                    f"Model must be one of {list(FIT_MODELS)}. Is {model}")
+            model = FIT_MODELS[model]
+        self.model: FitModel = model
+        if fit_axis in xr_data.dims:
+            self.fit_dim: str = fit_axis
+        else:
+            self.fit_dim: str = self.find_axis_from_keyword(fit_axis)
+        self.fit_result: xr.Dataset | None = None
+
+    def fit(
+            self,
+            p0: dict[str, float] | None = None,
+            max_iter: int = 200,
+            tol: float = 1e-8
+            ) -> xr.Dataset:
+        """
+        Fit the model to all traces.
+
+        Args:
+            p0 (dict | None): Initial values overriding the automatic guess
+            max_iter (int): Maximum number of iterations
+            tol (float): Relative change of the cost at which a trace converged
+        Returns:
+            fit_result (xr.Dataset): Parameter maps, their standard errors,
+                the r-squared and the convergence of every trace
+        """
+        x, y, map_dims, map_coords, map_shape = self._get_traces()
+        params = self.model.guess(x, y)
+        for name, value in (p0 or {}).items():
+            params[:, self.model.param_names.index(name)] = value
+        params, stderr, r_squared, converged = levenberg_marquardt(
+            self.model.function, x, y, params, max_iter = max_iter, tol = tol)
+        data_vars = {}
+        for i, name in enumerate(self.model.param_names):
+            data_vars[name] = (map_dims, params[:, i].reshape(map_shape))
+            data_vars[f'{name}_stderr'] = (map_dims, stderr[:, i].reshape(map_shape))
+        data_vars['r_squared'] = (map_dims, r_squared.reshape(map_shape))
+        data_vars['converged'] = (map_dims, converged.reshape(map_shape))
+        self.fit_result = xr.Dataset(
+            data_vars,
+            coords = map_coords,
+            attrs = {
+                'model': self.model.name,
+                'expression': self.model.expression,
+                'fit_dim': self.fit_dim,
+                'run_id': self.run_id if self.run_id is not None else -1,
+            }
+        )
+        return self.fit_result
+
+    def evaluate(self, fit_result: xr.Dataset | None = None) -> xr.DataArray:
+        """
+        Evaluate the fitted model on the coordinates of the fit dimension.
+
+        Args:
+            fit_result (xr.Dataset | None): Result to evaluate, the last one if None
+        Returns:
+            best_fit (xr.DataArray): Model with the same dims as the data
+        """
+        if fit_result is None:
+            fit_result = self.fit_result
+        if fit_result is None:
+            raise ValueError("No fit result available, call fit() first")
+        x, _, map_dims, _, map_shape = self._get_traces()
+        params = np.stack(
+            [fit_result[name].values.reshape(-1) for name in self.model.param_names],
+            axis = 1)
+        best_fit = self.model.function(x, params).reshape(*map_shape, x.size)
+        data = self.xr_data.transpose(*map_dims, self.fit_dim)
+        return data.copy(data = best_fit).transpose(*self.xr_data.dims)
+
+    def _get_traces(self):
+        """Reshape the data into traces of shape (N, M) along the fit dim"""
+        map_dims = [dim for dim in self.xr_data.dims if dim != self.fit_dim]
+        data = self.xr_data.transpose(*map_dims, self.fit_dim)
+        if self.fit_dim in data.coords:
+            x = np.asarray(data[self.fit_dim].values, dtype=float)
+        else:
+            x = np.arange(data.sizes[self.fit_dim], dtype=float)
+        map_shape = tuple(data.sizes[dim] for dim in map_dims)
+        y = np.asarray(data.values, dtype=float).reshape(-1, x.size)
+        map_coords = {
+            name: coord for name, coord in data.coords.items()
+            if self.fit_dim not in coord.dims
+        }
+        return x, y, map_dims, map_coords, map_shape
+
+def levenberg_marquardt(
+        function: Callable[[np.ndarray, np.ndarray], np.ndarray],
+        x: np.ndarray,
+        y: np.ndarray,
+        p0: np.ndarray,
+        max_iter: int = 200,
+        tol: float = 1e-8,
+        lambda_0: float = 1e-3
+        ) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Batched Levenberg-Marquardt least squares fit of N traces at once.
+    NaN values in y are ignored.
+
+    Args:
+        function (Callable): Model taking x (M,) and parameters (N, P)
+        x (np.ndarray): Coordinates of shape (M,)
+        y (np.ndarray): Data of shape (N, M)
+        p0 (np.ndarray): Initial parameters of shape (N, P)
+        max_iter (int): Maximum number of iterations
+        tol (float): Relative change of the cost at which a trace converged
+        lambda_0 (float): Initial damping parameter
+    Returns:
+        params (np.ndarray): Fitted parameters of shape (N, P)
+        stderr (np.ndarray): Standard errors of the parameters (N, P)
+        r_squared (np.ndarray): Coefficient of determination (N,)
+        converged (np.ndarray): Whether the fit of a trace converged (N,)
+    """
+    ### Trial steps may overflow the model, these steps are simply rejected
+    with np.errstate(over='ignore', invalid='ignore', divide='ignore'):
+        weights = np.isfinite(y).astype(float)
+        y = np.where(weights > 0, y, 0.)
+        params = np.array(p0, dtype=float)
+        n_traces, n_params = params.shape
+        residuals = (y - function(x, params)) * weights
+        cost = np.sum(residuals**2, axis=1)
+        damping = np.full(n_traces, lambda_0)
+        converged = np.zeros(n_traces, dtype=bool)
+        active = np.isfinite(cost) & np.all(np.isfinite(params), axis=1)
+        scale = np.maximum(np.nanmax(np.abs(params), axis=0), 1e-12)
+        for _ in range(max_iter):
+            idx = np.flatnonzero(active)
+            if idx.size == 0:
+                break
+            jac = _jacobian(function, x, params[idx], scale) * weights[idx, :, None]
+            jtj = np.einsum('nmp,nmq->npq', jac, jac)
+            gradient = np.einsum('nmp,nm->np', jac, residuals[idx])
+            diagonal = np.maximum(np.diagonal(jtj, axis1=1, axis2=2), 1e-300)
+            system = jtj + damping[idx, None, None] * np.eye(n_params) * diagonal[:, None, :]
+            step = _batched_solve(system, gradient)
+            new_params = params[idx] + step
+            new_residuals = (y[idx] - function(x, new_params)) * weights[idx]
+            new_cost = np.sum(new_residuals**2, axis=1)
+            improved = np.isfinite(new_cost) & (new_cost < cost[idx])
+
+            better = idx[improved]
+            relative_change = (cost[better] - new_cost[improved]) / np.maximum(cost[better], 1e-300)
+            params[better] = new_params[improved]
+            residuals[better] = new_residuals[improved]
+            cost[better] = new_cost[improved]
+            damping[idx] = np.where(improved, damping[idx] / 10, damping[idx] * 10)
+
+            done = better[relative_change < tol]
+            converged[done] = True
+            active[done] = False
+            ### Damping exploded: no step improves the cost anymore, the fit
+            ### is stopped without having converged
+            stuck = idx[damping[idx] > 1e12]
+            active[stuck] = False
+
+        stderr = _standard_errors(function, x, params, weights, cost, scale)
+        total = np.sum(
+            ((y - _masked_mean(y, weights)[:, None]) * weights)**2, axis=1)
+        r_squared = 1 - cost / total
+        return params, stderr, r_squared, converged
+
+def _jacobian(function, x, params, scale):
+    """Forward difference Jacobian of shape (N, M, P)"""
+    base = function(x, params)
+    jac = np.empty(base.shape + (params.shape[1],))
+    for i in range(params.shape[1]):
+        step = 1e-7 * np.maximum(np.abs(params[:, i]), scale[i] * 1e-3)
+        shifted = params.copy()
+        shifted[:, i] += step
+        jac[:, :, i] = (function(x, shifted) - base) / step[:, None]
+    return jac
+
+def _batched_solve(system: np.ndarray, rhs: np.ndarray) -> np.ndarray:
+    """Solve a batch of linear systems, zero step for singular ones"""
+    try:
+        return np.linalg.solve(system, rhs[..., None])[..., 0]
+    except np.linalg.LinAlgError:
+        return np.einsum('npq,nq->np', np.linalg.pinv(system), rhs)
+
+def _standard_errors(function, x, params, weights, cost, scale):
+    """Standard errors from the covariance estimate (J^T J)^-1 * s^2"""
+    jac = _jacobian(function, x, params, scale) * weights[:, :, None]
+    jtj = np.einsum('nmp,nmq->npq', jac, jac)
+    dof = np.maximum(weights.sum(axis=1) - params.shape[1], 1)
+    covariance = np.linalg.pinv(jtj) * (cost / dof)[:, None, None]
+    return np.sqrt(np.abs(np.diagonal(covariance, axis1=1, axis2=2)))
+
+def _masked_mean(y, weights):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.sum(y * weights, axis=1) / np.sum(weights, axis=1)
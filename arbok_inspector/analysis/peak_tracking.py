@@ -0,0 +1,143 @@
+"""
+Module containing the PeakTracker class tracking peaks or dips along one dim.
+
+Instead of slicing a spectroscopy map in a Python loop, the extremum of every
+trace along the tracked dim is found with a single vectorized argmax over all
+traces. The position is refined below the coordinate spacing by fitting a
+parabola through the extremum and its two neighbours.
+"""
+from __future__ import annotations
+from typing import TYPE_CHECKING
+
+import numpy as np
+import xarray as xr
+
+from arbok_inspector.analysis.analysis_base import AnalysisBase
+from arbok_inspector.analysis.prepare_data import prepare_and_avg_data
+
+if TYPE_CHECKING:
+    from qcodes.dataset.data_set import DataSet
+
+PEAK_KINDS = ['peak', 'dip']
+
+class PeakTracker(AnalysisBase):
+    """
+    Tracks the position of a peak or dip along one dimension for every index
+    of the remaining dimensions, e.g. a resonance frequency versus a swept
+    parameter.
+    """
+    def __init__(
+            self,
+            run: int | DataSet | xr.Dataset | xr.DataArray,
+            track_axis: str,
+            readout_name: str | None = None,
+            kind: str = 'peak',
+            avg_axes: str | list = 'auto'
+            ):
+        """
+        Constructor for PeakTracker class
+
+        Args:
+            run (int | DataSet | xr.Dataset | xr.DataArray): Data to track, see
+                `prepare_and_avg_data`
+            track_axis (str): Dimension (or keyword of the dimension) to find
+                the peak along
+            readout_name (str | None): Name of (or keyword for) the readout
+                observable, only needed if run is not a data-array
+            kind (str): 'peak' to track maxima, 'dip' to track minima
+            avg_axes (str | list): Axes to average over, see `avg_dataarray`
+        """
+        if kind not in PEAK_KINDS:
+            raise ValueError(f"Kind must be one of {PEAK_KINDS}. Is {kind}")
+        self.kind: str = kind
+        self.run_id, self.xr_data, _ = prepare_and_avg_data(
+            run, readout_name, avg_axes)
+        if self.run_id is None:
+            self.run_id = self.xr_data.attrs.get('run_id')
+        if track_axis in self.xr_data.dims:
+            self.track_dim: str = track_axis
+        else:
+            self.track_dim: str = self.find_axis_from_keyword(track_axis)
+        self.track_result: xr.Dataset | None = None
+
+    def track(self) -> xr.Dataset:
+        """
+        Find the peak or dip of all traces. Traces without finite values give
+        NaN positions.
+
+        Returns:
+            track_result (xr.Dataset): 'position' of the extremum in units of
+                the tracked coordinate, its interpolated 'value', the 'index'
+                of the extremal point and the 'prominence' of the extremum
+                relative to the median of its trace
+        """
+        other_dims = [dim for dim in self.xr_data.dims if dim != self.track_dim]
+        data = self.xr_data.transpose(*other_dims, self.track_dim)
+        n_points = data.sizes[self.track_dim]
+        if self.track_dim in data.coords:
+            x = np.asarray(data[self.track_dim].values, dtype=float)
+        else:
+            x = np.arange(n_points, dtype=float)
+        map_shape = tuple(data.sizes[dim] for dim in other_dims)
+        sign = 1. if self.kind == 'peak' else -1.
+        y = sign * np.asarray(data.values, dtype=float).reshape(-1, n_points)
+        position, value, index, prominence = find_extrema(x, y)
+        self.track_result = xr.Dataset(
+            {
+                'position': (other_dims, position.reshape(map_shape)),
+                'value': (other_dims, sign * value.reshape(map_shape)),
+                'index': (other_dims, index.reshape(map_shape)),
+                'prominence': (other_dims, prominence.reshape(map_shape)),
+            },
+            coords = {
+                name: coord for name, coord in data.coords.items()
+                if self.track_dim not in coord.dims
+            },
+            attrs = {
+                'kind': self.kind,
+                'track_dim': self.track_dim,
+                'run_id': self.run_id if self.run_id is not None else -1,
+            }
+        )
+        if self.track_dim in data.coords:
+            self.track_result['position'].attrs = data[self.track_dim].attrs
+        return self.track_result
+
+def find_extrema(
+        x: np.ndarray, y: np.ndarray
+        ) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Find the maximum of N traces at once with sub-bin parabolic interpolation.
+    NaN values in y are ignored.
+
+    Args:
+        x (np.ndarray): Coordinates of shape (M,)
+        y (np.ndarray): Data of shape (N, M)
+    Returns:
+        position (np.ndarray): Interpolated positions of the maxima (N,)
+        value (np.ndarray): Interpolated values at the maxima (N,)
+        index (np.ndarray): Index of the maximal data point (N,)
+        prominence (np.ndarray): Maximum above the median of the trace (N,)
+    """
+    n_traces, n_points = y.shape
+    finite = np.isfinite(y)
+    has_data = finite.any(axis=1)
+    index = np.argmax(np.where(finite, y, -np.inf), axis=1)
+    rows = np.arange(n_traces)
+    center = y[rows, index]
+    ### Neighbours at the edges are mirrored, which keeps the edge point
+    left = y[rows, np.where(index > 0, index - 1, np.minimum(index + 1, n_points - 1))]
+    right = y[rows, np.where(index < n_points - 1, index + 1, np.maximum(index - 1, 0))]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        curvature = left - 2*center + right
+        offset = np.where(
+            np.isfinite(curvature) & (curvature < 0),
+            0.5 * (left - right) / curvature, 0.)
+        offset = np.clip(offset, -0.5, 0.5)
+        value = np.where(offset != 0, center - 0.25 * (left - right) * offset, center)
+        prominence = center - np.nanmedian(np.where(has_data[:, None], y, 0.), axis=1)
+    position = np.interp(index + offset, np.arange(n_points), x)
+    position = np.where(has_data, position, np.nan)
+    value = np.where(has_data, value, np.nan)
+    prominence = np.where(has_data, prominence, np.nan)
+    return position, value, index, prominence
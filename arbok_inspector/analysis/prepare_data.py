@@ -1,10 +1,20 @@
 """Module containing prepare_data function for analysis tools"""
+from __future__ import annotations
+from typing import TYPE_CHECKING, Iterable
+
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 
-from matplotlib.pylab import f
-from qcodes.dataset.data_set import load_by_id, DataSet
 import xarray as xr
 import numpy as np
-import matplotlib.pyplot as plt
+
+from arbok_inspector.classes.dataset_cache import dataset_cache
+from arbok_inspector.classes.change_detector import get_change_detector
+
+if TYPE_CHECKING:
+    from qcodes.dataset.data_set import DataSet
+
+DEFAULT_BATCH_MAX_WORKERS = 8
 
 def prepare_and_avg_data(
     run: int | DataSet | xr.Dataset | xr.DataArray,
@@ -26,21 +36,23 @@ def prepare_and_avg_data(
     xdata_array = None
     if avg_axes is None:
         avg_axes = []
-    if isinstance(run, int):
-        data = load_by_id(run)
-        xdataset = data.to_xarray_dataset()
-        run_id = run
-    elif isinstance(run, DataSet):
-        data = run
-        run_id = data.run_id
-        xdataset = data.to_xarray_dataset()
-    elif isinstance(run, xr.Dataset):
+    ### qcodes is only imported if the data is not given as xarray object
+    if isinstance(run, xr.Dataset):
         xdataset = run
         run_id = xdataset.attrs['run_id']
     elif isinstance(run, xr.DataArray):
         xdataset = None
         xdata_array = run
         run_id = None
+    elif isinstance(run, int):
+        from qcodes.dataset.data_set import load_by_id
+        data = load_by_id(run)
+        xdataset = data.to_xarray_dataset()
+        run_id = run
+    elif _is_qcodes_dataset(run):
+        data = run
+        run_id = data.run_id
+        xdataset = data.to_xarray_dataset()
     else:
         raise ValueError(
             "Invalid input type for run. "
@@ -56,6 +68,104 @@ def prepare_and_avg_data(
     np_data = xdata_array.to_numpy()
     return run_id, xdata_array, np_data
 
+def prepare_and_avg_data_batch(
+    runs: Iterable[int],
+    readout_name: str,
+    avg_axes: str | list = 'auto',
+    align: bool = False,
+    max_workers: int = DEFAULT_BATCH_MAX_WORKERS,
+    db_path: str | Path | None = None,
+    use_cache: bool = True
+    ) -> tuple[list[int], xr.DataArray, np.ndarray]:
+    """
+    Batched version of `prepare_and_avg_data` for many runs. The runs are
+    loaded concurrently on a bounded thread pool, averaged one by one and
+    concatenated along a new 'run_id' dimension. Loaded datasets are kept in
+    the shared dataset cache, so repeated calls only load runs that changed.
+    
+    Args:
+        runs (Iterable[int]): Run ids, e.g. a list or a range
+        readout_name (str): Name of (or keyword for) the readout observable
+        avg_axes (str | list): Axes to average over, see `avg_dataarray`
+        align (bool): If True the coordinates of the runs are aligned with an
+            outer join (missing values are NaN). Otherwise all runs must have
+            the same shape and the coordinates of the first run are used
+        max_workers (int): Maximum number of runs loaded at the same time
+        db_path (str | Path | None): QCoDeS database, the configured one if None
+        use_cache (bool): Whether to use the shared dataset cache
+    Returns:
+        run_ids (list[int]): The run ids along the 'run_id' dimension
+        xdata_array (xr.DataArray): Averaged data of all runs
+        np_data (np.ndarray): Numpy array of the averaged data
+    """
+    run_ids = [int(run_id) for run_id in runs]
+    if len(run_ids) == 0:
+        raise ValueError("No run ids given")
+    if db_path is None:
+        db_path = _default_database_path()
+
+    def prepare_run(run_id: int) -> xr.DataArray:
+        xdataset = load_run_dataset(run_id, db_path, use_cache)
+        _, xdata_array, _ = prepare_and_avg_data(xdataset, readout_name, avg_axes)
+        return xdata_array
+
+    with ThreadPoolExecutor(max_workers=max(1, int(max_workers))) as executor:
+        xdata_arrays = list(executor.map(prepare_run, run_ids))
+    join = 'outer' if align else 'override'
+    xdata_array = xr.concat(
+        xdata_arrays,
+        dim = 'run_id',
+        join = join,
+        coords = 'minimal',
+        compat = 'override',
+        combine_attrs = 'drop_conflicts'
+    ).assign_coords(run_id = run_ids)
+    np_data = xdata_array.to_numpy()
+    return run_ids, xdata_array, np_data
+
+def load_run_dataset(
+        run_id: int,
+        db_path: str | Path | None = None,
+        use_cache: bool = True
+        ) -> xr.Dataset:
+    """
+    Load the xarray dataset of a run from a QCoDeS database. Cached datasets
+    are reused as long as no new results were written to the run.
+
+    Args:
+        run_id (int): Run id to load
+        db_path (str | Path | None): QCoDeS database, the configured one if None
+        use_cache (bool): Whether to use the shared dataset cache
+    Returns:
+        xdataset (xr.Dataset): Dataset of the run
+    """
+    if db_path is None:
+        db_path = _default_database_path()
+    db_path = Path(db_path)
+
+    def load() -> xr.Dataset:
+        from qcodes.dataset.data_set import load_by_id
+        from qcodes.dataset.sqlite.database import connect
+        conn = connect(str(db_path), debug=False)
+        try:
+            return load_by_id(run_id, conn=conn).to_xarray_dataset()
+        finally:
+            conn.close()
+
+    if not use_cache:
+        return load()
+    version = get_change_detector('qcodes', db_path).run_version(run_id)
+    key = ('analysis', ('qcodes', str(db_path)), int(run_id), version)
+    return dataset_cache.get_or_load(key, load)
+
+def _is_qcodes_dataset(run) -> bool:
+    from qcodes.dataset.data_set import DataSet
+    return isinstance(run, DataSet)
+
+def _default_database_path() -> str:
+    from qcodes import config as qc_config
+    return qc_config.core.db_location
+
 def find_data_variable_from_keyword(
         xdata_array: xr.DataArray, keyword: str | tuple) -> str:
     """
@@ -6,23 +6,40 @@ from typing import TYPE_CHECKING
 
 from abc import ABC, abstractmethod
 import ast
+import time
+import numpy as np
+import xarray as xr
 from nicegui import ui, app
 
 from arbok_inspector.classes.dim import Dim
+from arbok_inspector.classes.dataset_cache import DatasetCache
+from arbok_inspector.classes.packed_boolean_array import pack_boolean_variables
+from arbok_inspector.classes.derived_array import derived_dataarray
+from arbok_inspector.classes.timing_metrics import timing_metrics
+from arbok_inspector.helpers.expressions import Expression
+from arbok_inspector.helpers.spectra import spectrum_dataset, spectrum_dim_name
+from arbok_inspector.helpers.dtype_narrowing import (
+    narrow_float_variables, NARROW_FLOAT_DTYPE
+)
+from arbok_inspector.helpers.reductions import (
+    histogram_dataset, reduce_dataset, correlator_dataarray, correlator_name,
+    check_correlator, HISTOGRAM_DIM, DEFAULT_HISTOGRAM_BINS, SEM_SUFFIX
+)
 from arbok_inspector.widgets.build_xarray_grid import build_xarray_grid
+from arbok_inspector.classes.refresh_coordinator import reload_if_released
 from arbok_inspector.state import ArbokInspector, inspector
 
 if TYPE_CHECKING:
     from xarray import Dataset
 
-AXIS_OPTIONS = ['average', 'select_value', 'y-axis', 'x-axis']
+AXIS_OPTIONS = ['average', 'histogram', 'fft', 'select_value', 'y-axis', 'x-axis']
+REDUCTION_CACHE_MAX_ENTRIES = 16
+REDUCTION_CACHE_MAX_BYTES = 256 * 1024**2
 
 class BaseRun(ABC):
     """
     Class representing a run with its data and methods
     """
-    full_data_set: Dataset
-    last_avg_subset: Dataset
     name: str
 
     def __init__(self, run_id: int):
@@ -40,6 +57,79 @@ class BaseRun(ABC):
         self._database_columns: dict[str, dict[str, str]] = {}
         self.dims: list[Dim] = []
         self.plot_selection: list[str] = []
+        self.data_version: int = 0
+        self.histogram_settings: dict = {
+            'bins': DEFAULT_HISTOGRAM_BINS, 'min': None, 'max': None}
+        ### Pseudo dim holding the histogram bins, shown on the y-axis
+        self.bin_dim: Dim = Dim(HISTOGRAM_DIM)
+        ### Pseudo dim holding the frequencies of the FFT dim, shown on the x-axis
+        self.frequency_dim: Dim = Dim(spectrum_dim_name(''))
+        ### Float dtype results are narrowed to, None keeps the loaded dtype
+        self.result_dtype: np.dtype | None = None
+        ### Memory saved per loading option when loading the dataset
+        self.saved_bytes: dict[str, int] = {}
+        ### Approximate fraction of the run's data loaded, below 1 while refining
+        self.loaded_fraction: float = 1.
+        ### Derived results correlating several results shot by shot
+        self.correlators: dict[str, dict] = {}
+        ### Derived results defined by expressions over the loaded results
+        self.derived_results: dict[str, Expression] = {}
+        ### Peak tracking settings ('dim', 'kind') of results shown on heatmaps
+        self.peak_tracking: dict[str, dict[str, str]] = {}
+        self.reduction_cache = DatasetCache(
+            max_entries = REDUCTION_CACHE_MAX_ENTRIES,
+            max_bytes = REDUCTION_CACHE_MAX_BYTES
+        )
+        ### Time the run was last shown, idle runs may release their data
+        self.last_active: float = time.time()
+        self.is_released: bool = False
+        self._last_avg_subset: Dataset | None = None
+
+    @property
+    def full_data_set(self) -> Dataset:
+        """
+        The full dataset of the run. A released run has to be reloaded with
+        `reload_run_dataset` first, it is never loaded here since that would
+        block the event loop.
+        """
+        if self.is_released:
+            raise RuntimeError(
+                f"Data of run {self.run_id} was released while idle, reload it first")
+        return self._full_data_set
+
+    @full_data_set.setter
+    def full_data_set(self, dataset: Dataset) -> None:
+        ### Cached reductions are keyed by the version of the data
+        self._full_data_set = dataset
+        self.is_released = False
+        self.data_version += 1
+
+    @property
+    def shows_error_bars(self) -> bool:
+        """Whether the results are shown as 1D plots with error bars of their means"""
+        return self.dim_axis_option['y-axis'] is None and not self.dim_axis_option['fft']
+
+    @property
+    def last_avg_subset(self) -> Dataset:
+        """The reduced subset last shown, regenerated if it was released"""
+        if self._last_avg_subset is None:
+            self.generate_subset()
+        return self._last_avg_subset
+
+    @last_avg_subset.setter
+    def last_avg_subset(self, dataset: Dataset) -> None:
+        self._last_avg_subset = dataset
+
+    def release_data(self) -> None:
+        """
+        Release the dataset, the last subset and the cached reductions to free
+        memory. The dataset is not accessible until it is set again, e.g. by
+        `reload_run_dataset`.
+        """
+        self._full_data_set = None
+        self._last_avg_subset = None
+        self.reduction_cache.invalidate()
+        self.is_released = True
 
     @property
     def database_columns(self) -> dict[str, dict[str, str]]:
@@ -73,17 +163,126 @@ class BaseRun(ABC):
         """
         pass
 
+    def _load_partial_dataset(self, fraction: float) -> Dataset | None:
+        """
+        Load the first part of the run's data, e.g. its first iterations.
+        Backends able to read a run partially override this.
+
+        Args:
+            fraction (float): Approximate fraction of the data to load
+        Returns:
+            dataset (Dataset | None): The partial dataset, None if the run is
+                not read partially
+        """
+        return None
+
+    @timing_metrics.timed('load')
+    def load_dataset(self) -> Dataset:
+        """
+        Load the dataset of the run, bit-pack its boolean valued results and
+        narrow its float results if enabled in the inspector settings. The
+        memory saved is stored in `saved_bytes`. Does not update the dataset
+        of the run.
+
+        Returns:
+            dataset (Dataset): The loaded dataset
+        """
+        return self.apply_loading_options(self._load_dataset())
+
+    @timing_metrics.timed('partial_load')
+    def load_partial_dataset(self, fraction: float) -> Dataset | None:
+        """
+        Load the first part of the run's data with the same loading options as
+        `load_dataset`. Does not update the dataset of the run.
+
+        Args:
+            fraction (float): Approximate fraction of the data to load
+        Returns:
+            dataset (Dataset | None): The partial dataset, None if the backend
+                can not read the run partially or the run is too small for it
+        """
+        dataset = self._load_partial_dataset(fraction)
+        if dataset is None:
+            return None
+        return self.apply_loading_options(dataset)
+
+    def apply_loading_options(self, dataset: Dataset) -> Dataset:
+        """
+        Bit-pack the boolean valued results and narrow the float results of a
+        loaded dataset as enabled in the inspector settings. The memory saved
+        is stored in `saved_bytes`.
+
+        Args:
+            dataset (Dataset): The loaded dataset
+        Returns:
+            dataset (Dataset): The dataset with the loading options applied
+        """
+        saved_bytes = {}
+        if self.inspector.pack_boolean_results:
+            dataset, saved_bytes['bit-packing'] = pack_boolean_variables(dataset)
+        if self.inspector.narrow_floats:
+            self.result_dtype = NARROW_FLOAT_DTYPE
+            dataset, saved_bytes['float32'] = narrow_float_variables(
+                dataset, self.result_dtype)
+        else:
+            self.result_dtype = None
+        self.saved_bytes = saved_bytes
+        for option, n_bytes in saved_bytes.items():
+            print(f"Run {self.run_id}: {option} saved {n_bytes / 1024**2:.1f} MB")
+        return dataset
+
+    def narrow_reduction(self, dataset: Dataset) -> Dataset:
+        """Narrow a reduced dataset to the result dtype before caching it"""
+        if self.result_dtype is None:
+            return dataset
+        return narrow_float_variables(dataset, self.result_dtype)[0]
+
     def prepare_run(self) -> None:
         """Prepare the run by loading the dataset asynchronously."""
-        self._database_columns = self._get_database_columns()
-        self.full_data_set: Dataset = self._load_dataset()
+        self.load_run()
         self.process_run_data()
 
+    def load_database_columns(self) -> None:
+        """Load the columns of the run from the database"""
+        with timing_metrics.span('metadata_query'):
+            self._database_columns = self._get_database_columns()
+
+    def load_run(self) -> Dataset:
+        """
+        Load the database columns and the dataset of the run without
+        initializing any of the UI related attributes.
+
+        Returns:
+            full_data_set (Dataset): The loaded dataset
+        """
+        self.load_database_columns()
+        self.full_data_set = self.load_dataset()
+        return self.full_data_set
+
+    def load_partial_run(self, fraction: float) -> Dataset | None:
+        """
+        Load the database columns and the first part of the run's data, such
+        that the run can be shown before it is fully loaded.
+
+        Args:
+            fraction (float): Approximate fraction of the data to load
+        Returns:
+            full_data_set (Dataset | None): The partial dataset, None if the
+                run is not read partially. The dataset of the run is not set then
+        """
+        self.load_database_columns()
+        dataset = self.load_partial_dataset(fraction)
+        if dataset is None:
+            return None
+        self.full_data_set = dataset
+        self.loaded_fraction = fraction
+        return self.full_data_set
+
     def process_run_data(self) -> None:
         """
         Prepare the run by loading dataset and initializing attributes
         """
-        self.last_avg_subset: Dataset = self.full_data_set
+        self.last_avg_subset = self.full_data_set
         self.load_sweep_dict()
         self.dims: list[Dim] = list(self.sweep_dict.values())
         self.dim_axis_option: dict[str, str|list[Dim]] = self.set_dim_axis_option()
@@ -203,7 +402,7 @@ class BaseRun(ABC):
         Args:
             dim (Dim): The dimension object to update
             selection (str): The new selection option
-                ('average', 'select_value', 'x-axis', 'y-axis')
+                ('average', 'histogram', 'fft', 'select_value', 'x-axis', 'y-axis')
             index (int, optional): The index for 'select_value' option. Defaults to None.
         """
         text = f'Updating subset dims: {dim.name} to {selection}'
@@ -211,7 +410,7 @@ class BaseRun(ABC):
         ui.notify(text, position='top-right')
 
         ### First, remove old option this dim was on
-        for option in ['average', 'select_value']:
+        for option in ['average', 'histogram', 'fft', 'select_value']:
             if dim in self.dim_axis_option[option]:
                 print(f"Removing {dim.name} from {option}")
                 self.dim_axis_option[option].remove(dim)
@@ -221,6 +420,14 @@ class BaseRun(ABC):
         if dim.option in ['x-axis', 'y-axis']:
             print(f"Removing {dim.name} from {dim.option}")
             self.dim_axis_option[dim.option] = None
+        ### The histogram bins leave the y-axis with the last histogram dim
+        if not self.dim_axis_option['histogram'] \
+                and self.dim_axis_option['y-axis'] is self.bin_dim:
+            self.dim_axis_option['y-axis'] = None
+        ### The frequencies leave the x-axis with the FFT dim
+        if not self.dim_axis_option['fft'] \
+                and self.dim_axis_option['x-axis'] is self.frequency_dim:
+            self.dim_axis_option['x-axis'] = None
 
         ### Now, set new option
         if selection in ['average', 'select_value']:
@@ -228,10 +435,42 @@ class BaseRun(ABC):
             dim.select_index = index
             self.dim_axis_option[selection].append(dim)
             return
+        if selection == 'histogram':
+            self.dim_axis_option['histogram'].append(dim)
+            old_dim = self.dim_axis_option['y-axis']
+            self.dim_axis_option['y-axis'] = self.bin_dim
+            self.bin_dim.option = 'y-axis'
+            if old_dim and old_dim is not self.bin_dim:
+                ### The bins take the y-axis, the previous y-axis dim is selected
+                old_dim.option = 'select_value'
+                old_dim.ui_selector.value = 'select_value'
+            return
+        if selection == 'fft':
+            ### Only one dim is transformed at a time
+            for fft_dim in list(self.dim_axis_option['fft']):
+                fft_dim.ui_selector.value = 'select_value'
+            self.dim_axis_option['fft'].append(dim)
+            self.frequency_dim.name = spectrum_dim_name(dim.name)
+            old_dim = self.dim_axis_option['x-axis']
+            self.dim_axis_option['x-axis'] = self.frequency_dim
+            self.frequency_dim.option = 'x-axis'
+            if old_dim and old_dim is not self.frequency_dim:
+                ### The frequencies take the x-axis, the previous x-axis dim is selected
+                old_dim.option = 'select_value'
+                old_dim.ui_selector.value = 'select_value'
+            return
         if selection in ['x-axis', 'y-axis']:
             old_dim = self.dim_axis_option[selection]
             self.dim_axis_option[selection] = dim
-            if old_dim:
+            if old_dim is self.bin_dim:
+                ### Histograms need the y-axis for their bins, average instead
+                for hist_dim in list(self.dim_axis_option['histogram']):
+                    hist_dim.ui_selector.value = 'average'
+            elif old_dim is self.frequency_dim:
+                ### The spectrum needs the x-axis for its frequencies
+                for fft_dim in list(self.dim_axis_option['fft']):
+                    fft_dim.ui_selector.value = 'select_value'
+            elif old_dim:
                 # Set previous dim (having this option) to 'select_value'
                 # Required since x and y axis have to be unique
                 print(old_dim)
@@ -246,30 +485,276 @@ class BaseRun(ABC):
     def generate_subset(self, has_new_data: bool = False) -> Dataset:
         """
         Generate the subset of the full dataset based on the current dimension options.
+        Reductions are cached per data version, so new data is always reduced.
+
+        Args:
+            has_new_data (bool): Kept for compatibility, new data is detected by
+                the data version
         Returns:
             sub_set (xarray.Dataset): The subset of the full dataset
         """
-        last_non_avg_dims = list(self.last_avg_subset.dims)
-        avg_names = [d.name for d in self.dim_axis_option['average']]
-        plot_names = [d.name for d in self.dim_axis_option['select_value']]
-        if self.dim_axis_option['y-axis']:
-            plot_names.append(self.dim_axis_option['y-axis'].name)
-        plot_names.append(self.dim_axis_option['x-axis'].name)
-        if set(plot_names) == set(last_non_avg_dims) and not has_new_data:
-            sub_set = self.last_avg_subset
-            print(f"Re-using last averaged subset: {list(sub_set.dims)}")
-        else:
-            print(f"Averiging over {avg_names}")
-            sub_set = self.full_data_set.mean(dim=avg_names)
-            self.update_select_sliders()
+        self.last_active = time.time()
+        statistics = {d.name: d.statistic for d in self.dim_axis_option['average']}
+        hist_names = [d.name for d in self.dim_axis_option['histogram']]
+        with timing_metrics.span('reduction'):
+            if hist_names:
+                sub_set = self.generate_histogram_subset(statistics, hist_names)
+            else:
+                sub_set = self.generate_reduced_subset(statistics)
+            if self.dim_axis_option['fft']:
+                sub_set = self.generate_spectrum_subset(
+                    sub_set, self.dim_axis_option['fft'][0].name, statistics, hist_names)
+        self.update_select_sliders()
         self.last_avg_subset = sub_set
         sel_dict = {d.name: d.select_index for d in self.dim_axis_option['select_value']}
         print(f"Selecting subset with: {sel_dict}")
-        sub_set = sub_set.isel(**sel_dict).squeeze()
+        with timing_metrics.span('slicing'):
+            sub_set = sub_set.isel(**sel_dict).squeeze()
         print("subset dimensions", list(sub_set.dims))
         return sub_set
 
-    def update_plot_selection(self, value: bool, readout_name: str):
+    def generate_reduced_subset(self, statistics: dict[str, str]) -> Dataset:
+        """
+        Reduce all results over the averaged dims with their statistic. The
+        standard error of means is only computed if 1D plots show it as error
+        bars, see `helpers.reductions.reduce_dataset`. Results are cached per
+        data version.
+
+        Args:
+            statistics (dict[str, str]): Statistic for every averaged dim
+        Returns:
+            reduced (Dataset): Dataset without the averaged dims
+        """
+        reduced = self.full_data_set
+        with_sem = self.shows_error_bars
+        if statistics:
+            key = ('reduce', self.data_version, tuple(statistics.items()), with_sem)
+
+            def compute() -> Dataset:
+                print(f"Reducing {statistics}")
+                return self.narrow_reduction(
+                    reduce_dataset(self.full_data_set, statistics, with_sem))
+
+            reduced = self.reduction_cache.get_or_load(key, compute)
+        if self.derived_results:
+            reduced = self.add_derived_results(reduced, statistics)
+        if self.correlators:
+            reduced = self.add_correlator_results(reduced, list(statistics))
+        return reduced
+
+    def get_result_data(self, name: str) -> xr.DataArray:
+        """
+        Return the unreduced data of a loaded or derived result. Derived
+        results are evaluated lazily when their values are accessed.
+
+        Args:
+            name (str): Name of the result
+        Returns:
+            data (DataArray): Data of the result
+        """
+        if name in self.derived_results:
+            return derived_dataarray(
+                self.full_data_set, name, self.derived_results[name])
+        return self.full_data_set[name]
+
+    def add_derived_results(
+            self, dataset: Dataset, statistics: dict[str, str]) -> Dataset:
+        """
+        Add the derived results selected for plotting to the reduced dataset.
+        Derived results are evaluated chunk by chunk while reducing them and
+        are cached on their own per data version.
+
+        Args:
+            dataset (Dataset): Reduced dataset to add the derived results to
+            statistics (dict[str, str]): Statistic for every averaged dim
+        Returns:
+            dataset (Dataset): Dataset including the derived results
+        """
+        for name, expression in self.derived_results.items():
+            if name not in self.plot_selection:
+                continue
+            if not statistics:
+                dataset = dataset.assign({name: self.get_result_data(name)})
+                continue
+            key = (
+                'derived', self.data_version, name, expression.expression,
+                tuple(statistics.items()), self.shows_error_bars
+            )
+
+            def compute(name: str = name) -> Dataset:
+                print(f"Evaluating derived result {name}")
+                return self.narrow_reduction(reduce_dataset(
+                    xr.Dataset({name: self.get_result_data(name)}), statistics,
+                    self.shows_error_bars))
+
+            dataset = dataset.assign({name: self.reduction_cache.get_or_load(key, compute)[name]})
+        return dataset
+
+    def add_derived_result(self, name: str, expression: str) -> str:
+        """
+        Add a derived result defined by an expression over the loaded results
+        and select it for plotting, see `helpers.expressions`.
+
+        Args:
+            name (str): Name of the derived result, the expression if empty
+            expression (str): Expression, e.g. 'sqrt(Q1.I**2 + Q1.Q**2)'
+        Returns:
+            name (str): Name of the derived result
+        Raises:
+            ValueError: If the expression is invalid or the name is taken
+        """
+        name = (name or expression).strip()
+        if name in self.full_data_set or name in self.correlators:
+            raise ValueError(f"A result named '{name}' already exists")
+        parsed = Expression(expression, self.full_data_set.data_vars)
+        ### Evaluated on a small slice, such that errors surface before plotting
+        sample = self.full_data_set.isel(
+            {dim: slice(0, 2) for dim in self.full_data_set.dims})
+        try:
+            derived_dataarray(sample, name, parsed).values
+        except Exception as e:
+            raise ValueError(
+                f"Expression '{parsed.expression}' can not be evaluated: {e}") from e
+        self.derived_results[name] = parsed
+        if name not in self.plot_selection:
+            self.plot_selection.append(name)
+        return name
+
+    def remove_derived_result(self, name: str) -> None:
+        """Remove a derived result and deselect it for plotting"""
+        self.derived_results.pop(name, None)
+        if name in self.plot_selection:
+            self.plot_selection.remove(name)
+
+    def add_correlator_results(self, dataset: Dataset, dims: list[str]) -> Dataset:
+        """
+        Add the correlators to the dataset. They are computed from the full
+        dataset and averaged over the given dims regardless of their statistic.
+        Every correlator is cached on its own per data version.
+
+        Args:
+            dataset (Dataset): Reduced dataset to add the correlators to
+            dims (list[str]): Names of the averaged dims
+        Returns:
+            dataset (Dataset): Dataset including the correlators
+        """
+        for name, correlator in self.correlators.items():
+            key = ('correlator', self.data_version, name, tuple(dims))
+
+            def compute(name: str = name, correlator: dict = correlator) -> Dataset:
+                print(f"Computing correlator {name} over {dims}")
+                reduced = correlator_dataarray(
+                    [self.get_result_data(r) for r in correlator['results']],
+                    dims, correlator['kind'])
+                result = reduced['mean'].to_dataset()
+                if 'sem' in reduced:
+                    result = result.assign_coords({f'{name}{SEM_SUFFIX}': reduced['sem']})
+                return self.narrow_reduction(result)
+
+            dataset = dataset.assign({name: self.reduction_cache.get_or_load(key, compute)[name]})
+        return dataset
+
+    def add_correlator(self, results: list[str], kind: str) -> str:
+        """
+        Add a correlator of the given results and select it for plotting.
+
+        Args:
+            results (list[str]): Names of the results to correlate
+            kind (str): Kind of correlator, 'product' or 'covariance'
+        Returns:
+            name (str): Name of the derived result
+        """
+        check_correlator(len(results), kind)
+        name = correlator_name(results, kind)
+        self.correlators[name] = {'results': list(results), 'kind': kind}
+        if name not in self.plot_selection:
+            self.plot_selection.append(name)
+        return name
+
+    def remove_correlator(self, name: str) -> None:
+        """Remove a correlator and its derived result from the plot selection"""
+        self.correlators.pop(name, None)
+        if name in self.plot_selection:
+            self.plot_selection.remove(name)
+
+    def generate_histogram_subset(
+            self, statistics: dict[str, str], hist_names: list[str]) -> Dataset:
+        """
+        Histogram the selected results over the histogram dims after reducing
+        the averaged dims. Results are cached per data version.
+
+        Args:
+            statistics (dict[str, str]): Statistic for every averaged dim
+            hist_names (list[str]): Names of the dims to histogram over
+        Returns:
+            histograms (Dataset): Histograms with a 'bin' dim, see
+                `helpers.reductions.histogram_dataset`
+        """
+        settings = self.histogram_settings
+        value_range = None
+        if settings['min'] is not None and settings['max'] is not None:
+            value_range = (float(settings['min']), float(settings['max']))
+        ### Correlators are averaged shot by shot and can not be histogrammed
+        results = sorted(
+            r for r in self.plot_selection
+            if r in self.full_data_set or r in self.derived_results)
+        key = (
+            'histogram', self.data_version, tuple(results),
+            tuple(self.derived_results[r].expression for r in results
+                  if r in self.derived_results),
+            tuple(statistics.items()), tuple(hist_names), int(settings['bins']),
+            value_range
+        )
+
+        def compute() -> Dataset:
+            print(f"Histogramming over {hist_names}, reducing {statistics}")
+            data = xr.Dataset({r: self.get_result_data(r) for r in results})
+            if statistics:
+                data = reduce_dataset(data, statistics, with_sem=False)
+            return self.narrow_reduction(histogram_dataset(
+                data, hist_names, int(settings['bins']), value_range))
+
+        return self.reduction_cache.get_or_load(key, compute)
+
+    def generate_spectrum_subset(
+            self, dataset: Dataset, dim: str, statistics: dict[str, str],
+            hist_names: list[str]) -> Dataset:
+        """
+        Fourier transform the plotted results of the reduced or histogrammed
+        subset along the FFT dim, see `helpers.spectra.spectrum_dataset`.
+        Spectra are cached per data version, so selecting other values of the
+        remaining dims does not transform the data again.
+
+        Args:
+            dataset (Dataset): Reduced or histogrammed subset
+            dim (str): Name of the dim to transform along
+            statistics (dict[str, str]): Statistic for every averaged dim
+            hist_names (list[str]): Names of the histogrammed dims
+        Returns:
+            spectra (Dataset): Amplitude spectra of the plotted results
+        """
+        results = [
+            r for r in self.plot_selection if r in dataset and dim in dataset[r].dims]
+        key = (
+            'fft', self.data_version, dim, tuple(results),
+            tuple(self.derived_results[r].expression for r in results
+                  if r in self.derived_results),
+            tuple(statistics.items()), tuple(hist_names),
+            tuple(self.histogram_settings.values()) if hist_names else None
+        )
+
+        def compute() -> Dataset:
+            print(f"Computing spectra of {results} along {dim}")
+            return self.narrow_reduction(spectrum_dataset(dataset, dim, results))
+
+        try:
+            return self.reduction_cache.get_or_load(key, compute)
+        except ValueError as e:
+            ui.notify(str(e), type='negative')
+            print(f"Error computing spectra: {e}")
+            return dataset
+
+    async def update_plot_selection(self, value: bool, readout_name: str):
         """
         Update the plot selection based on user interaction.
 
@@ -277,6 +762,7 @@ class BaseRun(ABC):
             value (bool): True if the result is selected, False otherwise
             readout_name (str): Name of the result to update
         """
+        await reload_if_released(self)
         print(f"{readout_name= } {value= }")
         pretty_readout_name = readout_name.replace("__", ".")
         if readout_name not in self.plot_selection:
@@ -299,6 +785,8 @@ class BaseRun(ABC):
         Update the select sliders based on the current dimension options.
         """
         for dim in self.dim_axis_option['select_value']:
+            if dim.slider is None:
+                continue
             print(f"Updating slider for {dim.name}")
             dim.slider._props["max"] = len(self.full_data_set[dim.name]) - 1
             dim.slider.update()
@@ -0,0 +1,131 @@
+"""
+Module containing the BulkExportJob class exporting many runs into one zip.
+
+Runs are loaded and written by a bounded pool of worker threads. Each written
+run is moved into the zip archive and its dataset is released right away, so
+at most `max_workers` datasets are held in memory regardless of the number of
+selected runs.
+"""
+from __future__ import annotations
+from typing import TYPE_CHECKING
+
+import zipfile
+from pathlib import Path
+from concurrent.futures import (
+    ThreadPoolExecutor, wait, FIRST_COMPLETED
+)
+
+from arbok_inspector.classes.export_job import (
+    ExportJob,
+    ExportCancelled,
+    write_dataset,
+    EXPORT_FORMATS,
+    DEFAULT_COMPRESSION_LEVEL
+)
+from arbok_inspector.classes.run_factory import build_run
+
+if TYPE_CHECKING:
+    from concurrent.futures import Future
+
+BULK_EXPORT_MAX_WORKERS = 4
+
+class BulkExportJob(ExportJob):
+    """
+    Class representing an export of several runs into a single zip archive
+    """
+    def __init__(
+            self,
+            run_ids: list[int],
+            file_stem: str,
+            database_type: str,
+            db_path: str | Path | None = None,
+            export_format: str = 'netcdf',
+            compression_level: int = DEFAULT_COMPRESSION_LEVEL,
+            max_workers: int = BULK_EXPORT_MAX_WORKERS
+            ):
+        """
+        Constructor for BulkExportJob class
+
+        Args:
+            run_ids (list[int]): IDs of the runs to export
+            file_stem (str): File name of the zip archive without suffix
+            database_type (str): 'qcodes' or 'native_arbok'
+            db_path (str | Path | None): Path to the QCoDeS database
+            export_format (str): One of 'netcdf' or 'zarr' for the single runs
+            compression_level (int): Compression level from 0 (off) to 9
+            max_workers (int): Maximum number of runs loaded at the same time
+        """
+        super().__init__(None, file_stem, export_format, compression_level)
+        self.run_ids: list[int] = [int(run_id) for run_id in run_ids]
+        self.database_type: str = database_type
+        self.db_path: str | Path | None = db_path
+        self.max_workers: int = max(1, int(max_workers))
+        self.file_name: str = f"{file_stem}.zip"
+        self.media_type: str = 'application/zip'
+        self.file_path: Path = self.tmp_dir / self.file_name
+        self.completed_runs: int = 0
+        self.failed_runs: dict[int, str] = {}
+
+    def _write(self) -> None:
+        """
+        Load and write the runs on a bounded thread pool and add each written
+        run file to the zip archive as soon as it is finished.
+        """
+        pending_ids = list(self.run_ids)
+        running: dict[Future, int] = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor, \
+                zipfile.ZipFile(
+                    self.file_path, mode='w', compression=zipfile.ZIP_STORED
+                    ) as archive:
+            try:
+                while pending_ids or running:
+                    ### Only submit as many runs as there are workers
+                    while pending_ids and len(running) < self.max_workers:
+                        run_id = pending_ids.pop(0)
+                        running[executor.submit(self._export_run, run_id)] = run_id
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        run_id = running.pop(future)
+                        self._add_to_archive(archive, future, run_id)
+                    if self.cancel_event.is_set():
+                        raise ExportCancelled('Export was cancelled')
+            except ExportCancelled:
+                for future in running:
+                    future.cancel()
+                raise
+        if len(self.failed_runs) == len(self.run_ids):
+            raise RuntimeError(
+                f"None of the runs could be exported: {self.failed_runs}")
+
+    def _export_run(self, run_id: int) -> Path:
+        """Load a single run and write it next to the archive"""
+        if self.cancel_event.is_set():
+            raise ExportCancelled('Export was cancelled')
+        run = build_run(run_id, self.database_type, self.db_path)
+        dataset = run.load_run()
+        suffix = EXPORT_FORMATS[self.export_format]['suffix']
+        file_path = self.tmp_dir / f"{run_id}{suffix}"
+        write_dataset(
+            dataset,
+            file_path,
+            export_format = self.export_format,
+            compression_level = self.compression_level,
+            cancel_event = self.cancel_event
+        )
+        return file_path
+
+    def _add_to_archive(
+            self, archive: zipfile.ZipFile, future: Future, run_id: int) -> None:
+        """Move the written file of a finished run into the archive"""
+        try:
+            file_path = future.result()
+        except ExportCancelled:
+            return
+        except Exception as e:
+            print(f"Error exporting run {run_id}: {e}")
+            self.failed_runs[run_id] = str(e)
+        else:
+            archive.write(file_path, arcname=file_path.name)
+            file_path.unlink()
+        self.completed_runs += 1
+        self.progress = self.completed_runs / len(self.run_ids)
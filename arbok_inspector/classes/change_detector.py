@@ -0,0 +1,231 @@
+"""
+Module containing change detectors probing databases for new data.
+
+Instead of re-querying runs and datasets on every tick of a refresh timer,
+consumers ask a ChangeTracker whether anything changed since they last looked.
+The checks are layered from cheap to less cheap:
+
+1. database version: `PRAGMA data_version` of a persistent read connection
+   together with the mtime and size of the SQLite file and its WAL file
+2. runs version: `max(run_id)`, number of runs and completion timestamps
+3. run version: the last row id of the results table of a single run
+
+The later probes are only executed if the earlier ones report a change.
+"""
+from __future__ import annotations
+from typing import TYPE_CHECKING
+
+import os
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from pathlib import Path
+
+from arbok_inspector.state import inspector
+
+if TYPE_CHECKING:
+    from sqlalchemy import Engine
+
+class ChangeDetector(ABC):
+    """Base class for cheap database change probes"""
+
+    @abstractmethod
+    def database_version(self) -> tuple:
+        """Cheap fingerprint changing whenever anything was written"""
+
+    @abstractmethod
+    def runs_version(self) -> tuple:
+        """Fingerprint of the runs table, changes on new or completed runs"""
+
+    @abstractmethod
+    def run_version(self, run_id: int) -> tuple:
+        """Fingerprint of the data of a single run, changes on new results"""
+
+    def close(self) -> None:
+        """Release resources held by the detector"""
+
+class QcodesChangeDetector(ChangeDetector):
+    """
+    Change detector for QCoDeS SQLite databases. Keeps a single persistent
+    read-only connection, since `PRAGMA data_version` only reports commits of
+    other connections relative to the connection it is queried on.
+    """
+    def __init__(self, db_path: str | Path):
+        """
+        Constructor for QcodesChangeDetector class
+
+        Args:
+            db_path (str | Path): Path to the QCoDeS database file
+        """
+        self.db_path = Path(db_path)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            f"{self.db_path.resolve().as_uri()}?mode=ro",
+            uri = True,
+            check_same_thread = False
+            )
+
+    def database_version(self) -> tuple:
+        with self._lock:
+            data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+        return (
+            data_version,
+            *_file_stat(self.db_path),
+            *_file_stat(Path(f"{self.db_path}-wal"))
+        )
+
+    def runs_version(self) -> tuple:
+        with self._lock:
+            return tuple(self._conn.execute("""
+                SELECT MAX(run_id), COUNT(*), MAX(completed_timestamp)
+                FROM runs
+            """).fetchone())
+
+    def run_version(self, run_id: int) -> tuple:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT result_table_name, is_completed FROM runs WHERE run_id = ?",
+                (run_id,)).fetchone()
+            if row is None:
+                return (None,)
+            table_name, is_completed = row
+            last_id = self._conn.execute(
+                f'SELECT MAX(id) FROM "{table_name}"').fetchone()[0]
+        return (last_id, is_completed)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+class NativeChangeDetector(ChangeDetector):
+    """Change detector for native arbok (PostgreSQL) databases"""
+    def __init__(self, engine: Engine):
+        """
+        Constructor for NativeChangeDetector class
+
+        Args:
+            engine (Engine): SQLAlchemy engine connected to the database
+        """
+        self.engine = engine
+
+    def database_version(self) -> tuple:
+        ### There is no cheaper global probe than the runs table itself
+        return self.runs_version()
+
+    def runs_version(self) -> tuple:
+        from sqlalchemy import text
+        query = text("""
+            SELECT MAX(run_id), COUNT(*), MAX(completed_time),
+                SUM(result_count), SUM(batch_count)
+            FROM runs
+        """)
+        with self.engine.connect() as conn:
+            return tuple(conn.execute(query).fetchone())
+
+    def run_version(self, run_id: int) -> tuple:
+        from sqlalchemy import text
+        query = text("""
+            SELECT result_count, batch_count, is_completed
+            FROM runs WHERE run_id = :run_id
+        """)
+        with self.engine.connect() as conn:
+            row = conn.execute(query, {"run_id": run_id}).fetchone()
+        return tuple(row) if row is not None else (None,)
+
+class ChangeTracker:
+    """
+    Remembers the versions a single consumer (e.g. a browser tab) has last
+    seen and reports whether the database changed since then.
+    """
+    def __init__(self, detector: ChangeDetector, run_id: int | None = None):
+        """
+        Constructor for ChangeTracker class
+
+        Args:
+            detector (ChangeDetector): Detector probing the database
+            run_id (int | None): Run to track, only the runs table if None
+        """
+        self.detector = detector
+        self.run_id = run_id
+        self._database_version: tuple | None = None
+        self._version: tuple | None = None
+
+    def prime(self) -> None:
+        """Mark the current state of the database as seen"""
+        self.has_changed()
+
+    def has_changed(self) -> bool:
+        """
+        Check whether the tracked runs or run changed since the last call.
+
+        Returns:
+            changed (bool): True if the consumer should refresh
+        """
+        database_version = self.detector.database_version()
+        if database_version == self._database_version:
+            return False
+        self._database_version = database_version
+        if self.run_id is None:
+            version = self.detector.runs_version()
+        else:
+            version = self.detector.run_version(self.run_id)
+        changed = version != self._version
+        self._version = version
+        return changed
+
+_detectors: dict[tuple, ChangeDetector] = {}
+_detectors_lock = threading.Lock()
+
+def get_change_detector(
+        database_type: str,
+        db_path: str | Path | None = None,
+        engine: Engine | None = None
+        ) -> ChangeDetector:
+    """
+    Return the shared change detector for the given database.
+
+    Args:
+        database_type (str): 'qcodes' or 'native_arbok'
+        db_path (str | Path | None): Path to the QCoDeS database
+        engine (Engine | None): SQLAlchemy engine of the native database
+    Returns:
+        detector (ChangeDetector): Shared detector of the database
+    """
+    if database_type == 'qcodes':
+        key = (database_type, str(Path(db_path).resolve()))
+    else:
+        key = (database_type, id(engine))
+    with _detectors_lock:
+        if key not in _detectors:
+            if database_type == 'qcodes':
+                _detectors[key] = QcodesChangeDetector(db_path)
+            else:
+                _detectors[key] = NativeChangeDetector(engine)
+        return _detectors[key]
+
+def create_change_tracker(run_id: int | None = None) -> ChangeTracker:
+    """
+    Create a change tracker for the database currently selected in the
+    inspector. The tracker is primed, i.e. only later changes are reported.
+
+    Args:
+        run_id (int | None): Run to track, only the runs table if None
+    Returns:
+        tracker (ChangeTracker): The primed change tracker
+    """
+    detector = get_change_detector(
+        inspector.database_type,
+        db_path = inspector.qcodes_database_path,
+        engine = inspector.database_engine
+    )
+    tracker = ChangeTracker(detector, run_id)
+    tracker.prime()
+    return tracker
+
+def _file_stat(path: Path) -> tuple[int, int]:
+    """Return modification time and size of the file, zeros if missing"""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return (0, 0)
+    return (stat.st_mtime_ns, stat.st_size)
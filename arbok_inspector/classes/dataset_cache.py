@@ -0,0 +1,144 @@
+"""
+Module containing the DatasetCache shared by analysis tools and the app.
+
+Datasets are cached by a key containing the version of the run data (see
+`change_detector`), so a cached entry is only reused as long as no new results
+were written to the run. The least recently used entries are evicted once the
+number of entries or their total size exceed the configured limits.
+"""
+from __future__ import annotations
+from typing import TYPE_CHECKING, Callable
+
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+
+if TYPE_CHECKING:
+    from xarray import Dataset
+
+DEFAULT_MAX_ENTRIES = 64
+DEFAULT_MAX_BYTES = 2 * 1024**3
+
+class DatasetCache:
+    """Thread-safe LRU cache of xarray Datasets"""
+    def __init__(
+            self,
+            max_entries: int = DEFAULT_MAX_ENTRIES,
+            max_bytes: int = DEFAULT_MAX_BYTES
+            ):
+        """
+        Constructor for DatasetCache class
+
+        Args:
+            max_entries (int): Maximum number of cached datasets
+            max_bytes (int): Maximum total size of the cached datasets
+        """
+        self.max_entries: int = max_entries
+        self.max_bytes: int = max_bytes
+        self.hits: int = 0
+        self.misses: int = 0
+        self._entries: OrderedDict[tuple, Dataset] = OrderedDict()
+        self._sizes: dict[tuple, int] = {}
+        self._in_flight: dict[tuple, Future] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def total_bytes(self) -> int:
+        """Total size of all cached datasets in bytes"""
+        with self._lock:
+            return sum(self._sizes.values())
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def __contains__(self, key: tuple) -> bool:
+        with self._lock:
+            return key in self._entries
+
+    def get(self, key: tuple) -> Dataset | None:
+        """Return the cached dataset for the key or None if not cached"""
+        with self._lock:
+            if key not in self._entries:
+                return None
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+    def put(self, key: tuple, dataset: Dataset) -> None:
+        """Add a dataset to the cache, evicting the least recently used ones"""
+        with self._lock:
+            self._entries[key] = dataset
+            self._entries.move_to_end(key)
+            self._sizes[key] = int(dataset.nbytes)
+            self._evict()
+
+    def get_or_load(self, key: tuple, loader: Callable[[], Dataset]) -> Dataset:
+        """
+        Return the cached dataset or load it. Concurrent calls for the same
+        key wait for a single load instead of loading the dataset twice.
+
+        Args:
+            key (tuple): Cache key including the version of the run data
+            loader (Callable): Blocking function loading the dataset
+        Returns:
+            dataset (Dataset): The cached or freshly loaded dataset
+        """
+        with self._lock:
+            if key in self._entries:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return self._entries[key]
+            future = self._in_flight.get(key)
+            is_loading = future is None
+            if is_loading:
+                self.misses += 1
+                future = Future()
+                self._in_flight[key] = future
+        if not is_loading:
+            return future.result()
+        try:
+            dataset = loader()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            self.put(key, dataset)
+            future.set_result(dataset)
+            return dataset
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+
+    def values(self) -> list[Dataset]:
+        """All cached datasets, least recently used first"""
+        with self._lock:
+            return list(self._entries.values())
+
+    def items(self) -> list[tuple[tuple, Dataset]]:
+        """All cache keys and datasets, least recently used first"""
+        with self._lock:
+            return list(self._entries.items())
+
+    def invalidate(self, match: Callable[[tuple], bool] | None = None) -> None:
+        """
+        Remove entries from the cache.
+
+        Args:
+            match (Callable | None): Only remove keys for which this returns
+                True. Removes all entries if None
+        """
+        with self._lock:
+            for key in list(self._entries):
+                if match is None or match(key):
+                    del self._entries[key]
+                    del self._sizes[key]
+
+    def _evict(self) -> None:
+        ### Always keep the most recent entry, even if it exceeds the limits
+        while len(self._entries) > 1 and (
+                len(self._entries) > self.max_entries
+                or sum(self._sizes.values()) > self.max_bytes):
+            key, _ = self._entries.popitem(last=False)
+            del self._sizes[key]
+
+dataset_cache = DatasetCache()
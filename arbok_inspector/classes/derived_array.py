@@ -0,0 +1,91 @@
+"""
+Module containing the DerivedArray evaluating an expression lazily.
+
+Derived results are wrapped in xarray's lazily indexed arrays like the
+bit-packed results. Selecting or chunking a derived result only evaluates
+the expression on the selected values of the results it uses, so derived
+results never occupy memory of their full size.
+"""
+from __future__ import annotations
+from typing import TYPE_CHECKING
+
+import numpy as np
+import xarray as xr
+from xarray.backends import BackendArray
+from xarray.core import indexing
+
+from arbok_inspector.helpers.expressions import Expression
+
+if TYPE_CHECKING:
+    from xarray import Dataset, DataArray
+
+class DerivedArray(BackendArray):
+    """Array whose values are computed from other results on access"""
+    def __init__(self, expression: Expression, inputs: dict[str, DataArray]):
+        """
+        Constructor for DerivedArray class
+
+        Args:
+            expression (Expression): Expression to evaluate
+            inputs (dict[str, DataArray]): Results used by the expression
+        """
+        self.expression = expression
+        self.inputs = inputs
+        sizes = {}
+        for data in inputs.values():
+            sizes.update(data.sizes)
+        self.dims: tuple[str, ...] = tuple(sizes)
+        self.shape = tuple(sizes.values())
+        first = self._getitem(tuple(slice(0, 1) for _ in self.shape))
+        self.dtype = first.dtype
+
+    def __getitem__(self, key: indexing.ExplicitIndexer) -> np.ndarray:
+        return indexing.explicit_indexing_adapter(
+            key, self.shape, indexing.IndexingSupport.BASIC, self._getitem)
+
+    def _getitem(self, key: tuple) -> np.ndarray:
+        kept_dims = [
+            dim for dim, k in zip(self.dims, key)
+            if not isinstance(k, (int, np.integer))]
+        values = {}
+        for name, data in self.inputs.items():
+            variable = data.variable.isel(
+                {dim: k for dim, k in zip(self.dims, key) if dim in data.dims})
+            present = [dim for dim in kept_dims if dim in variable.dims]
+            ### Missing dims get length one and are broadcast by numpy
+            array = np.asarray(variable.transpose(*present).values)
+            if array.dtype == bool:
+                ### Boolean results behave like the 0/1 values they stand for
+                array = array.astype(np.int64)
+            values[name] = array.reshape([
+                variable.sizes[dim] if dim in present else 1 for dim in kept_dims])
+        target_shape = [
+            len(range(*k.indices(n))) for k, n in zip(key, self.shape)
+            if not isinstance(k, (int, np.integer))]
+        return np.broadcast_to(
+            self.expression.evaluate(values), target_shape).copy()
+
+def derived_dataarray(dataset: Dataset, name: str, expression: Expression) -> DataArray:
+    """
+    Create a lazily evaluated DataArray for the expression over the dataset.
+
+    Args:
+        dataset (Dataset): Dataset holding the results used by the expression
+        name (str): Name of the derived result
+        expression (Expression): Validated expression
+    Returns:
+        derived (DataArray): Derived result with the union of the dims of the
+            results it uses
+    """
+    array = DerivedArray(
+        expression, {var: dataset[var] for var in expression.variables})
+    coords = {
+        coord_name: coord for coord_name, coord in dataset.coords.items()
+        if set(coord.dims) <= set(array.dims)
+    }
+    return xr.DataArray(
+        xr.Variable(array.dims, indexing.LazilyIndexedArray(array)),
+        coords = coords,
+        name = name,
+        attrs = {'long_name': name, 'expression': expression.expression}
+    )
@@ -22,11 +22,13 @@ class Dim:
             name (str): Name of the dimension
             option (str): Option for the dimension (average, select_value, x-axis, y-axis)
             select_index (int): Index of the selected value for select_value option
+            statistic (str): Statistic used to reduce the dim if it is averaged
             ui_selector: Reference to the UI element for the dimension
         """
         self.name = name
         self.option: str | None = None
         self.select_index: int = 0
+        self.statistic: str = 'mean'
         self.ui_selector: Select | None = None
         self.slider: Slider | None = None
         self.select_label: Html | None = None
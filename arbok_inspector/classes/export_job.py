@@ -0,0 +1,271 @@
+"""
+Module containing the ExportJob class writing datasets to temporary files.
+
+Exports are written variable by variable into a temporary directory on a
+worker thread instead of an in-memory buffer. The finished file is served by
+the `/export/{job_id}` endpoint which supports HTTP range requests.
+"""
+from __future__ import annotations
+from typing import TYPE_CHECKING, Callable
+
+import os
+import time
+import shutil
+import zipfile
+import tempfile
+import threading
+from uuid import uuid4
+from pathlib import Path
+from importlib.util import find_spec
+
+from arbok_inspector.classes.timing_metrics import timing_metrics
+
+if TYPE_CHECKING:
+    from xarray import Dataset
+
+EXPORT_FORMATS = {
+    'netcdf': {'suffix': '.nc', 'media_type': 'application/x-netcdf'},
+    'zarr': {'suffix': '.zarr.zip', 'media_type': 'application/zip'},
+}
+DEFAULT_COMPRESSION_LEVEL = 4
+EXPORT_JOB_MAX_AGE_S = 60 * 60
+
+class ExportCancelled(Exception):
+    """Raised when an export is cancelled while writing"""
+
+class ExportJob:
+    """
+    Class representing a single dataset export written to a temporary file
+    """
+    def __init__(
+            self,
+            dataset: Dataset,
+            file_stem: str,
+            export_format: str = 'netcdf',
+            compression_level: int = DEFAULT_COMPRESSION_LEVEL
+            ):
+        """
+        Constructor for ExportJob class
+
+        Args:
+            dataset (Dataset): The xarray Dataset to export
+            file_stem (str): File name of the export without suffix
+            export_format (str): One of 'netcdf' or 'zarr'
+            compression_level (int): Compression level from 0 (off) to 9
+        """
+        if export_format not in EXPORT_FORMATS:
+            raise ValueError(
+                f"Export format must be one of {list(EXPORT_FORMATS)}. "
+                f"Is {export_format}")
+        self.job_id: str = uuid4().hex
+        self.dataset: Dataset | None = dataset
+        self.export_format: str = export_format
+        self.compression_level: int = int(compression_level)
+        self.file_name: str = file_stem + EXPORT_FORMATS[export_format]['suffix']
+        self.media_type: str = EXPORT_FORMATS[export_format]['media_type']
+        self.tmp_dir: Path = Path(tempfile.mkdtemp(prefix='arbok_export_'))
+        self.file_path: Path = self.tmp_dir / self.file_name
+        self.progress: float = 0.
+        self.status: str = 'pending'
+        self.error: str | None = None
+        self.created_at: float = time.time()
+        self.cancel_event = threading.Event()
+
+    @property
+    def url(self) -> str:
+        """Relative URL the finished export is served from"""
+        return f'/export/{self.job_id}'
+
+    @property
+    def is_finished(self) -> bool:
+        """True if the job is not pending or running anymore"""
+        return self.status in ['done', 'failed', 'cancelled']
+
+    def write(self) -> Path:
+        """
+        Write the dataset to the temporary export file. Meant to be run on a
+        worker thread, e.g. via `nicegui.run.io_bound`.
+
+        Returns:
+            file_path (Path): Path to the written export file
+        """
+        self.status = 'running'
+        start = time.perf_counter()
+        try:
+            self._write()
+        except ExportCancelled:
+            self.status = 'cancelled'
+            self.cleanup()
+            raise
+        except Exception as e:
+            self.status = 'failed'
+            self.error = str(e)
+            self.cleanup()
+            raise
+        finally:
+            ### Drop the reference to the dataset, the file is all we need
+            self.dataset = None
+        self.status = 'done'
+        self.progress = 1.
+        size_mb = os.path.getsize(self.file_path) / 1e6
+        print(
+            f"Export {self.file_name} written ({size_mb:.1f} MB) "
+            f"in {time.perf_counter() - start:.2f} s")
+        return self.file_path
+
+    def _write(self) -> None:
+        """Write the export file, overwritten by subclasses"""
+        write_dataset(
+            self.dataset,
+            self.file_path,
+            export_format = self.export_format,
+            compression_level = self.compression_level,
+            progress_callback = self._set_progress,
+            cancel_event = self.cancel_event
+        )
+
+    def cancel(self) -> None:
+        """Request cancellation of the running export"""
+        self.cancel_event.set()
+
+    def cleanup(self) -> None:
+        """Remove the temporary directory holding the export"""
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def _set_progress(self, progress: float) -> None:
+        self.progress = progress
+
+export_jobs: dict[str, ExportJob] = {}
+
+def register_export_job(job: ExportJob) -> ExportJob:
+    """
+    Register an export job so its file can be served, removing expired ones.
+
+    Args:
+        job (ExportJob): The job to register
+    Returns:
+        job (ExportJob): The registered job
+    """
+    cleanup_export_jobs(max_age_s = EXPORT_JOB_MAX_AGE_S)
+    export_jobs[job.job_id] = job
+    return job
+
+def get_export_job(job_id: str) -> ExportJob | None:
+    """Return the export job with the given ID or None if it does not exist"""
+    return export_jobs.get(job_id)
+
+def cleanup_export_jobs(max_age_s: float | None = None) -> None:
+    """
+    Remove export jobs and their files.
+
+    Args:
+        max_age_s (float | None): Only remove finished jobs older than this.
+            Cancels and removes all jobs if None (e.g. on shutdown).
+    """
+    now = time.time()
+    for job_id, job in list(export_jobs.items()):
+        if max_age_s is not None:
+            if not job.is_finished or now - job.created_at < max_age_s:
+                continue
+        job.cancel()
+        job.cleanup()
+        export_jobs.pop(job_id, None)
+
+@timing_metrics.timed('export_encoding')
+def write_dataset(
+        dataset: Dataset,
+        file_path: Path,
+        export_format: str = 'netcdf',
+        compression_level: int = DEFAULT_COMPRESSION_LEVEL,
+        progress_callback: Callable[[float], None] | None = None,
+        cancel_event: threading.Event | None = None
+        ) -> Path:
+    """
+    Write a dataset to disk one data variable at a time, such that only a
+    single encoded variable is held in memory at any time.
+
+    Args:
+        dataset (Dataset): The xarray Dataset to write
+        file_path (Path): Target file path
+        export_format (str): One of 'netcdf' or 'zarr'
+        compression_level (int): Compression level from 0 (off) to 9
+        progress_callback (Callable): Called with the progress between 0 and 1
+        cancel_event (threading.Event): Aborts the export if set
+    Returns:
+        file_path (Path): Path to the written file
+    """
+    if export_format == 'netcdf':
+        _write_netcdf(
+            dataset, file_path, compression_level, progress_callback, cancel_event)
+    elif export_format == 'zarr':
+        _write_zarr_zip(
+            dataset, file_path, compression_level, progress_callback, cancel_event)
+    else:
+        raise ValueError(
+            f"Export format must be one of {list(EXPORT_FORMATS)}. "
+            f"Is {export_format}")
+    return file_path
+
+def _write_netcdf(dataset, file_path, compression_level, progress_callback, cancel_event):
+    """Write coordinates first and append the data variables one by one"""
+    engine = _get_netcdf_engine()
+    data_vars = list(dataset.data_vars)
+    dataset.drop_vars(data_vars).to_netcdf(file_path, mode='w', engine=engine)
+    for i, var in enumerate(data_vars):
+        _check_cancelled(cancel_event)
+        encoding = {}
+        if compression_level > 0 and engine != 'scipy' and _is_compressible(dataset[var]):
+            encoding[var] = {'zlib': True, 'complevel': compression_level}
+        dataset[[var]].to_netcdf(
+            file_path, mode='a', engine=engine, encoding=encoding)
+        _report_progress(progress_callback, (i + 1) / len(data_vars))
+
+def _write_zarr_zip(dataset, file_path, compression_level, progress_callback, cancel_event):
+    """Write a zarr directory store variable by variable and zip it afterwards"""
+    import zarr
+    from numcodecs import Blosc
+
+    store_path = Path(f'{file_path}.tmp.zarr')
+    data_vars = list(dataset.data_vars)
+    dataset.drop_vars(data_vars).to_zarr(store_path, mode='w', consolidated=False)
+    for i, var in enumerate(data_vars):
+        _check_cancelled(cancel_event)
+        compressor = None
+        if compression_level > 0:
+            compressor = Blosc(
+                cname='zstd', clevel=compression_level, shuffle=Blosc.BITSHUFFLE)
+        dataset[[var]].to_zarr(
+            store_path,
+            mode='a',
+            consolidated=False,
+            encoding={var: {'compressor': compressor}}
+        )
+        _report_progress(progress_callback, 0.9 * (i + 1) / len(data_vars))
+    zarr.consolidate_metadata(str(store_path))
+    _check_cancelled(cancel_event)
+    ### Chunks are already compressed, zip entries are stored as they are
+    with zipfile.ZipFile(file_path, mode='w', compression=zipfile.ZIP_STORED) as zf:
+        for path in sorted(store_path.rglob('*')):
+            if path.is_file():
+                zf.write(path, arcname=path.relative_to(store_path).as_posix())
+    shutil.rmtree(store_path, ignore_errors=True)
+    _report_progress(progress_callback, 1.)
+
+def _get_netcdf_engine() -> str:
+    """Return the best available netCDF engine supporting compression"""
+    if find_spec('netCDF4') is not None:
+        return 'netcdf4'
+    if find_spec('h5netcdf') is not None:
+        return 'h5netcdf'
+    return 'scipy'
+
+def _is_compressible(data_array) -> bool:
+    return data_array.ndim > 0 and data_array.dtype.kind in 'biuf'
+
+def _check_cancelled(cancel_event: threading.Event | None) -> None:
+    if cancel_event is not None and cancel_event.is_set():
+        raise ExportCancelled('Export was cancelled')
+
+def _report_progress(progress_callback, progress: float) -> None:
+    if progress_callback is not None:
+        progress_callback(progress)
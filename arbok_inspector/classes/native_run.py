@@ -15,6 +15,8 @@ if TYPE_CHECKING:
     from xarray import Dataset
 
 COLUMN_LABELS = {}
+### Runs holding less data are always loaded at once
+PARTIAL_READ_MIN_BYTES = 64 * 1024**2
 
 class NativeRun(BaseRun):
     """"""
@@ -64,6 +66,20 @@ class NativeRun(BaseRun):
         dataset = xr.open_zarr(store, consolidated=True)
         return dataset
 
+    def _load_partial_dataset(self, fraction: float) -> Dataset | None:
+        """
+        Select the first batches along the outermost dim of the lazily opened
+        zarr store, only their chunks are read once the data is accessed.
+        """
+        dataset = self._load_dataset()
+        if dataset.nbytes < PARTIAL_READ_MIN_BYTES or len(dataset.dims) == 0:
+            return None
+        outer_dim = next(iter(dataset.dims))
+        end = int(dataset.sizes[outer_dim] * fraction)
+        if end < 1 or end >= dataset.sizes[outer_dim]:
+            return None
+        return dataset.isel({outer_dim: slice(0, end)})
+
     def get_qua_code(self, as_string: bool = False) -> str:
         """
         Retrieve the QUA code associated with this run.
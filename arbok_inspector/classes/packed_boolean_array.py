@@ -0,0 +1,174 @@
+"""
+Module containing the PackedBooleanArray storing 0/1 results bit-packed.
+
+Results like qubit state assignments are loaded as float64 although they only
+hold one bit of information. Packed variables are wrapped in xarray's lazily
+indexed arrays, so selecting a subset of a packed variable only unpacks the
+selected values. They keep the dtype they were loaded with, such that packing
+does not change what the dataset exposes or exports. Sums over the packed last
+axis are computed with a popcount of the packed bytes without unpacking them at
+all, using `np.bitwise_count` of numpy 2.
+"""
+from __future__ import annotations
+from typing import TYPE_CHECKING
+
+import numpy as np
+import xarray as xr
+from xarray.backends import BackendArray
+from xarray.core import indexing
+
+if TYPE_CHECKING:
+    from xarray import Dataset, DataArray
+
+class PackedBooleanArray(BackendArray):
+    """Array of zeros and ones stored with one bit per value, packed along its last axis"""
+    def __init__(
+            self, packed: np.ndarray, shape: tuple[int, ...], dtype: np.dtype = bool):
+        """
+        Constructor for PackedBooleanArray class
+
+        Args:
+            packed (np.ndarray): uint8 array as returned by `np.packbits` along
+                the last axis with little bit order
+            shape (tuple[int, ...]): Shape of the unpacked array
+            dtype (np.dtype): Dtype the unpacked values are returned as
+        """
+        self.packed = packed
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+
+    @classmethod
+    def from_array(cls, values: np.ndarray) -> PackedBooleanArray:
+        """Pack an array of zeros and ones, keeping its dtype"""
+        values = np.asarray(values)
+        packed = np.packbits(values.astype(bool), axis=-1, bitorder='little')
+        return cls(packed, values.shape, values.dtype)
+
+    @property
+    def nbytes(self) -> int:
+        """Size of the packed data in bytes"""
+        return self.packed.nbytes
+
+    def __getitem__(self, key: indexing.ExplicitIndexer) -> np.ndarray:
+        return indexing.explicit_indexing_adapter(
+            key, self.shape, indexing.IndexingSupport.BASIC, self._getitem)
+
+    def _getitem(self, key: tuple) -> np.ndarray:
+        return self._unpack(key).astype(self.dtype, copy=False)
+
+    def _unpack(self, key: tuple) -> np.ndarray:
+        *outer_key, last_key = key
+        packed = self.packed[tuple(outer_key)]
+        if isinstance(last_key, (int, np.integer)):
+            last_key = int(last_key) % self.shape[-1]
+            return ((packed[..., last_key // 8] >> (last_key % 8)) & 1).astype(bool)
+        start, stop, step = last_key.indices(self.shape[-1])
+        if step < 0 or stop <= start:
+            unpacked = np.unpackbits(
+                packed, axis=-1, count=self.shape[-1], bitorder='little')
+            return unpacked[..., last_key].view(bool)
+        ### Only unpack the bytes holding the selected bits
+        first_byte = start // 8
+        unpacked = np.unpackbits(
+            packed[..., first_byte:(stop + 7) // 8], axis=-1, bitorder='little')
+        offset = first_byte * 8
+        return unpacked[..., start - offset:stop - offset:step].view(bool)
+
+    def count_ones(
+            self, axes: tuple[int, ...], chunk_elements: int) -> np.ndarray:
+        """
+        Number of ones over the given axes. If the last axis is summed over,
+        the packed bytes are counted with a popcount, otherwise only chunks
+        along the outermost summed axis are unpacked.
+
+        Args:
+            axes (tuple[int, ...]): Sorted axes to sum over
+            chunk_elements (int): Maximum number of unpacked elements per chunk
+        Returns:
+            ones (np.ndarray): Counts with the summed axes kept with size 1
+        """
+        ndim = len(self.shape)
+        ones = np.zeros(
+            [1 if i in axes else n for i, n in enumerate(self.shape)], dtype=np.int64)
+        if len(axes) == 0:
+            return ones + self[indexing.BasicIndexer((slice(None),) * ndim)]
+        axis = axes[0]
+        size = self.shape[axis]
+        step = max(1, chunk_elements // max(int(np.prod(self.shape)) // size, 1))
+        for start in range(0, size, step):
+            index = (slice(None),) * axis + (slice(start, start + step),)
+            if ndim - 1 in axes:
+                chunk = np.bitwise_count(self.packed[index])
+            else:
+                chunk = np.unpackbits(
+                    self.packed[index], axis=-1, count=self.shape[-1],
+                    bitorder='little')
+            ones += chunk.sum(axis=axes, keepdims=True, dtype=np.int64)
+        return ones
+
+def get_packed_array(data: DataArray) -> PackedBooleanArray | None:
+    """
+    Return the packed array holding the data, if the data is a packed variable
+    that was neither indexed nor transposed.
+    """
+    array = getattr(data.variable, '_data', None)
+    if not isinstance(array, indexing.LazilyIndexedArray):
+        return None
+    if not isinstance(array.array, PackedBooleanArray):
+        return None
+    if array.shape != array.array.shape:
+        return None
+    if any(k != slice(None) for k in array.key.tuple):
+        return None
+    return array.array
+
+def is_boolean_valued(values: np.ndarray) -> bool:
+    """Whether the array only holds zeros and ones"""
+    if values.dtype == bool:
+        return True
+    if values.dtype.kind not in 'iuf' or values.size == 0:
+        return False
+    return bool(np.all((values == 0) | (values == 1)))
+
+def is_boolean_variable(data: DataArray) -> bool:
+    """
+    Whether the variable only holds zeros and ones. Lazily loaded (dask)
+    variables are not loaded into memory, their first entry along the
+    outermost dim is checked first and the rest chunk by chunk.
+    """
+    if data.dtype == bool:
+        return True
+    if data.dtype.kind not in 'iuf' or data.size == 0:
+        return False
+    if data.chunks is None:
+        return is_boolean_valued(np.asarray(data.values))
+    def check(subset: DataArray) -> bool:
+        return bool(((subset == 0) | (subset == 1)).all().compute())
+    ### Most float results already fail on their first values
+    return check(data.isel({data.dims[0]: slice(0, 1)})) and check(data)
+
+def pack_boolean_variables(dataset: Dataset) -> tuple[Dataset, int]:
+    """
+    Replace all data variables that only hold zeros and ones with bit-packed
+    variables of the same dtype. Variables containing NaN (e.g. of unfinished
+    runs) are left unchanged.
+
+    Args:
+        dataset (Dataset): Dataset to pack
+    Returns:
+        dataset (Dataset): Dataset with packed boolean variables
+        saved_bytes (int): Memory saved by packing
+    """
+    packed_variables = {}
+    saved_bytes = 0
+    for name, data in dataset.data_vars.items():
+        if data.ndim == 0 or not is_boolean_variable(data):
+            continue
+        values = np.asarray(data.values)
+        packed = PackedBooleanArray.from_array(values)
+        saved_bytes += values.nbytes - packed.nbytes
+        packed_variables[name] = xr.Variable(
+            data.dims, indexing.LazilyIndexedArray(packed), attrs=data.attrs)
+    if packed_variables:
+        dataset = dataset.assign(packed_variables)
+    return dataset, saved_bytes
@@ -0,0 +1,135 @@
+"""
+Module containing the ProfileCapture recording a profile of a tab's next calls.
+
+A capture is armed from the debug dialog of the run view and stored in the
+tab storage. The next plot rebuilds or the next reload of that tab are then
+run under a deterministic `cProfile` profiler until the requested number of
+calls was recorded. The profile can be summarized by its top functions or
+downloaded in the `pstats` format, e.g. for `snakeviz`.
+"""
+from __future__ import annotations
+from typing import Any, Callable
+
+import io
+import time
+import marshal
+import pstats
+import cProfile
+import functools
+
+from nicegui import app
+
+PROFILE_TARGETS = ['rebuild', 'reload']
+PROFILE_SORT_KEYS = ['cumulative', 'tottime', 'ncalls']
+TAB_STORAGE_KEY = 'profile_capture'
+
+class ProfileCapture:
+    """Deterministic profile of the next calls of a profiling target"""
+    def __init__(
+            self,
+            target: str,
+            n_calls: int = 1,
+            on_finished: Callable[[ProfileCapture], Any] | None = None
+            ):
+        """
+        Constructor for ProfileCapture class
+
+        Args:
+            target (str): 'rebuild' to profile plot rebuilds, 'reload' to
+                profile loading the dataset and the rebuild after it
+            n_calls (int): Number of calls to record
+            on_finished (Callable | None): Called with the capture once all
+                calls are recorded
+        """
+        if target not in PROFILE_TARGETS:
+            raise ValueError(f"Target must be one of {PROFILE_TARGETS}. Is {target}")
+        self.target: str = target
+        self.n_calls: int = max(1, int(n_calls))
+        self.on_finished = on_finished
+        self.recorded_calls: int = 0
+        self.profiled_seconds: float = 0.
+        self.error: str | None = None
+        self.profile = cProfile.Profile()
+
+    @property
+    def is_armed(self) -> bool:
+        """True while calls are still to be recorded"""
+        return self.error is None and self.recorded_calls < self.n_calls
+
+    def run(self, function: Callable, *args, **kwargs) -> Any:
+        """
+        Call the function under the profiler. Only one profiler can be active
+        in the process, if another one is running the function is called
+        without profiling and the capture is stopped with an error.
+
+        Returns:
+            result: The return value of the function
+        """
+        try:
+            self.profile.enable()
+        except ValueError as e:
+            self.error = f"Profiler not available: {e}"
+            print(self.error)
+            return function(*args, **kwargs)
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            self.profile.disable()
+            self.profiled_seconds += time.perf_counter() - start
+
+    def count_call(self) -> None:
+        """Count a recorded call and report the capture once it is finished"""
+        self.recorded_calls += 1
+        if not self.is_armed and self.on_finished is not None:
+            self.on_finished(self)
+
+    def summary(self, n_functions: int = 25, sort_key: str = 'cumulative') -> str:
+        """
+        Table of the top functions of the profile as printed by `pstats`.
+
+        Args:
+            n_functions (int): Number of functions to list
+            sort_key (str): Sort key, one of `PROFILE_SORT_KEYS`
+        Returns:
+            summary (str): The formatted table
+        """
+        if self.recorded_calls == 0:
+            return 'Nothing recorded'
+        stream = io.StringIO()
+        stats = pstats.Stats(self.profile, stream=stream)
+        stats.strip_dirs().sort_stats(sort_key).print_stats(n_functions)
+        return stream.getvalue()
+
+    def to_bytes(self) -> bytes:
+        """Serialize the profile in the format of `pstats.Stats.dump_stats`"""
+        self.profile.create_stats()
+        return marshal.dumps(self.profile.stats)
+
+def get_armed_capture(target: str) -> ProfileCapture | None:
+    """Return the armed capture of the current tab for the target, if any"""
+    capture: ProfileCapture | None = app.storage.tab.get(TAB_STORAGE_KEY)
+    if capture is None or capture.target != target or not capture.is_armed:
+        return None
+    return capture
+
+def profiled(target: str) -> Callable[[Callable], Callable]:
+    """
+    Decorator recording calls of the decorated function in the armed capture
+    of the current tab. Has to be called in the context of a client.
+
+    Args:
+        target (str): Profiling target the function belongs to
+    """
+    def decorator(function: Callable) -> Callable:
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            capture = get_armed_capture(target)
+            if capture is None:
+                return function(*args, **kwargs)
+            try:
+                return capture.run(function, *args, **kwargs)
+            finally:
+                capture.count_call()
+        return wrapper
+    return decorator
@@ -19,6 +19,8 @@ if TYPE_CHECKING:
     from xarray import Dataset
 
 COLUMN_LABELS = {}
+### Runs with fewer results are always loaded at once
+PARTIAL_READ_MIN_RESULTS = 100_000
 
 def with_sqlite_connection(func):
     """
@@ -39,16 +41,21 @@ class QcodesRun(BaseRun):
     """"""
     def __init__(
         self,
-        run_id: int
+        run_id: int,
+        db_path: str | Path | None = None
     ):
         """
         Constructor for QcodesRun class
         
         Args:
             run_id (int): Run ID of the measurement run
+            db_path (str | Path | None): Path to the database. Taken from the
+                tab storage if None
         """
         super().__init__(run_id)
-        self.db_path = app.storage.tab["qcodes_db_path"]
+        if db_path is None:
+            db_path = app.storage.tab["qcodes_db_path"]
+        self.db_path = db_path
 
     @with_sqlite_connection
     def _load_dataset(self, conn) -> Dataset:
@@ -58,6 +65,17 @@ class QcodesRun(BaseRun):
         dataset = dataset.to_xarray_dataset(use_multi_index = 'never')
         return dataset
 
+    @with_sqlite_connection
+    def _load_partial_dataset(self, conn, fraction: float) -> Dataset | None:
+        """Load the first results of the run, i.e. its first iterations."""
+        dataset = load_by_id(self.run_id, conn=conn)
+        n_results = dataset.number_of_results
+        end = int(n_results * fraction)
+        if n_results < PARTIAL_READ_MIN_RESULTS or end < 1 or end >= n_results:
+            return None
+        self.name = dataset.name
+        return dataset.to_xarray_dataset(end = end, use_multi_index = 'never')
+
     @with_sqlite_connection
     def _get_database_columns(self, conn) -> dict[str, dict[str, str]]:
         conn.row_factory = sqlite3.Row
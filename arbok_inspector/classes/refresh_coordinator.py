@@ -0,0 +1,193 @@
+"""
+Module containing the RefreshCoordinator scheduling dataset reloads.
+
+Reloads are coordinated per run instead of by a single global lock:
+
+- concurrent reload requests for the same run share one in-flight load
+- reloads of different runs run in parallel up to `max_concurrent_loads`
+- low priority loads (e.g. prefetches) run one at a time and only while no
+  regular load is waiting for a slot. They are promoted once a regular request
+  joins them and can be cancelled while still waiting
+"""
+from __future__ import annotations
+from typing import TYPE_CHECKING, Any, Callable
+
+import asyncio
+
+from nicegui import run as nicegui_run
+
+from arbok_inspector.state import inspector
+
+if TYPE_CHECKING:
+    from arbok_inspector.classes.base_run import BaseRun
+
+DEFAULT_MAX_CONCURRENT_LOADS = 4
+
+class RefreshCoordinator:
+    """Shares in-flight loads per key and limits the number of parallel loads"""
+    def __init__(self, max_concurrent_loads: int = DEFAULT_MAX_CONCURRENT_LOADS):
+        """
+        Constructor for RefreshCoordinator class
+
+        Args:
+            max_concurrent_loads (int): Maximum number of loads of different
+                keys executed at the same time
+        """
+        self._max_concurrent_loads: int = max(1, int(max_concurrent_loads))
+        self._running_loads: int = 0
+        self._running_low_priority_loads: int = 0
+        self._condition: asyncio.Condition | None = None
+        self._in_flight: dict[tuple, asyncio.Task] = {}
+        ### Keys of loads waiting for a slot and of those only requested at low priority
+        self._waiting: set[tuple] = set()
+        self._low_priority: set[tuple] = set()
+
+    @property
+    def max_concurrent_loads(self) -> int:
+        """Maximum number of loads executed at the same time"""
+        return self._max_concurrent_loads
+
+    @max_concurrent_loads.setter
+    def max_concurrent_loads(self, value: int) -> None:
+        self._max_concurrent_loads = max(1, int(value))
+        if self._condition is not None:
+            asyncio.get_running_loop().create_task(self._notify_all())
+
+    def is_loading(self, key: tuple) -> bool:
+        """True if a load for the given key is in flight"""
+        return key in self._in_flight
+
+    async def load(
+            self,
+            key: tuple,
+            loader: Callable[[], Any],
+            low_priority: bool = False
+            ) -> Any:
+        """
+        Run the loader on a worker thread, or join the load already in flight
+        for the same key. Cancelling one waiter does not cancel the shared
+        load for the others.
+
+        Args:
+            key (tuple): Key identifying the loaded data, e.g. from `run_key`
+            loader (Callable): Blocking function returning the loaded data
+            low_priority (bool): Whether to wait until no regular load is
+                waiting, see `cancel`
+        Returns:
+            result: The return value of the loader
+        """
+        task = self._in_flight.get(key)
+        if task is None:
+            if low_priority:
+                self._low_priority.add(key)
+            task = asyncio.create_task(self._load(key, loader))
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        elif not low_priority and key in self._low_priority:
+            ### Joined by a regular request, e.g. opening a prefetched run
+            self._low_priority.discard(key)
+            await self._notify_all()
+        return await asyncio.shield(task)
+
+    def cancel(self, key: tuple) -> bool:
+        """
+        Cancel a low priority load that is still waiting for a slot. Loads
+        already running or requested at regular priority are not cancelled.
+
+        Args:
+            key (tuple): Key of the load
+        Returns:
+            cancelled (bool): True if the load was cancelled
+        """
+        task = self._in_flight.get(key)
+        if task is None or key not in self._low_priority or key not in self._waiting:
+            return False
+        return task.cancel()
+
+    async def _load(self, key: tuple, loader: Callable[[], Any]) -> Any:
+        condition = self._get_condition()
+        async with condition:
+            self._waiting.add(key)
+            try:
+                await condition.wait_for(lambda: self._can_start(key))
+            except asyncio.CancelledError:
+                self._low_priority.discard(key)
+                raise
+            finally:
+                self._waiting.discard(key)
+            is_low_priority = key in self._low_priority
+            self._low_priority.discard(key)
+            self._running_loads += 1
+            self._running_low_priority_loads += is_low_priority
+            ### Low priority loads may start once no regular load waits anymore
+            condition.notify_all()
+        try:
+            return await nicegui_run.io_bound(loader)
+        finally:
+            async with condition:
+                self._running_loads -= 1
+                self._running_low_priority_loads -= is_low_priority
+                condition.notify_all()
+
+    def _can_start(self, key: tuple) -> bool:
+        if self._running_loads >= self._max_concurrent_loads:
+            return False
+        if key not in self._low_priority:
+            return True
+        return (
+            self._running_low_priority_loads == 0
+            and self._waiting <= self._low_priority)
+
+    async def _notify_all(self) -> None:
+        condition = self._get_condition()
+        async with condition:
+            condition.notify_all()
+
+    def _get_condition(self) -> asyncio.Condition:
+        ### Created lazily to bind to the event loop of the running app
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        return self._condition
+
+def database_key() -> tuple:
+    """Key identifying the database currently selected in the inspector"""
+    if inspector.database_type == 'qcodes':
+        return ('qcodes', str(inspector.qcodes_database_path))
+    return (inspector.database_type, str(inspector.database_engine.url))
+
+def run_key(run: BaseRun | int) -> tuple:
+    """
+    Key identifying the dataset of a run in the selected database.
+
+    Args:
+        run (BaseRun | int): The run or its ID
+    Returns:
+        key (tuple): The key of the run
+    """
+    run_id = run if isinstance(run, int) else run.run_id
+    return ('run', database_key(), int(run_id))
+
+async def reload_run_dataset(run: BaseRun) -> None:
+    """
+    Reload the dataset of the given run, sharing the load with all other
+    requests for the same run.
+
+    Args:
+        run (BaseRun): The run to reload
+    """
+    run.full_data_set = await refresh_coordinator.load(
+        run_key(run), run.load_dataset)
+
+async def reload_if_released(run: BaseRun) -> None:
+    """
+    Reload the dataset of a run released while its tab was idle. Awaited at
+    the start of the event handlers of the run view, such that a released
+    run reloads transparently on the next interaction with its tab.
+
+    Args:
+        run (BaseRun): The run of the tab
+    """
+    if run.is_released:
+        await reload_run_dataset(run)
+
+refresh_coordinator = RefreshCoordinator()
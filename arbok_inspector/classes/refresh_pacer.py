@@ -0,0 +1,95 @@
+"""
+Module containing the RefreshPacer adapting the auto-plot interval of a tab.
+
+One auto-plot cycle consists of loading the new data (shared by all tabs of
+the run), reducing and building the plots on the server and rendering them
+in the browser, which reports back how long the update took. The pacer keeps
+moving averages of these timings and stretches the polling interval of the
+tab to the measured cycle, such that updates are not requested faster than
+they can be shown.
+"""
+from __future__ import annotations
+
+import time
+
+DEFAULT_HEADROOM = 1.2
+DEFAULT_WEIGHT = 0.3
+
+class RefreshPacer:
+    """Moving averages of the auto-plot cycle of a tab"""
+    def __init__(self, headroom: float = DEFAULT_HEADROOM, weight: float = DEFAULT_WEIGHT):
+        """
+        Constructor for RefreshPacer class
+
+        Args:
+            headroom (float): Factor the effective interval is longer than the
+                measured cycle
+            weight (float): Weight of the newest timing in the moving averages
+        """
+        self.headroom: float = headroom
+        self.weight: float = weight
+        self.fetch_s: float | None = None
+        self.server_s: float | None = None
+        self.round_trip_s: float | None = None
+        self.render_s: float | None = None
+        self.achieved_interval_s: float | None = None
+        self.updates: int = 0
+        self._last_update: float | None = None
+
+    def _average(self, average: float | None, value: float | None) -> float | None:
+        if value is None:
+            return average
+        if average is None:
+            return value
+        return (1 - self.weight) * average + self.weight * value
+
+    def record(
+            self,
+            fetch_s: float | None,
+            server_s: float,
+            round_trip_s: float | None,
+            render_s: float | None
+            ) -> None:
+        """
+        Add the timings of a finished update.
+
+        Args:
+            fetch_s (float | None): Duration of loading the new data
+            server_s (float): Duration of reducing and building the plots
+            round_trip_s (float | None): Time from sending the plots until the
+                browser reported them rendered, None if not reported
+            render_s (float | None): Render duration reported by the browser
+        """
+        self.fetch_s = self._average(self.fetch_s, fetch_s)
+        self.server_s = self._average(self.server_s, server_s)
+        self.round_trip_s = self._average(self.round_trip_s, round_trip_s)
+        self.render_s = self._average(self.render_s, render_s)
+        now = time.perf_counter()
+        if self._last_update is not None:
+            self.achieved_interval_s = self._average(
+                self.achieved_interval_s, now - self._last_update)
+        self._last_update = now
+        self.updates += 1
+
+    @property
+    def cycle_s(self) -> float:
+        """Average duration of one update from loading until it is shown"""
+        return sum(t for t in (self.fetch_s, self.server_s, self.round_trip_s) if t)
+
+    def effective_interval(self, requested: float) -> float:
+        """The requested interval, stretched to the measured cycle if longer"""
+        return max(requested, self.headroom * self.cycle_s)
+
+    def status_text(self, skipped: int = 0) -> str:
+        """Achieved refresh rate and the parts of the cycle for the UI"""
+        if self.updates == 0:
+            return 'waiting for new data'
+        def ms(seconds: float | None) -> str:
+            return '-' if seconds is None else f'{seconds * 1e3:.0f}'
+        if self.achieved_interval_s is None:
+            rate = 'first update shown'
+        else:
+            rate = f'{1 / self.achieved_interval_s:.2f} updates/s'
+        return (
+            f'{rate}, load {ms(self.fetch_s)} ms, plot {ms(self.server_s)} ms, '
+            f'render {ms(self.render_s)} ms, {skipped} skipped')
@@ -0,0 +1,39 @@
+"""Module containing the factory creating run objects for the database type"""
+from __future__ import annotations
+from typing import TYPE_CHECKING
+
+from arbok_inspector.state import inspector
+
+if TYPE_CHECKING:
+    from pathlib import Path
+    from arbok_inspector.classes.base_run import BaseRun
+
+def build_run(
+        run_id: int,
+        database_type: str | None = None,
+        db_path: str | Path | None = None
+        ) -> BaseRun:
+    """
+    Create an (unloaded) Run object for the given run ID.
+
+    Args:
+        run_id (int): ID of the run
+        database_type (str | None): 'qcodes' or 'native_arbok'. Taken from the
+            inspector if None
+        db_path (str | Path | None): Path to the QCoDeS database. Taken from
+            the tab storage if None
+    Returns:
+        run (BaseRun): The run object for the given database type
+    """
+    if database_type is None:
+        database_type = inspector.database_type
+    ### Only the backend of the chosen database type is imported
+    if database_type == 'qcodes':
+        from arbok_inspector.classes.qcodes_run import QcodesRun
+        return QcodesRun(int(run_id), db_path=db_path)
+    if database_type in ['native_arbok', 'arbok_native']:
+        from arbok_inspector.classes.native_run import NativeRun
+        return NativeRun(int(run_id))
+    raise ValueError(
+        "Database type must be 'qcodes' or 'native_arbok' is: "
+        f"{database_type}")
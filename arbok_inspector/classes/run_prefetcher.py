@@ -0,0 +1,163 @@
+"""
+Module containing the RunPrefetcher loading runs before their tab is opened.
+
+Focusing a row of the run grid (by a click or the keyboard) starts loading the
+run in the background at low priority, see `RefreshCoordinator.load`. The
+dataset is kept in the shared dataset cache and the database columns next to
+it, both keyed by the version of the run data. Opening the run then takes the
+prefetched data if the run did not change since, joins the prefetch if it is
+still in flight or loads the run itself otherwise. Moving the focus on to
+another run cancels the prefetch of the previous one if it did not start yet.
+"""
+from __future__ import annotations
+from typing import TYPE_CHECKING
+
+import asyncio
+import threading
+from collections import OrderedDict
+
+from nicegui import app
+from nicegui import run as nicegui_run
+
+from arbok_inspector.state import inspector
+from arbok_inspector.classes.dataset_cache import dataset_cache
+from arbok_inspector.classes.change_detector import get_change_detector
+from arbok_inspector.classes.refresh_coordinator import refresh_coordinator, run_key
+
+if TYPE_CHECKING:
+    from xarray import Dataset
+    from arbok_inspector.classes.base_run import BaseRun
+
+TAB_STORAGE_KEY = 'prefetch_key'
+
+class RunPrefetcher:
+    """Loads runs into the shared dataset cache ahead of opening them"""
+    def __init__(self):
+        ### Database columns and loading results of the cached datasets
+        self._metadata: OrderedDict[tuple, dict] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def cache_key(self, run_id: int) -> tuple:
+        """
+        Key of the run's dataset in the shared cache. Queries the database for
+        the version of the run data, hence blocking.
+
+        Args:
+            run_id (int): ID of the run
+        Returns:
+            key (tuple): The run key extended by the version of the run data
+        """
+        detector = get_change_detector(
+            inspector.database_type,
+            db_path = inspector.qcodes_database_path,
+            engine = inspector.database_engine
+        )
+        return run_key(int(run_id)) + (detector.run_version(int(run_id)),)
+
+    async def is_cached(self, run_id: int) -> bool:
+        """Whether the current version of the run is in the shared cache"""
+        key = await nicegui_run.io_bound(self.cache_key, run_id)
+        return key in dataset_cache
+
+    async def prefetch(self, run_id: int) -> None:
+        """
+        Prefetch a run at low priority, cancelling the queued prefetch of the
+        previously focused run of the current tab.
+
+        Args:
+            run_id (int): ID of the run
+        """
+        from arbok_inspector.classes.run_factory import build_run
+
+        key = await nicegui_run.io_bound(self.cache_key, run_id)
+        previous_key = app.storage.tab.get(TAB_STORAGE_KEY)
+        if key == previous_key:
+            return
+        if previous_key is not None and refresh_coordinator.cancel(previous_key):
+            print(f"Cancelled prefetch of run {previous_key[2]}")
+        app.storage.tab[TAB_STORAGE_KEY] = key
+        if key in dataset_cache:
+            return
+        run = build_run(
+            run_id, inspector.database_type, inspector.qcodes_database_path)
+        try:
+            await refresh_coordinator.load(
+                key, lambda: self._load(key, run), low_priority=True)
+        except asyncio.CancelledError:
+            return
+        except Exception as e:
+            ### Not reported to the user, opening the run loads it again
+            print(f"Error prefetching run {run_id}: {e}")
+            return
+        print(f"Prefetched run {run_id}")
+
+    async def load_run(self, run: BaseRun) -> None:
+        """
+        Load the database columns and the dataset of the run with
+        `load_dataset` and set the dataset of the run.
+
+        Args:
+            run (BaseRun): The run to load
+        """
+        run.full_data_set = await self.load_dataset(run)
+
+    async def load_dataset(self, run: BaseRun) -> Dataset:
+        """
+        Load the database columns and the dataset of the run, taking them from
+        the prefetch if the run did not change since. The dataset of the run
+        is not set, such that the caller can drop it if newer data was set in
+        the meantime.
+
+        Args:
+            run (BaseRun): The run to load
+        Returns:
+            dataset (Dataset): The loaded dataset
+        """
+        key = await nicegui_run.io_bound(self.cache_key, run.run_id)
+        if key in dataset_cache or refresh_coordinator.is_loading(key):
+            print(f"Run {run.run_id}: using prefetched dataset")
+        dataset = await refresh_coordinator.load(key, lambda: self._load(key, run))
+        with self._lock:
+            metadata = self._metadata.get(key)
+        if metadata is None:
+            ### Evicted in the meantime, only reachable in a race with the cache
+            def load() -> Dataset:
+                run.load_database_columns()
+                return run.load_dataset()
+            return await nicegui_run.io_bound(load)
+        if metadata['name'] is not None:
+            run.name = metadata['name']
+        run._database_columns = metadata['database_columns']
+        run.result_dtype = metadata['result_dtype']
+        run.saved_bytes = metadata['saved_bytes']
+        return dataset
+
+    def forget(self, run: BaseRun) -> None:
+        """Drop the cached datasets of a run, e.g. once its tab released it"""
+        prefix = run_key(run)
+        dataset_cache.invalidate(lambda key: key[:len(prefix)] == prefix)
+
+    def _load(self, key: tuple, run: BaseRun) -> Dataset:
+        """Load the run into the cache unless it is cached already"""
+        def load() -> Dataset:
+            ### Not set on the run, `load_dataset` returns it to the caller
+            run.load_database_columns()
+            dataset = run.load_dataset()
+            self._remember(key, run)
+            return dataset
+        return dataset_cache.get_or_load(key, load)
+
+    def _remember(self, key: tuple, run: BaseRun) -> None:
+        with self._lock:
+            ### Stored before the dataset is cached, evicted datasets are dropped
+            for cached_key in list(self._metadata):
+                if cached_key not in dataset_cache:
+                    del self._metadata[cached_key]
+            self._metadata[key] = {
+                'name': getattr(run, 'name', None),
+                'database_columns': run.database_columns,
+                'result_dtype': run.result_dtype,
+                'saved_bytes': run.saved_bytes,
+            }
+
+run_prefetcher = RunPrefetcher()
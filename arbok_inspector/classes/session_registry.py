@@ -0,0 +1,286 @@
+"""
+Module containing the SessionRegistry accounting the memory held by run tabs.
+
+Every run tab registers its run. The registry sums the bytes of the loaded
+dataset, the last reduced subset and the cached reductions of each run and
+enforces a global memory budget: once the runs of all tabs and the datasets in the shared
+`dataset_cache` hold more than the budget, cached datasets no tab holds (e.g.
+prefetched runs) are evicted first, then the data of the tabs idle for the
+longest time is released until the total is below the budget again. The tab of a released run shows a button
+reloading its dataset, see `BaseRun.release_data`.
+"""
+from __future__ import annotations
+from typing import TYPE_CHECKING, Callable
+
+import time
+
+import numpy as np
+from xarray.core import indexing
+
+from arbok_inspector.classes.dataset_cache import dataset_cache
+from arbok_inspector.classes.packed_boolean_array import PackedBooleanArray
+from arbok_inspector.classes.run_prefetcher import run_prefetcher
+
+if TYPE_CHECKING:
+    from nicegui import Client
+    from xarray import Dataset, Variable
+    from arbok_inspector.classes.base_run import BaseRun
+
+DEFAULT_MEMORY_BUDGET_BYTES = 8 * 1024**3
+DEFAULT_IDLE_TIMEOUT_S = 10 * 60
+MEMORY_CHECK_INTERVAL_S = 30
+
+class Session:
+    """A run tab registered in the session registry"""
+    def __init__(self, client: Client, run: BaseRun):
+        """
+        Constructor for Session class
+
+        Args:
+            client (Client): Client (tab) showing the run
+            run (BaseRun): The run shown in the tab
+        """
+        self.client = client
+        self.run = run
+        self.opened_at: float = time.time()
+        self.released_count: int = 0
+        ### Called in the context of the client after the data was released
+        self.on_release: Callable[[], None] | None = None
+
+    @property
+    def idle_seconds(self) -> float:
+        """Seconds since the run was last shown"""
+        return time.time() - self.run.last_active
+
+class SessionRegistry:
+    """Tracks the memory held by the runs of all tabs and enforces a budget"""
+    def __init__(
+            self,
+            budget_bytes: int | None = DEFAULT_MEMORY_BUDGET_BYTES,
+            idle_timeout_s: float = DEFAULT_IDLE_TIMEOUT_S
+            ):
+        """
+        Constructor for SessionRegistry class
+
+        Args:
+            budget_bytes (int | None): Memory the runs of all tabs may hold,
+                None disables the budget
+            idle_timeout_s (float): Seconds without interaction after which
+                the data of a tab may be released
+        """
+        self.budget_bytes: int | None = budget_bytes
+        self.idle_timeout_s: float = idle_timeout_s
+        self.released_bytes: int = 0
+        self._sessions: dict[str, Session] = {}
+
+    @property
+    def sessions(self) -> list[Session]:
+        """All registered sessions"""
+        return list(self._sessions.values())
+
+    def register(self, client: Client, run: BaseRun) -> Session:
+        """
+        Register the run shown in a tab, replacing the run shown before. The
+        session is removed once the client is deleted.
+
+        Args:
+            client (Client): Client (tab) showing the run
+            run (BaseRun): The run shown in the tab
+        Returns:
+            session (Session): The registered session
+        """
+        is_new = client.id not in self._sessions
+        session = Session(client, run)
+        self._sessions[client.id] = session
+        if is_new:
+            client.on_delete(lambda: self.unregister(client.id))
+        return session
+
+    def unregister(self, client_id: str) -> None:
+        """Remove the session of a client"""
+        self._sessions.pop(client_id, None)
+
+    def usage(self) -> dict[str, int]:
+        """
+        Bytes held by the run of every tab. Arrays shared between the datasets
+        of a run are only counted once.
+
+        Returns:
+            usage (dict[str, int]): Bytes by client ID
+        """
+        return {
+            client_id: sum(run_buffers(session.run).values())
+            for client_id, session in self._sessions.items()}
+
+    def session_buffers(self) -> dict[int, int]:
+        """Bytes of every array held by the runs of all tabs by array ID"""
+        buffers = {}
+        for session in self._sessions.values():
+            buffers.update(run_buffers(session.run))
+        return buffers
+
+    def cached_bytes(self) -> int:
+        """Bytes of the cached datasets not held by any tab"""
+        held = self.session_buffers()
+        buffers = {}
+        for dataset in dataset_cache.values():
+            buffers.update(dataset_buffers(dataset))
+        return sum(n for array_id, n in buffers.items() if array_id not in held)
+
+    def total_bytes(self) -> int:
+        """
+        Bytes held by all tabs and the shared dataset cache, arrays shared
+        between tabs and cached datasets counted once
+        """
+        return sum(self.session_buffers().values()) + self.cached_bytes()
+
+    def enforce(self) -> int:
+        """
+        Evict cached datasets no tab holds, least recently used first, then
+        release the data of idle tabs, longest idle first, until the total is
+        below the budget. Tabs active within the idle timeout are kept even if
+        the budget is exceeded.
+
+        Returns:
+            released (int): Number of released tabs
+        """
+        if self.budget_bytes is None:
+            return 0
+        total = self.total_bytes()
+        if total <= self.budget_bytes:
+            return 0
+        total = self._evict_cached(total)
+        if total <= self.budget_bytes:
+            return 0
+        usage = self.usage()
+        candidates = sorted(
+            (s for s in self._sessions.values()
+             if not s.run.is_released and s.idle_seconds > self.idle_timeout_s),
+            key = lambda s: s.run.last_active)
+        released = 0
+        for session in candidates:
+            if total <= self.budget_bytes:
+                break
+            n_bytes = usage[session.client.id]
+            self.release(session)
+            total -= n_bytes
+            released += 1
+        if total > self.budget_bytes:
+            print(
+                f"Memory budget exceeded: {total / 1024**2:.0f} MB held by "
+                f"active tabs, budget {self.budget_bytes / 1024**2:.0f} MB")
+        return released
+
+    def _evict_cached(self, total: int) -> int:
+        """
+        Evict cached datasets not held by any tab until the total is below the
+        budget. Entries shared with a tab are kept since evicting them frees
+        nothing.
+
+        Args:
+            total (int): Bytes currently held
+        Returns:
+            total (int): Bytes held after the eviction
+        """
+        held = self.session_buffers()
+        for key, dataset in dataset_cache.items():
+            if total <= self.budget_bytes:
+                break
+            n_bytes = sum(
+                n for array_id, n in dataset_buffers(dataset).items()
+                if array_id not in held)
+            if n_bytes == 0:
+                continue
+            dataset_cache.invalidate(lambda k, key=key: k == key)
+            total -= n_bytes
+            print(f"Evicted cached dataset {key} ({n_bytes / 1024**2:.1f} MB)")
+        return total
+
+    def to_prometheus(self) -> str:
+        """
+        Render the memory usage in the Prometheus text exposition format.
+
+        Returns:
+            text (str): Gauges of the held bytes, the budget and the sessions
+        """
+        lines = [
+            '# HELP arbok_inspector_session_bytes Bytes held by the runs of all tabs',
+            '# TYPE arbok_inspector_session_bytes gauge',
+            f'arbok_inspector_session_bytes {sum(self.session_buffers().values())}',
+            '# HELP arbok_inspector_cached_bytes Bytes of cached datasets no tab holds',
+            '# TYPE arbok_inspector_cached_bytes gauge',
+            f'arbok_inspector_cached_bytes {self.cached_bytes()}',
+            '# HELP arbok_inspector_memory_budget_bytes Memory budget of all tabs and the cache',
+            '# TYPE arbok_inspector_memory_budget_bytes gauge',
+            f'arbok_inspector_memory_budget_bytes {self.budget_bytes or 0}',
+            '# HELP arbok_inspector_sessions Number of open run tabs',
+            '# TYPE arbok_inspector_sessions gauge',
+            f'arbok_inspector_sessions {len(self._sessions)}',
+            '# HELP arbok_inspector_released_bytes_total Bytes released from idle tabs',
+            '# TYPE arbok_inspector_released_bytes_total counter',
+            f'arbok_inspector_released_bytes_total {self.released_bytes}',
+        ]
+        return '\n'.join(lines) + '\n'
+
+    def release(self, session: Session) -> None:
+        """Release the data of the run of a session and notify its tab"""
+        n_bytes = sum(run_buffers(session.run).values())
+        session.run.release_data()
+        ### The shared cache would keep the dataset alive otherwise
+        run_prefetcher.forget(session.run)
+        session.released_count += 1
+        self.released_bytes += n_bytes
+        print(
+            f"Released run {session.run.run_id} of idle tab {session.client.id} "
+            f"({n_bytes / 1024**2:.1f} MB)")
+        if session.on_release is not None:
+            with session.client:
+                session.on_release()
+
+def run_buffers(run: BaseRun) -> dict[int, int]:
+    """
+    Bytes of every array held by a run, keyed by the ID of the array such that
+    arrays shared between datasets can be counted once.
+
+    Args:
+        run (BaseRun): The run
+    Returns:
+        buffers (dict[int, int]): Bytes by array ID
+    """
+    datasets = [
+        getattr(run, '_full_data_set', None),
+        getattr(run, '_last_avg_subset', None)]
+    datasets += run.reduction_cache.values()
+    buffers = {}
+    for dataset in datasets:
+        if dataset is not None:
+            buffers.update(dataset_buffers(dataset))
+    return buffers
+
+def dataset_buffers(dataset: Dataset) -> dict[int, int]:
+    """Bytes held by every variable of a dataset keyed by the array ID"""
+    buffers = {}
+    for variable in dataset.variables.values():
+        array_id, n_bytes = variable_buffer(variable)
+        buffers[array_id] = n_bytes
+    return buffers
+
+def variable_buffer(variable: Variable) -> tuple[int, int]:
+    """
+    ID and size of the array holding the data of a variable. Bit-packed
+    variables hold their packed bytes, other lazy variables (e.g. derived
+    results) hold nothing.
+    """
+    data = variable._data
+    if isinstance(data, np.ndarray):
+        ### Views count as the array they are a view of
+        if isinstance(data.base, np.ndarray):
+            return id(data.base), data.base.nbytes
+        return id(data), data.nbytes
+    if isinstance(data, indexing.LazilyIndexedArray):
+        if isinstance(data.array, PackedBooleanArray):
+            return id(data.array), data.array.nbytes
+        return id(data.array), 0
+    return id(data), variable.nbytes
+
+session_registry = SessionRegistry()
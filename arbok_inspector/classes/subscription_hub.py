@@ -0,0 +1,296 @@
+"""
+Module containing the SubscriptionHub sharing database pollers between tabs.
+
+Every browser tab with auto-refresh or auto-plot enabled subscribes to the hub
+instead of running its own timer. The hub runs a single poller per
+(database, day) and per (database, run_id). A poller probes the database with
+a ChangeTracker, fetches new rows or the new dataset once if something
+changed and broadcasts the result to all subscribed tabs. The poller stops as
+soon as its last subscriber leaves.
+"""
+from __future__ import annotations
+from typing import TYPE_CHECKING, Any, Callable
+
+import time
+import asyncio
+import inspect
+
+from nicegui import background_tasks, ui
+from nicegui import run as nicegui_run
+
+from arbok_inspector.state import inspector
+from arbok_inspector.classes.change_detector import create_change_tracker
+from arbok_inspector.classes.refresh_coordinator import (
+    refresh_coordinator, database_key, run_key
+)
+
+if TYPE_CHECKING:
+    from nicegui import Client
+    from arbok_inspector.classes.change_detector import ChangeTracker
+
+MIN_POLL_INTERVAL_S = 0.1
+
+class Subscription:
+    """A single tab subscribed to the updates of a poller"""
+    def __init__(
+            self,
+            poller: Poller,
+            callback: Callable[[Any], Any],
+            interval: float,
+            client: Client
+            ):
+        """
+        Constructor for Subscription class
+
+        Args:
+            poller (Poller): Poller the subscription is attached to
+            callback (Callable): Called with each new payload in the context
+                of the subscribing client
+            interval (float): Requested polling interval in seconds
+            client (Client): Client (tab) that subscribed
+        """
+        self.poller = poller
+        self.callback = callback
+        self.interval: float = max(MIN_POLL_INTERVAL_S, float(interval))
+        self.client = client
+        self.is_active: bool = True
+        self._is_delivering: bool = False
+        self._pending_payload: Any = None
+        self._has_pending: bool = False
+        ### Payloads replaced by a newer one before they were delivered
+        self.skipped_payloads: int = 0
+
+    @property
+    def key(self) -> tuple:
+        """Key of the poller this subscription is attached to"""
+        return self.poller.key
+
+    def set_interval(self, interval: float) -> None:
+        """Change the requested polling interval of this subscription"""
+        self.interval = max(MIN_POLL_INTERVAL_S, float(interval))
+
+    def cancel(self) -> None:
+        """Unsubscribe, stopping the poller if this was the last subscriber"""
+        if not self.is_active:
+            return
+        self.is_active = False
+        self.poller.remove(self)
+
+    def deliver(self, payload: Any) -> None:
+        """
+        Hand a payload to the subscriber. If the previous payload is still
+        being processed only the newest payload is kept and delivered after.
+        """
+        if self.client.is_deleted:
+            self.cancel()
+            return
+        if self._is_delivering:
+            if self._has_pending:
+                self.skipped_payloads += 1
+            self._pending_payload = payload
+            self._has_pending = True
+            return
+        background_tasks.create(
+            self._deliver(payload), name=f'deliver {self.poller.key}')
+
+    async def _deliver(self, payload: Any) -> None:
+        self._is_delivering = True
+        try:
+            while self.is_active:
+                try:
+                    with self.client:
+                        result = self.callback(payload)
+                        if inspect.isawaitable(result):
+                            await result
+                except Exception as e:
+                    print(f"Error delivering update for {self.poller.key}: {e}")
+                if not self._has_pending:
+                    break
+                payload = self._pending_payload
+                self._pending_payload = None
+                self._has_pending = False
+        finally:
+            self._is_delivering = False
+
+class Poller:
+    """Polls a database for a single key and broadcasts changes"""
+    def __init__(
+            self,
+            hub: SubscriptionHub,
+            key: tuple,
+            tracker_factory: Callable[[], ChangeTracker],
+            fetch: Callable[[], Any]
+            ):
+        """
+        Constructor for Poller class
+
+        Args:
+            hub (SubscriptionHub): Hub owning the poller
+            key (tuple): Key identifying the polled database and day/run
+            tracker_factory (Callable): Creates the primed ChangeTracker
+            fetch (Callable): Fetches the payload if a change was detected,
+                executed on a worker thread unless it is a coroutine function
+        """
+        self.hub = hub
+        self.key = key
+        self.tracker_factory = tracker_factory
+        self.fetch = fetch
+        self.subscriptions: list[Subscription] = []
+        self.task: asyncio.Task | None = None
+        ### Duration of the last fetch of a payload in seconds
+        self.last_fetch_s: float | None = None
+
+    @property
+    def interval(self) -> float:
+        """Shortest interval requested by any of the subscribers"""
+        if not self.subscriptions:
+            return MIN_POLL_INTERVAL_S
+        return min(sub.interval for sub in self.subscriptions)
+
+    def add(self, subscription: Subscription) -> None:
+        """Attach a subscription and start polling if not running yet"""
+        self.subscriptions.append(subscription)
+        if self.task is None:
+            self.task = background_tasks.create(
+                self._poll(), name=f'poll {self.key}')
+
+    def remove(self, subscription: Subscription) -> None:
+        """Detach a subscription and stop polling if it was the last one"""
+        if subscription in self.subscriptions:
+            self.subscriptions.remove(subscription)
+        if not self.subscriptions:
+            self.stop()
+
+    def stop(self) -> None:
+        """Stop polling and remove the poller from the hub"""
+        self.hub.remove_poller(self)
+        if self.task is not None and not self.task.done():
+            self.task.cancel()
+
+    async def _poll(self) -> None:
+        print(f"Starting poller {self.key}")
+        try:
+            tracker = await nicegui_run.io_bound(self.tracker_factory)
+            while self.subscriptions:
+                await asyncio.sleep(self.interval)
+                try:
+                    if not await nicegui_run.io_bound(tracker.has_changed):
+                        continue
+                    start = time.perf_counter()
+                    if asyncio.iscoroutinefunction(self.fetch):
+                        payload = await self.fetch()
+                    else:
+                        payload = await nicegui_run.io_bound(self.fetch)
+                    self.last_fetch_s = time.perf_counter() - start
+                except Exception as e:
+                    print(f"Error polling {self.key}: {e}")
+                    continue
+                for subscription in list(self.subscriptions):
+                    subscription.deliver(payload)
+        finally:
+            print(f"Stopped poller {self.key}")
+
+class SubscriptionHub:
+    """Registry of the running pollers shared by all tabs"""
+    def __init__(self):
+        self.pollers: dict[tuple, Poller] = {}
+
+    def subscribe(
+            self,
+            key: tuple,
+            tracker_factory: Callable[[], ChangeTracker],
+            fetch: Callable[[], Any],
+            callback: Callable[[Any], Any],
+            interval: float
+            ) -> Subscription:
+        """
+        Subscribe the current client to the poller with the given key,
+        creating the poller if it does not exist yet.
+
+        Args:
+            key (tuple): Key identifying the polled database and day/run
+            tracker_factory (Callable): Creates the ChangeTracker of the poller
+            fetch (Callable): Fetches the payload on a detected change
+            callback (Callable): Called with each new payload
+            interval (float): Requested polling interval in seconds
+        Returns:
+            subscription (Subscription): Handle to cancel the subscription
+        """
+        if key not in self.pollers:
+            self.pollers[key] = Poller(self, key, tracker_factory, fetch)
+        poller = self.pollers[key]
+        client = ui.context.client
+        subscription = Subscription(poller, callback, interval, client)
+        poller.add(subscription)
+        client.on_delete(subscription.cancel)
+        return subscription
+
+    def remove_poller(self, poller: Poller) -> None:
+        """Remove a stopped poller from the registry"""
+        if self.pollers.get(poller.key) is poller:
+            del self.pollers[poller.key]
+
+    def subscribe_to_day(
+            self,
+            day: str,
+            offset_hours: float,
+            callback: Callable[[list[dict]], Any],
+            interval: float
+            ) -> Subscription:
+        """
+        Subscribe to the runs of the given day. The callback receives the
+        formatted run grid rows whenever the runs table changed.
+
+        Args:
+            day (str): The day in 'YYYY-MM-DD'
+            offset_hours (float): The timezone offset in hours
+            callback (Callable): Called with the new run grid rows
+            interval (float): Requested polling interval in seconds
+        """
+        ### Imported here, the widgets and run classes import the hub themselves
+        from arbok_inspector.widgets.run_selector import (
+            get_runs_for_day, format_run_grid_rows
+        )
+
+        def fetch_rows() -> list[dict]:
+            rows, columns = get_runs_for_day(day, offset_hours)
+            return format_run_grid_rows(rows, columns, offset_hours)
+
+        key = ('day', database_key(), day, offset_hours)
+        return self.subscribe(
+            key, create_change_tracker, fetch_rows, callback, interval)
+
+    def subscribe_to_run(
+            self,
+            run_id: int,
+            callback: Callable[[Any], Any],
+            interval: float
+            ) -> Subscription:
+        """
+        Subscribe to the data of the given run. The dataset is loaded once
+        per change and the callback receives the new xarray Dataset.
+
+        Args:
+            run_id (int): ID of the run
+            callback (Callable): Called with the newly loaded dataset
+            interval (float): Requested polling interval in seconds
+        """
+        from arbok_inspector.classes.run_factory import build_run
+
+        run = build_run(
+            run_id, inspector.database_type, inspector.qcodes_database_path)
+        key = run_key(int(run_id))
+
+        async def fetch_dataset():
+            ### Shares the load with manual reloads of the same run
+            return await refresh_coordinator.load(key, run.load_dataset)
+
+        return self.subscribe(
+            key,
+            lambda: create_change_tracker(run_id),
+            fetch_dataset,
+            callback,
+            interval
+        )
+
+subscription_hub = SubscriptionHub()
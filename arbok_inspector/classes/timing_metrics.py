@@ -0,0 +1,173 @@
+"""
+Module containing the TimingMetrics aggregating durations of hot path spans.
+
+The hot paths of the inspector (loading, database queries, reductions,
+slicing, encoding of plot payloads and pushing them to the browser) are
+wrapped in named spans. Every finished span is added to a histogram with
+fixed buckets, so the memory does not grow with the number of spans. The
+histograms are shown on the `/diagnostics` page and served in the Prometheus
+text format at `/metrics`. Spans are only timed while the metrics are
+enabled, otherwise `span` returns a shared no-op context.
+"""
+from __future__ import annotations
+from typing import Callable, Iterator
+
+import time
+import bisect
+import threading
+import functools
+from contextlib import contextmanager, nullcontext
+
+### Upper bounds of the histogram buckets in seconds, +Inf is implicit
+DEFAULT_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1., 2.5, 5., 10.)
+METRIC_NAME = 'arbok_inspector_span_seconds'
+
+_DISABLED_SPAN = nullcontext()
+
+class TimingHistogram:
+    """Histogram of the durations of one span with fixed buckets"""
+    def __init__(self, buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        """
+        Constructor for TimingHistogram class
+
+        Args:
+            buckets (tuple[float, ...]): Sorted upper bounds of the buckets in
+                seconds, the bucket for larger durations is added
+        """
+        self.buckets: tuple[float, ...] = tuple(buckets)
+        self.counts: list[int] = [0] * (len(self.buckets) + 1)
+        self.count: int = 0
+        self.sum: float = 0.
+        self.max: float = 0.
+
+    def observe(self, seconds: float) -> None:
+        """Add a duration to the histogram"""
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        self.max = max(self.max, seconds)
+
+    def quantile(self, q: float) -> float:
+        """
+        Estimate a quantile by the upper bound of the bucket it falls in. The
+        largest duration is returned for the bucket without upper bound.
+
+        Args:
+            q (float): Quantile between 0 and 1
+        Returns:
+            seconds (float): Estimated quantile, NaN if nothing was observed
+        """
+        if self.count == 0:
+            return float('nan')
+        rank = q * self.count
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            if cumulative >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def summary(self) -> dict[str, float]:
+        """Count, mean, estimated median and p95 and maximum in seconds"""
+        return {
+            'count': self.count,
+            'mean': self.sum / self.count if self.count else float('nan'),
+            'p50': self.quantile(0.5),
+            'p95': self.quantile(0.95),
+            'max': self.max,
+        }
+
+class TimingMetrics:
+    """Thread-safe registry of the timing histograms of all spans"""
+    def __init__(self, enabled: bool = False, buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        """
+        Constructor for TimingMetrics class
+
+        Args:
+            enabled (bool): Whether spans are timed
+            buckets (tuple[float, ...]): Bucket bounds of the histograms
+        """
+        self.enabled: bool = enabled
+        self.buckets: tuple[float, ...] = tuple(buckets)
+        self._histograms: dict[str, TimingHistogram] = {}
+        self._lock = threading.Lock()
+
+    def span(self, name: str):
+        """
+        Context manager timing the enclosed block as a span of the given name.
+        Spans raising an exception are timed as well.
+
+        Args:
+            name (str): Name of the span, e.g. 'load' or 'reduction'
+        """
+        if not self.enabled:
+            return _DISABLED_SPAN
+        return self._timed_span(name)
+
+    @contextmanager
+    def _timed_span(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def timed(self, name: str) -> Callable[[Callable], Callable]:
+        """Decorator timing every call of the decorated function as a span"""
+        def decorator(function: Callable) -> Callable:
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                with self.span(name):
+                    return function(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def observe(self, name: str, seconds: float) -> None:
+        """Add the duration of a span to its histogram"""
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = TimingHistogram(self.buckets)
+                self._histograms[name] = histogram
+            histogram.observe(seconds)
+
+    def reset(self) -> None:
+        """Remove all histograms"""
+        with self._lock:
+            self._histograms.clear()
+
+    def summaries(self) -> dict[str, dict[str, float]]:
+        """Summary of every span histogram by span name, see `TimingHistogram.summary`"""
+        with self._lock:
+            return {
+                name: histogram.summary()
+                for name, histogram in sorted(self._histograms.items())}
+
+    def to_prometheus(self) -> str:
+        """
+        Render all histograms in the Prometheus text exposition format.
+
+        Returns:
+            text (str): Cumulative buckets, sum and count of every span
+        """
+        lines = [
+            '# HELP arbok_inspector_metrics_enabled Whether spans are timed',
+            '# TYPE arbok_inspector_metrics_enabled gauge',
+            f'arbok_inspector_metrics_enabled {int(self.enabled)}',
+            f'# HELP {METRIC_NAME} Duration of the hot path spans of the inspector',
+            f'# TYPE {METRIC_NAME} histogram',
+        ]
+        with self._lock:
+            for name, histogram in sorted(self._histograms.items()):
+                label = f'span="{name}"'
+                cumulative = 0
+                bounds = [f'{bound:g}' for bound in histogram.buckets] + ['+Inf']
+                for bound, count in zip(bounds, histogram.counts):
+                    cumulative += count
+                    lines.append(f'{METRIC_NAME}_bucket{{{label},le="{bound}"}} {cumulative}')
+                lines.append(f'{METRIC_NAME}_sum{{{label}}} {histogram.sum!r}')
+                lines.append(f'{METRIC_NAME}_count{{{label}}} {histogram.count}')
+        return '\n'.join(lines) + '\n'
+
+timing_metrics = TimingMetrics()
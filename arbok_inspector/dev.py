@@ -9,7 +9,9 @@ Hence we are using dev:run and not main:main
 from nicegui import ui
 
 from arbok_inspector.state import inspector
-from arbok_inspector.pages import database_browser, greeter, run_view
+from arbok_inspector.pages import (
+    database_browser, greeter, run_view, export_download, diagnostics
+)
 
 def run():
     ui.run(
@@ -0,0 +1,66 @@
+"""
+Narrowing of floating point results to a smaller dtype.
+
+QCoDeS and zarr hand results over as float64, while float32 resolves more
+than enough for visual inspection and halves the memory. Only data variables
+are narrowed, coordinates are kept exact so sweep values and selections are
+not affected. Bit-packed variables are left packed, casting them would
+unpack them into a dense array.
+"""
+from __future__ import annotations
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+from arbok_inspector.classes.packed_boolean_array import get_packed_array
+
+if TYPE_CHECKING:
+    from xarray import Dataset
+
+NARROW_FLOAT_DTYPE = np.dtype('float32')
+
+def narrow_float_variables(
+        dataset: Dataset,
+        dtype: np.dtype = NARROW_FLOAT_DTYPE
+        ) -> tuple[Dataset, int]:
+    """
+    Cast all floating point data variables wider than dtype to dtype.
+    Bit-packed variables are kept as they are.
+
+    Args:
+        dataset (Dataset): Dataset to narrow
+        dtype (np.dtype): Floating point dtype to narrow to
+    Returns:
+        dataset (Dataset): Dataset with narrowed data variables
+        saved_bytes (int): Memory saved by narrowing the variables held densely
+    """
+    dtype = np.dtype(dtype)
+    narrowed = {}
+    saved_bytes = 0
+    for name, data in dataset.data_vars.items():
+        if data.dtype.kind != 'f' or data.dtype.itemsize <= dtype.itemsize:
+            continue
+        if get_packed_array(data) is not None:
+            continue
+        narrowed[name] = data.astype(dtype)
+        saved_bytes += data.nbytes - narrowed[name].nbytes
+    if narrowed:
+        dataset = dataset.assign(narrowed)
+    return dataset, saved_bytes
+
+def payload_values(values: np.ndarray, dtype: np.dtype | None) -> np.ndarray | list:
+    """
+    Values to send to plotly. Numeric numpy arrays are sent as binary typed
+    arrays by plotly, which is much smaller than a JSON list of numbers.
+
+    Args:
+        values (np.ndarray): Values to plot
+        dtype (np.dtype | None): Float dtype of the payload, float64 if None
+    Returns:
+        values (np.ndarray | list): Array of the payload dtype, or a list
+            for non-numeric values
+    """
+    values = np.asarray(values)
+    if values.dtype.kind not in 'biuf':
+        return values.tolist()
+    return values.astype(dtype or np.float64, copy=False)
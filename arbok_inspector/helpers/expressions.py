@@ -0,0 +1,147 @@
+"""
+Parsing and evaluation of expressions defining derived results.
+
+Expressions are written in Python syntax over the results of a run, e.g.
+`sqrt(Q1.I**2 + Q1.Q**2)`, `arctan2(Q1.Q, Q1.I)`, `Q1.I > 0.2` or
+`Q1.state - Q2.state`. Results are referenced with dots instead of the double
+underscores of their names. Only arithmetic, comparisons and the elementwise
+numpy functions in `FUNCTIONS` are allowed, which keeps the evaluation safe
+and lets derived results be evaluated chunk by chunk. Conditions are combined
+elementwise with `&`, `|` and `~`, since `and`, `or`, `not` and chained
+comparisons need a single truth value instead of an array.
+"""
+from __future__ import annotations
+from typing import TYPE_CHECKING, Callable
+
+import ast
+import numpy as np
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+
+FUNCTIONS: dict[str, Callable] = {
+    'sqrt': np.sqrt,
+    'abs': np.abs,
+    'exp': np.exp,
+    'log': np.log,
+    'log10': np.log10,
+    'sin': np.sin,
+    'cos': np.cos,
+    'tan': np.tan,
+    'arctan': np.arctan,
+    'arctan2': np.arctan2,
+    'hypot': np.hypot,
+    'degrees': np.degrees,
+    'real': np.real,
+    'imag': np.imag,
+    'angle': np.angle,
+    'minimum': np.minimum,
+    'maximum': np.maximum,
+    'clip': np.clip,
+    'where': np.where,
+    'isnan': np.isnan,
+}
+CONSTANTS: dict[str, float] = {'pi': np.pi, 'e': np.e}
+
+_ALLOWED_NODES = (
+    ast.Expression, ast.BinOp, ast.UnaryOp, ast.Compare, ast.Call,
+    ast.Name, ast.Attribute, ast.Constant, ast.Load,
+    ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod, ast.Pow,
+    ast.USub, ast.UAdd, ast.Invert, ast.BitAnd, ast.BitOr, ast.BitXor,
+    ast.Gt, ast.GtE, ast.Lt, ast.LtE, ast.Eq, ast.NotEq,
+)
+
+class Expression:
+    """Validated expression over the results of a run"""
+    def __init__(self, expression: str, results: Iterable[str]):
+        """
+        Constructor for Expression class
+
+        Args:
+            expression (str): Expression in Python syntax
+            results (Iterable[str]): Names of the results that can be used
+        Raises:
+            ValueError: If the expression is invalid or uses unknown names
+        """
+        self.expression: str = expression.strip()
+        try:
+            tree = ast.parse(self.expression, mode='eval')
+        except SyntaxError as e:
+            raise ValueError(f"Invalid expression '{self.expression}': {e.msg}") from e
+        self.variables: list[str] = []
+        tree = _ResultNameTransformer(set(results), self.variables).visit(tree)
+        _validate(tree)
+        if not self.variables:
+            raise ValueError(
+                f"Expression '{self.expression}' does not use any result")
+        self._code = compile(ast.fix_missing_locations(tree), '<expression>', 'eval')
+
+    def evaluate(self, values: dict[str, np.ndarray]) -> np.ndarray:
+        """
+        Evaluate the expression.
+
+        Args:
+            values (dict): Arrays of all variables, broadcastable to each other
+        Returns:
+            result (np.ndarray): Result of the expression
+        """
+        namespace = {**FUNCTIONS, **CONSTANTS, **values}
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.asarray(eval(self._code, {'__builtins__': {}}, namespace))
+
+class _ResultNameTransformer(ast.NodeTransformer):
+    """Replaces dotted and plain result names by names of the variables"""
+    def __init__(self, results: set[str], variables: list[str]):
+        self.results = results
+        self.variables = variables
+
+    def visit_Attribute(self, node: ast.Attribute) -> ast.AST:
+        name = _dotted_name(node)
+        if name is None:
+            raise ValueError(f"Invalid attribute access in '{ast.unparse(node)}'")
+        return self._result_name(name.replace('.', '__'), ast.unparse(node))
+
+    def visit_Name(self, node: ast.Name) -> ast.AST:
+        if node.id in FUNCTIONS or node.id in CONSTANTS:
+            return node
+        return self._result_name(node.id, node.id)
+
+    def visit_Call(self, node: ast.Call) -> ast.AST:
+        if not isinstance(node.func, ast.Name) or node.func.id not in FUNCTIONS:
+            raise ValueError(
+                f"Unknown function '{ast.unparse(node.func)}'. "
+                f"Available: {', '.join(FUNCTIONS)}")
+        if node.keywords:
+            raise ValueError("Keyword arguments are not supported")
+        node.args = [self.visit(arg) for arg in node.args]
+        return node
+
+    def _result_name(self, name: str, shown_name: str) -> ast.Name:
+        if name not in self.results:
+            raise ValueError(f"Unknown result '{shown_name}'")
+        if name not in self.variables:
+            self.variables.append(name)
+        return ast.Name(id=name, ctx=ast.Load())
+
+def _dotted_name(node: ast.AST) -> str | None:
+    if isinstance(node, ast.Name):
+        return node.id
+    if isinstance(node, ast.Attribute):
+        parent = _dotted_name(node.value)
+        return None if parent is None else f"{parent}.{node.attr}"
+    return None
+
+def _validate(tree: ast.AST) -> None:
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.BoolOp, ast.Not)):
+            raise ValueError(
+                "'and', 'or' and 'not' do not work on arrays, "
+                "use '&', '|' and '~' with parentheses, e.g. '(Q1.I > 0) & (Q1.Q > 0)'")
+        if isinstance(node, ast.Compare) and len(node.comparators) > 1:
+            raise ValueError(
+                "Chained comparisons do not work on arrays, "
+                "combine them with '&', e.g. '(0 < Q1.I) & (Q1.I < 1)'")
+        if not isinstance(node, _ALLOWED_NODES):
+            raise ValueError(f"'{type(node).__name__}' is not allowed in expressions")
+        if isinstance(node, ast.Constant) and not isinstance(node.value, (int, float, complex)):
+            raise ValueError(f"Only numbers are allowed as constants, got {node.value!r}")
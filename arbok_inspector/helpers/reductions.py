@@ -0,0 +1,631 @@
+"""
+Chunked reductions of xarray data over one or several dims.
+
+The data is sliced along the outermost reduced dim and every slice is reduced
+on its own before the partial results are merged. Each chunk only needs
+temporary arrays of the chunk size instead of the whole unaveraged array,
+which keeps the memory bounded for runs with millions of shots. Slicing the
+outermost dim keeps the chunks contiguous in memory.
+"""
+from __future__ import annotations
+from typing import TYPE_CHECKING, Iterator
+
+import numpy as np
+import xarray as xr
+
+from arbok_inspector.classes.packed_boolean_array import (
+    PackedBooleanArray, get_packed_array
+)
+
+if TYPE_CHECKING:
+    from collections.abc import Sequence
+
+HISTOGRAM_DIM = 'bin'
+### Statistics that can be selected for averaged dims, see `reduce_dataset`
+STATISTICS = ['mean', 'std', 'sem', 'median', 'min', 'max']
+SEM_SUFFIX = '__sem'
+CORRELATOR_KINDS = ['product', 'covariance']
+DEFAULT_HISTOGRAM_BINS = 50
+### Number of elements of the temporary arrays processed per chunk
+DEFAULT_CHUNK_ELEMENTS = 2**22
+
+def iter_shot_chunks(
+        data: xr.DataArray,
+        dims: Sequence[str],
+        chunk_elements: int = DEFAULT_CHUNK_ELEMENTS
+        ) -> Iterator[np.ndarray]:
+    """
+    Iterate over the data in chunks along the outermost of the reduced dims.
+    The chunks keep the dim order of the data, reduce them over the axes
+    returned by `reduced_axes`.
+
+    Args:
+        data (xr.DataArray): Data to iterate over
+        dims (Sequence[str]): Dims that are reduced
+        chunk_elements (int): Maximum number of elements per chunk
+    Yields:
+        chunk (np.ndarray): Float array with the same number of dims as data
+    """
+    axes = reduced_axes(data, dims)
+    if len(axes) == 0:
+        yield np.asarray(data.values, dtype=float)
+        return
+    ### Lazy (e.g. bit-packed) variables only load the values of each chunk
+    dim = data.dims[axes[0]]
+    size = data.sizes[dim]
+    step = max(1, chunk_elements // max(data.size // max(size, 1), 1))
+    for start in range(0, size, step):
+        yield np.asarray(data.isel({dim: slice(start, start + step)}).values, dtype=float)
+
+def reduced_axes(data: xr.DataArray, dims: Sequence[str]) -> tuple[int, ...]:
+    """Sorted axis numbers of the given dims in the data"""
+    return tuple(sorted(data.get_axis_num(dim) for dim in dims))
+
+class MomentAccumulator:
+    """
+    Merges count, mean, sum of squared deviations, min and max of chunks
+    with the parallel variant of Welford's algorithm, so no second pass over
+    the data is needed for the variance. NaN values are ignored. The variance
+    and the extrema are only accumulated if requested.
+    """
+    def __init__(
+            self,
+            shape: Sequence[int],
+            axes: tuple[int, ...],
+            variance: bool = True,
+            extrema: bool = True
+            ):
+        """
+        Constructor for MomentAccumulator class
+
+        Args:
+            shape (Sequence[int]): Shape of the data
+            axes (tuple[int, ...]): Axes the chunks are reduced over
+            variance (bool): Whether to accumulate the squared deviations
+            extrema (bool): Whether to accumulate the min and max
+        """
+        self.axes = axes
+        self.variance = variance
+        self.extrema = extrema
+        self.out_shape = [n for i, n in enumerate(shape) if i not in axes]
+        self.shape = tuple(1 if i in axes else n for i, n in enumerate(shape))
+        self.count = np.zeros(self.shape)
+        self.mean = np.zeros(self.shape)
+        self.m2 = np.zeros(self.shape)
+        self.min = np.full(self.shape, np.inf)
+        self.max = np.full(self.shape, -np.inf)
+
+    def add(self, chunk: np.ndarray) -> None:
+        """Merge the moments of a chunk into the accumulated ones"""
+        axes = self.axes
+        with np.errstate(invalid='ignore', divide='ignore'):
+            finite = np.isfinite(chunk)
+            all_finite = finite.all()
+            if all_finite:
+                chunk_count = np.full(self.shape, chunk.size / np.prod(self.shape))
+                chunk_mean = chunk.mean(axis=axes, keepdims=True)
+            else:
+                chunk_count = finite.sum(axis=axes, keepdims=True)
+                chunk_mean = np.nansum(chunk, axis=axes, keepdims=True) / chunk_count
+            total = self.count + chunk_count
+            delta = chunk_mean - self.mean
+            has_values = chunk_count > 0
+            if self.variance:
+                if all_finite:
+                    chunk_m2 = np.square(chunk - chunk_mean).sum(axis=axes, keepdims=True)
+                else:
+                    chunk_m2 = np.nansum(
+                        np.square(chunk - chunk_mean), axis=axes, keepdims=True)
+                self.m2 = np.where(
+                    has_values,
+                    self.m2 + chunk_m2 + delta**2 * self.count * chunk_count / total,
+                    self.m2)
+            if self.extrema:
+                if all_finite:
+                    chunk_min = chunk.min(axis=axes, keepdims=True)
+                    chunk_max = chunk.max(axis=axes, keepdims=True)
+                else:
+                    chunk_min = np.where(finite, chunk, np.inf).min(axis=axes, keepdims=True)
+                    chunk_max = np.where(finite, chunk, -np.inf).max(axis=axes, keepdims=True)
+                self.min = np.fmin(self.min, chunk_min)
+                self.max = np.fmax(self.max, chunk_max)
+            self.mean = np.where(
+                has_values, self.mean + delta * chunk_count / total, self.mean)
+            self.count = total
+
+    def result(self) -> dict[str, np.ndarray]:
+        """
+        Returns:
+            moments (dict): Arrays 'count', 'mean', 'm2', 'min' and 'max' with
+                the shape of the remaining dims, without the ones not
+                accumulated. Empty traces are NaN
+        """
+        is_empty = self.count == 0
+        values = {'count': self.count, 'mean': self.mean.copy()}
+        if self.variance:
+            values['m2'] = self.m2
+        if self.extrema:
+            values['min'] = self.min.copy()
+            values['max'] = self.max.copy()
+        for name in ['mean', 'min', 'max']:
+            if name in values:
+                values[name][is_empty] = np.nan
+        return {name: value.reshape(self.out_shape) for name, value in values.items()}
+
+def moments(
+        data: xr.DataArray,
+        dims: Sequence[str],
+        chunk_elements: int = DEFAULT_CHUNK_ELEMENTS,
+        variance: bool = True,
+        extrema: bool = True
+        ) -> dict[str, np.ndarray]:
+    """
+    Count, mean, sum of squared deviations, min and max of every trace in a
+    single chunked pass, see `MomentAccumulator`. If the outermost dim is
+    kept, the data is sliced along it instead, since these slices are
+    contiguous and reduced independently of each other.
+
+    Args:
+        data (xr.DataArray): Data to reduce
+        dims (Sequence[str]): Dims that are reduced
+        chunk_elements (int): Maximum number of elements per chunk
+        variance (bool): Whether to compute the squared deviations 'm2'
+        extrema (bool): Whether to compute 'min' and 'max'
+    Returns:
+        moments (dict): Arrays 'count', 'mean' and the requested of 'm2',
+            'min' and 'max' with the shape of the remaining dims
+    """
+    axes = reduced_axes(data, dims)
+    packed = get_packed_array(data)
+    if packed is not None:
+        return _packed_moments(packed, axes, chunk_elements)
+    if len(axes) == 0 or axes[0] == 0 or data.shape[0] == 0:
+        return _accumulated_moments(data, dims, chunk_elements, variance, extrema)
+    dim = data.dims[0]
+    step = max(1, chunk_elements // max(data.size // data.shape[0], 1))
+    parts = [
+        _accumulated_moments(
+            data.isel({dim: slice(start, start + step)}),
+            dims, chunk_elements, variance, extrema)
+        for start in range(0, data.shape[0], step)]
+    return {name: np.concatenate([part[name] for part in parts]) for name in parts[0]}
+
+def _accumulated_moments(data, dims, chunk_elements, variance, extrema):
+    accumulator = MomentAccumulator(
+        data.shape, reduced_axes(data, dims), variance, extrema)
+    for chunk in iter_shot_chunks(data, dims, chunk_elements):
+        accumulator.add(chunk)
+    return accumulator.result()
+
+def _packed_moments(
+        packed: PackedBooleanArray,
+        axes: tuple[int, ...],
+        chunk_elements: int
+        ) -> dict[str, np.ndarray]:
+    ### For zeros and ones all moments follow from the number of ones
+    out_shape = [n for i, n in enumerate(packed.shape) if i not in axes]
+    ones = packed.count_ones(axes, chunk_elements).reshape(out_shape).astype(float)
+    count = np.full(out_shape, float(np.prod([packed.shape[i] for i in axes])))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = ones / count
+    return {
+        'count': count,
+        'mean': mean,
+        'm2': ones * (1 - mean),
+        'min': (ones == count).astype(float),
+        'max': (ones > 0).astype(float),
+    }
+
+def standard_deviation(stats: dict[str, np.ndarray]) -> np.ndarray:
+    """Sample standard deviation from the result of `moments`"""
+    with np.errstate(invalid='ignore', divide='ignore'):
+        std = np.asarray(np.sqrt(stats['m2'] / (stats['count'] - 1)))
+    std[stats['count'] < 2] = np.nan
+    return std
+
+def reduce_dataarray(
+        data: xr.DataArray,
+        dims: str | Sequence[str],
+        statistics: Sequence[str] = ('mean',),
+        chunk_elements: int = DEFAULT_CHUNK_ELEMENTS
+        ) -> dict[str, xr.DataArray]:
+    """
+    Reduce the data over the given dims with several statistics at once.
+    All statistics except the median come from a single pass of `moments`.
+    The median needs all values of a trace and is computed by xarray.
+    'std' is the sample standard deviation and 'sem' the standard error of
+    the mean, both with one degree of freedom removed.
+
+    Args:
+        data (xr.DataArray): Data to reduce
+        dims (str | Sequence[str]): Dims to reduce over
+        statistics (Sequence[str]): Statistics from `STATISTICS`
+        chunk_elements (int): Maximum number of elements per chunk
+    Returns:
+        reduced (dict): Reduced DataArray for every requested statistic
+    """
+    if isinstance(dims, str):
+        dims = [dims]
+    dims = list(dims)
+    unknown = set(statistics) - set(STATISTICS)
+    if unknown:
+        raise ValueError(f"Unknown statistics {unknown}. Choose from {STATISTICS}")
+    keep_dims = [dim for dim in data.dims if dim not in dims]
+    coords = _reduced_coords(data, dims)
+    reduced = {}
+    if 'median' in statistics:
+        reduced['median'] = data.median(dim=dims)
+    requested = set(statistics) - {'median'}
+    if requested:
+        ### Only the passes needed for the requested statistics are made
+        stats = moments(
+            data, dims, chunk_elements,
+            variance = bool(requested & {'std', 'sem'}),
+            extrema = bool(requested & {'min', 'max'}))
+        values = {name: stats[name] for name in ['mean', 'min', 'max'] if name in stats}
+        if 'm2' in stats:
+            values['std'] = standard_deviation(stats)
+            values['sem'] = values['std'] / np.sqrt(stats['count'])
+        for statistic in statistics:
+            if statistic == 'median':
+                continue
+            reduced[statistic] = xr.DataArray(
+                values[statistic],
+                dims = keep_dims,
+                coords = coords,
+                name = data.name,
+                attrs = data.attrs
+            )
+    return reduced
+
+def reduce_dataset(
+        dataset: xr.Dataset,
+        statistics: dict[str, str],
+        with_sem: bool = False,
+        chunk_elements: int = DEFAULT_CHUNK_ELEMENTS
+        ) -> xr.Dataset:
+    """
+    Reduce every data variable over several dims, each with its own
+    statistic. Dims sharing a statistic are reduced together. The other
+    statistics are applied first and the mean last, so e.g. the standard
+    deviation over shots can be averaged over repetitions. If a mean is
+    taken and `with_sem` is set, its standard error is stored in the
+    coordinate '<var>__sem', e.g. for error bars of 1D plots.
+
+    Args:
+        dataset (xr.Dataset): Dataset to reduce
+        statistics (dict): Statistic from `STATISTICS` for every reduced dim
+        with_sem (bool): Whether to add the standard error coordinates
+        chunk_elements (int): Maximum number of elements per chunk
+    Returns:
+        reduced (xr.Dataset): Dataset without the reduced dims
+    """
+    groups: dict[str, list[str]] = {}
+    for dim, statistic in statistics.items():
+        groups.setdefault(statistic, []).append(dim)
+    mean_dims = groups.pop('mean', [])
+    for statistic, dims in groups.items():
+        dataset = xr.Dataset({
+            name: reduce_dataarray(data, dims, [statistic], chunk_elements)[statistic]
+            for name, data in dataset.data_vars.items()
+        })
+    if not mean_dims:
+        return dataset
+    data_vars, sem_coords = {}, {}
+    for name, data in dataset.data_vars.items():
+        reduced = reduce_dataarray(
+            data, mean_dims, ['mean', 'sem'] if with_sem else ['mean'],
+            chunk_elements)
+        data_vars[name] = reduced['mean']
+        if with_sem:
+            sem = reduced['sem']
+            sem_coords[f'{name}{SEM_SUFFIX}'] = (sem.dims, sem.values)
+    return xr.Dataset(data_vars).assign_coords(sem_coords)
+
+def correlator_name(results: Sequence[str], kind: str) -> str:
+    """Name of the derived result of a correlator, e.g. '<Q1.state*Q2.state>'"""
+    names = [result.replace("__", ".") for result in results]
+    if kind == 'product':
+        return f"<{'*'.join(names)}>"
+    return f"cov({', '.join(names)})"
+
+def check_correlator(n_results: int, kind: str) -> None:
+    """Raise a ValueError if the correlator can not be computed"""
+    if kind not in CORRELATOR_KINDS:
+        raise ValueError(f"Unknown correlator {kind}. Choose from {CORRELATOR_KINDS}")
+    if n_results < 2 or (kind == 'covariance' and n_results != 2):
+        raise ValueError(
+            f"A {kind} correlator needs {'two' if kind == 'covariance' else 'two or more'}"
+            f" results, got {n_results}")
+
+def correlator_dataarray(
+        datas: Sequence[xr.DataArray],
+        dims: Sequence[str],
+        kind: str = 'product',
+        chunk_elements: int = DEFAULT_CHUNK_ELEMENTS
+        ) -> dict[str, xr.DataArray]:
+    """
+    Correlate several results shot by shot and average over the given dims.
+    The shot-wise products are computed chunk by chunk, so no full-size copy
+    of the data is made. Shots where any of the results is NaN are ignored.
+
+    'product' is the mean of the product of all results, e.g. the joint
+    probability <s1*s2> of two qubit states, returned with its standard
+    error as 'sem'. 'covariance' is the sample covariance of two results.
+
+    Args:
+        datas (Sequence[xr.DataArray]): Results to correlate
+        dims (Sequence[str]): Dims to average over
+        kind (str): One of `CORRELATOR_KINDS`
+        chunk_elements (int): Maximum number of elements per chunk
+    Returns:
+        correlator (dict): 'mean' and for products 'sem' as DataArrays
+    """
+    check_correlator(len(datas), kind)
+    datas = xr.broadcast(*datas)
+    datas = [data.transpose(*datas[0].dims) for data in datas]
+    axes = reduced_axes(datas[0], dims)
+    chunks = zip(*(iter_shot_chunks(data, dims, chunk_elements) for data in datas))
+    keep_dims = [dim for dim in datas[0].dims if dim not in dims]
+    if kind == 'product':
+        accumulator = MomentAccumulator(datas[0].shape, axes)
+        for chunk in chunks:
+            accumulator.add(np.prod(chunk, axis=0))
+        stats = accumulator.result()
+        values = {
+            'mean': stats['mean'],
+            'sem': standard_deviation(stats) / np.sqrt(stats['count'])
+        }
+    else:
+        values = {'mean': _covariance(chunks, datas[0].shape, axes)}
+    name = correlator_name([data.name for data in datas], kind)
+    coords = _reduced_coords(datas[0], dims)
+    return {
+        statistic: xr.DataArray(
+            value, dims = keep_dims, coords = coords, name = name,
+            attrs = {'long_name': name}
+        ) for statistic, value in values.items()
+    }
+
+def _covariance(
+        chunks: Iterator[tuple[np.ndarray, np.ndarray]],
+        shape: Sequence[int],
+        axes: tuple[int, ...]
+        ) -> np.ndarray:
+    ### Co-moments of the chunks are merged like the variance in MomentAccumulator
+    reduced_shape = tuple(1 if i in axes else n for i, n in enumerate(shape))
+    count = np.zeros(reduced_shape)
+    mean_x = np.zeros(reduced_shape)
+    mean_y = np.zeros(reduced_shape)
+    comoment = np.zeros(reduced_shape)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        for x, y in chunks:
+            finite = np.isfinite(x) & np.isfinite(y)
+            chunk_count = finite.sum(axis=axes, keepdims=True)
+            chunk_x = np.where(finite, x, 0.).sum(axis=axes, keepdims=True) / chunk_count
+            chunk_y = np.where(finite, y, 0.).sum(axis=axes, keepdims=True) / chunk_count
+            chunk_comoment = np.where(
+                finite, (x - chunk_x) * (y - chunk_y), 0.).sum(axis=axes, keepdims=True)
+            total = count + chunk_count
+            delta_x = chunk_x - mean_x
+            delta_y = chunk_y - mean_y
+            has_values = chunk_count > 0
+            comoment = np.where(
+                has_values,
+                comoment + chunk_comoment + delta_x * delta_y * count * chunk_count / total,
+                comoment)
+            mean_x = np.where(has_values, mean_x + delta_x * chunk_count / total, mean_x)
+            mean_y = np.where(has_values, mean_y + delta_y * chunk_count / total, mean_y)
+            count = total
+        covariance = comoment / (count - 1)
+    covariance[count < 2] = np.nan
+    return covariance.reshape([n for i, n in enumerate(shape) if i not in axes])
+
+def _reduced_coords(data: xr.DataArray, dims: Sequence[str]) -> dict:
+    return {
+        name: coord for name, coord in data.coords.items()
+        if not any(dim in coord.dims for dim in dims)
+    }
+
+def histogram_edges(
+        data: xr.DataArray,
+        dims: Sequence[str],
+        bins: int = DEFAULT_HISTOGRAM_BINS,
+        value_range: tuple[float, float] | None = None,
+        chunk_elements: int = DEFAULT_CHUNK_ELEMENTS
+        ) -> np.ndarray:
+    """
+    Bin edges for the histogram of the data. Automatic edges span the range
+    of the data. Integer valued data with fewer distinct values than bins
+    (e.g. qubit states) gets one bin centered on each integer.
+
+    Args:
+        data (xr.DataArray): Data to histogram
+        dims (Sequence[str]): Dims that are histogrammed
+        bins (int): Number of bins
+        value_range (tuple | None): Fixed (min, max), automatic if None
+        chunk_elements (int): Maximum number of elements per chunk
+    Returns:
+        edges (np.ndarray): Monotonic bin edges of length bins + 1
+    """
+    bins = max(1, int(bins))
+    if value_range is not None:
+        low, high = float(value_range[0]), float(value_range[1])
+        if not high > low:
+            raise ValueError(f"Histogram range must be increasing. Is {value_range}")
+        return np.linspace(low, high, bins + 1)
+    low, high, is_integer = np.inf, -np.inf, True
+    if get_packed_array(data) is not None:
+        stats = moments(data, dims, chunk_elements)
+        return histogram_edges_from_range(
+            float(stats['min'].min()), float(stats['max'].max()), True, bins)
+    for chunk in iter_shot_chunks(data, dims, chunk_elements):
+        finite = chunk[np.isfinite(chunk)]
+        if finite.size == 0:
+            continue
+        low = min(low, float(finite.min()))
+        high = max(high, float(finite.max()))
+        is_integer = is_integer and bool(np.all(finite == np.round(finite)))
+    return histogram_edges_from_range(low, high, is_integer, bins)
+
+def histogram_edges_from_range(
+        low: float, high: float, is_integer: bool, bins: int) -> np.ndarray:
+    """Automatic bin edges for data between low and high, see `histogram_edges`"""
+    if not np.isfinite(low):
+        return np.linspace(0, 1, bins + 1)
+    if is_integer and high - low + 1 <= bins:
+        return np.arange(low - 0.5, high + 1.)
+    if high == low:
+        low, high = low - 0.5, high + 0.5
+    return np.linspace(low, high, bins + 1)
+
+def histogram_dataarray(
+        data: xr.DataArray,
+        dims: str | Sequence[str],
+        bins: int = DEFAULT_HISTOGRAM_BINS,
+        value_range: tuple[float, float] | None = None,
+        chunk_elements: int = DEFAULT_CHUNK_ELEMENTS
+        ) -> xr.DataArray:
+    """
+    Histogram the data over the given dims chunk by chunk. The histogrammed
+    dims are replaced by a new 'bin' dim with the bin centers as coordinate.
+    NaN values and values outside of the range are not counted.
+
+    Args:
+        data (xr.DataArray): Data to histogram
+        dims (str | Sequence[str]): Dims to histogram over
+        bins (int): Number of bins
+        value_range (tuple | None): Fixed (min, max), automatic if None
+        chunk_elements (int): Maximum number of elements per chunk
+    Returns:
+        counts (xr.DataArray): Counts with the remaining dims and 'bin'
+    """
+    if isinstance(dims, str):
+        dims = [dims]
+    dims = list(dims)
+    edges = histogram_edges(data, dims, bins, value_range, chunk_elements)
+    n_bins = len(edges) - 1
+    keep_dims = [dim for dim in data.dims if dim not in dims]
+    n_traces = int(np.prod([data.sizes[dim] for dim in keep_dims]))
+    counts = np.zeros(n_traces * n_bins, dtype=np.int64)
+    axes = reduced_axes(data, dims)
+    ### Offset of the first bin of each trace, broadcast against the chunks
+    trace_offsets = (np.arange(n_traces) * n_bins).reshape(
+        [1 if i in axes else n for i, n in enumerate(data.shape)])
+    is_uniform = np.allclose(np.diff(edges), edges[1] - edges[0])
+    packed = get_packed_array(data)
+    ### Zeros and ones of packed data are counted without unpacking them
+    chunks = [] if packed is not None else iter_shot_chunks(data, dims, chunk_elements)
+    if packed is not None:
+        ones = packed.count_ones(axes, chunk_elements).reshape(-1)
+        n_values = int(np.prod([packed.shape[i] for i in axes]))
+        counts = counts.reshape(n_traces, n_bins)
+        for value, value_counts in [(0., n_values - ones), (1., ones)]:
+            index = np.searchsorted(edges, value, side='right') - 1
+            if value == edges[-1]:
+                index = n_bins - 1
+            if 0 <= index < n_bins:
+                counts[:, index] += value_counts
+        counts = counts.reshape(-1)
+    for chunk in chunks:
+        if is_uniform:
+            indices = np.floor((chunk - edges[0]) / (edges[1] - edges[0]))
+        else:
+            indices = np.searchsorted(edges, chunk, side='right') - 1.
+        ### The upper edge belongs to the last bin, like in numpy.histogram
+        indices[chunk == edges[-1]] = n_bins - 1
+        valid = (indices >= 0) & (indices < n_bins)
+        flat = (indices + trace_offsets)[valid].astype(np.int64)
+        counts += np.bincount(flat, minlength=n_traces * n_bins)
+    counts = counts.reshape([data.sizes[dim] for dim in keep_dims] + [n_bins])
+    coords = _reduced_coords(data, dims)
+    coords[HISTOGRAM_DIM] = xr.DataArray(
+        (edges[:-1] + edges[1:]) / 2,
+        dims = HISTOGRAM_DIM,
+        attrs = {
+            'long_name': data.attrs.get('long_name', data.name),
+            'units': data.attrs.get('units', ''),
+        }
+    )
+    return xr.DataArray(
+        counts,
+        dims = keep_dims + [HISTOGRAM_DIM],
+        coords = coords,
+        name = data.name,
+        attrs = {
+            'units': 'counts',
+            'bin_edges': edges,
+            'histogram_dims': ', '.join(dims)
+        }
+    )
+
+def histogram_dataset(
+        dataset: xr.Dataset,
+        dims: Sequence[str],
+        bins: int = DEFAULT_HISTOGRAM_BINS,
+        value_range: tuple[float, float] | None = None,
+        chunk_elements: int = DEFAULT_CHUNK_ELEMENTS
+        ) -> xr.Dataset:
+    """
+    Histogram all data variables of a dataset. Since every variable has its
+    own bin edges, the 'bin' dim is indexed by the bin number and the bin
+    centers of each variable are stored in the coordinate '<var>__bin'. Use
+    `get_histogram_result` to get a variable with its own bin centers.
+
+    Args:
+        dataset (xr.Dataset): Dataset to histogram
+        dims (Sequence[str]): Dims to histogram over
+        bins (int): Number of bins
+        value_range (tuple | None): Fixed (min, max), automatic if None
+        chunk_elements (int): Maximum number of elements per chunk
+    Returns:
+        histograms (xr.Dataset): Counts of all data variables
+    """
+    data_vars = {}
+    bin_coords = {}
+    n_bins = 0
+    for name, data in dataset.data_vars.items():
+        counts = histogram_dataarray(data, dims, bins, value_range, chunk_elements)
+        centers = counts[HISTOGRAM_DIM]
+        n_bins = max(n_bins, centers.size)
+        data_vars[name] = counts.drop_vars(HISTOGRAM_DIM)
+        bin_coords[f'{name}__{HISTOGRAM_DIM}'] = centers
+    ### Integer edges can give fewer bins for some variables, pad them
+    for name, counts in data_vars.items():
+        pad = n_bins - counts.sizes[HISTOGRAM_DIM]
+        if pad > 0:
+            data_vars[name] = counts.pad({HISTOGRAM_DIM: (0, pad)}, constant_values=0)
+            bin_coords[f'{name}__{HISTOGRAM_DIM}'] = bin_coords[
+                f'{name}__{HISTOGRAM_DIM}'].pad({HISTOGRAM_DIM: (0, pad)})
+    histograms = xr.Dataset(data_vars)
+    histograms = histograms.assign_coords({
+        HISTOGRAM_DIM: np.arange(n_bins),
+        **{name: (HISTOGRAM_DIM, centers.values, centers.attrs)
+            for name, centers in bin_coords.items()}
+    })
+    return histograms
+
+def get_histogram_result(dataset: xr.Dataset, name: str) -> xr.DataArray:
+    """
+    Return a variable of a dataset created by `histogram_dataset` with the
+    bin centers of this variable as coordinate of the 'bin' dim.
+
+    Args:
+        dataset (xr.Dataset): Dataset of histograms
+        name (str): Name of the data variable
+    Returns:
+        counts (xr.DataArray): Counts of the variable
+    """
+    result = dataset[name]
+    center_name = f'{name}__{HISTOGRAM_DIM}'
+    if HISTOGRAM_DIM not in result.dims or center_name not in result.coords:
+        return result
+    centers = result[center_name]
+    other_centers = [
+        coord for coord in result.coords if coord.endswith(f'__{HISTOGRAM_DIM}')]
+    result = result.drop_vars(other_centers)
+    ### Drop the bins that were only added as padding
+    result = result.isel({HISTOGRAM_DIM: np.isfinite(centers.values)})
+    centers = centers.isel({HISTOGRAM_DIM: np.isfinite(centers.values)})
+    return result.assign_coords({
+        HISTOGRAM_DIM: (HISTOGRAM_DIM, centers.values, centers.attrs)})
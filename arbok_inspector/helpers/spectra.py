@@ -0,0 +1,108 @@
+"""
+Batched Fourier transforms of results along a sweep dim.
+
+All results with the same dims are stacked and transformed with a single real
+FFT along the transformed dim. The constant offset of every trace is removed
+before the transform, so the spectra are not dominated by the zero frequency
+component, e.g. of Ramsey fringes around a population of 0.5.
+"""
+from __future__ import annotations
+from typing import TYPE_CHECKING
+
+import numpy as np
+import xarray as xr
+
+if TYPE_CHECKING:
+    from collections.abc import Sequence
+
+### Units of the frequency for the most common units of swept times
+FREQUENCY_UNITS = {'s': 'Hz', 'ms': 'kHz', 'us': 'MHz', 'µs': 'MHz', 'ns': 'GHz'}
+
+def spectrum_dim_name(dim: str) -> str:
+    """Name of the frequency dim replacing the transformed dim"""
+    return f'{dim}__frequency'
+
+def frequency_coordinate(coord: xr.DataArray) -> xr.DataArray:
+    """
+    Frequencies of a real FFT along a sweep coordinate. The spacing is
+    derived from the first and last value, the coordinate has to be evenly
+    spaced for the transform to be meaningful.
+
+    Args:
+        coord (xr.DataArray): 1D coordinate of the transformed dim
+    Returns:
+        frequencies (xr.DataArray): Coordinate of the frequency dim
+    Raises:
+        ValueError: If the coordinate is not numeric or too short
+    """
+    values = np.asarray(coord.values)
+    if values.dtype.kind not in 'iuf' or values.size < 2:
+        raise ValueError(
+            f"FFT along {coord.name} needs at least two numeric coordinate values")
+    spacing = (float(values[-1]) - float(values[0])) / (values.size - 1)
+    if spacing == 0:
+        raise ValueError(f"Coordinate {coord.name} is constant, can not FFT along it")
+    if not np.allclose(np.diff(values), spacing, rtol=1e-3, atol=0):
+        print(f"Warning: {coord.name} is not evenly spaced, using mean spacing")
+    unit = coord.attrs.get('units', '')
+    name = spectrum_dim_name(str(coord.name))
+    return xr.DataArray(
+        np.fft.rfftfreq(values.size, d=abs(spacing)),
+        dims = name,
+        name = name,
+        attrs = {
+            'long_name': f"frequency of {coord.name}",
+            'units': FREQUENCY_UNITS.get(unit, f'1/{unit}' if unit else '')
+        }
+    )
+
+def spectrum_dataset(
+        dataset: xr.Dataset,
+        dim: str,
+        results: Sequence[str] | None = None
+        ) -> xr.Dataset:
+    """
+    Amplitude spectra of results along a dim. Results sharing their dims are
+    transformed in one batched `np.fft.rfft` call. NaN values, e.g. of
+    unfinished runs, are treated as zero after removing the offset. Results
+    without the dim and coordinates along the dim are dropped.
+
+    Args:
+        dataset (xr.Dataset): Dataset to transform
+        dim (str): Dim to transform along
+        results (Sequence[str] | None): Results to transform, all if None
+    Returns:
+        spectra (xr.Dataset): Single sided amplitude spectra with the dim
+            replaced by the frequency dim, see `spectrum_dim_name`
+    """
+    if results is None:
+        results = list(dataset.data_vars)
+    frequencies = frequency_coordinate(dataset[dim])
+    n_values = dataset.sizes[dim]
+    groups: dict[tuple[str, ...], list[str]] = {}
+    for name in results:
+        if dim in dataset[name].dims:
+            groups.setdefault(dataset[name].dims, []).append(name)
+    data_vars = {}
+    for dims, names in groups.items():
+        other_dims = [d for d in dims if d != dim]
+        stacked = np.stack([
+            np.asarray(dataset[name].transpose(*other_dims, dim).values, dtype=float)
+            for name in names
+        ])
+        with np.errstate(invalid='ignore'):
+            stacked -= np.nanmean(stacked, axis=-1, keepdims=True)
+        stacked[np.isnan(stacked)] = 0
+        amplitudes = 2 * np.abs(np.fft.rfft(stacked, axis=-1)) / n_values
+        for name, values in zip(names, amplitudes):
+            data_vars[name] = xr.DataArray(
+                values,
+                dims = other_dims + [frequencies.name],
+                attrs = dataset[name].attrs
+            )
+    coords = {
+        name: coord for name, coord in dataset.coords.items()
+        if dim not in coord.dims
+    }
+    coords[frequencies.name] = frequencies
+    return xr.Dataset(data_vars, coords=coords)
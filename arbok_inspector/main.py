@@ -4,7 +4,17 @@ import argparse
 from nicegui import ui
 
 from arbok_inspector.state import inspector
-from arbok_inspector.pages import greeter, database_browser, run_view
+from arbok_inspector.classes.refresh_coordinator import (
+    refresh_coordinator, DEFAULT_MAX_CONCURRENT_LOADS
+)
+from arbok_inspector.classes.timing_metrics import timing_metrics
+from arbok_inspector.classes.dataset_cache import dataset_cache
+from arbok_inspector.classes.session_registry import (
+    session_registry, DEFAULT_MEMORY_BUDGET_BYTES, DEFAULT_IDLE_TIMEOUT_S
+)
+from arbok_inspector.pages import (
+    greeter, database_browser, run_view, export_download, diagnostics
+)
 
 def run(port: int = 8090) -> None:
     ui.run(
@@ -24,7 +34,62 @@ def main() -> None:
         default=8090,
         help='Port to run the server on (default: 8090)',
     )
+    parser.add_argument(
+        '--max-concurrent-loads',
+        type=int,
+        default=DEFAULT_MAX_CONCURRENT_LOADS,
+        help='Maximum number of runs reloaded at the same time '
+            f'(default: {DEFAULT_MAX_CONCURRENT_LOADS})',
+    )
+    parser.add_argument(
+        '--no-bit-packing',
+        action='store_true',
+        help='Keep boolean results as loaded instead of bit-packing them',
+    )
+    parser.add_argument(
+        '--float32',
+        action='store_true',
+        help='Load float results as float32 to halve their memory',
+    )
+    parser.add_argument(
+        '--no-progressive-loading',
+        action='store_true',
+        help='Load large runs at once instead of showing a partial read first',
+    )
+    parser.add_argument(
+        '--metrics',
+        action='store_true',
+        help='Time the hot paths, shown at /diagnostics and /metrics',
+    )
+    parser.add_argument(
+        '--memory-budget-gb',
+        type=float,
+        default=DEFAULT_MEMORY_BUDGET_BYTES / 1024**3,
+        help='Memory the runs of all tabs and the cached runs may hold '
+            'before cached runs are evicted and idle tabs release their data, '
+            '0 disables the budget '
+            f'(default: {DEFAULT_MEMORY_BUDGET_BYTES / 1024**3:.0f})',
+    )
+    parser.add_argument(
+        '--idle-timeout',
+        type=float,
+        default=DEFAULT_IDLE_TIMEOUT_S,
+        help='Seconds without interaction after which a tab may release its '
+            f'data (default: {DEFAULT_IDLE_TIMEOUT_S})',
+    )
     args = parser.parse_args()
+    refresh_coordinator.max_concurrent_loads = args.max_concurrent_loads
+    inspector.pack_boolean_results = not args.no_bit_packing
+    inspector.narrow_floats = args.float32
+    inspector.progressive_loading = not args.no_progressive_loading
+    timing_metrics.enabled = args.metrics
+    session_registry.budget_bytes = (
+        int(args.memory_budget_gb * 1024**3) if args.memory_budget_gb > 0 else None)
+    session_registry.idle_timeout_s = args.idle_timeout
+    ### Cached runs count towards the budget, so the cache may never exceed it
+    if session_registry.budget_bytes is not None:
+        dataset_cache.max_bytes = min(
+            dataset_cache.max_bytes, session_registry.budget_bytes)
     run(port=args.port)
 
 if __name__ in {"__main__", "__mp_main__"}:
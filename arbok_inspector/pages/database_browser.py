@@ -1,11 +1,20 @@
 """Database browser page showing the selected database information and run/day selectors."""
 from nicegui import ui, app
+from nicegui import run as nicegui_run
 
 from arbok_inspector.state import inspector
+from arbok_inspector.classes.bulk_export_job import BulkExportJob
+from arbok_inspector.classes.export_job import (
+    ExportCancelled,
+    register_export_job,
+    EXPORT_FORMATS,
+    DEFAULT_COMPRESSION_LEVEL
+)
 from arbok_inspector.widgets.day_selector import (
     build_day_selector,
     update_day_selector,
-    trigger_update_run_selector
+    trigger_update_run_selector,
+    update_runs_subscription
 )
 from arbok_inspector.widgets.run_selector import build_run_selector
 
@@ -41,6 +50,9 @@ async def database_browser_page():
 
     app.storage.tab['day_grid'] = None
     app.storage.tab['run_grid'] = None
+    app.storage.tab['auto_refresh'] = {
+        'active': False, 'interval': DEFAULT_REFRESH_INTERVAL_S}
+    app.storage.tab['runs_subscription'] = None
 
     offset_minutes = await ui.run_javascript('new Date().getTimezoneOffset()')
     offset_hours = -float(offset_minutes) / 60
@@ -110,26 +122,112 @@ def build_actions_section():
                 on_click= lambda: trigger_update_run_selector(None),
                 color = '#4BA701'
                 ).props('dense').classes('w-full')
+            app.storage.tab["export_settings"] = {
+                'format': 'netcdf',
+                'compression_level': DEFAULT_COMPRESSION_LEVEL
+            }
+            with ui.row().classes('w-full no-wrap gap-1'):
+                ui.button(
+                    text = 'Export selected',
+                    icon = 'file_download',
+                    on_click = lambda: export_selected_runs(export_progress),
+                    color = 'blue'
+                    ).props('dense').classes('flex-grow')
+                ui.select(
+                    options = list(EXPORT_FORMATS),
+                    value = 'netcdf',
+                ).bind_value(app.storage.tab["export_settings"], 'format')\
+                    .props('dense').classes('w-20 text-xs')
+            export_progress = ui.column().classes('w-full gap-1')
+            export_progress.set_visibility(False)
+
+async def export_selected_runs(progress_container: ui.column) -> None:
+    """
+    Export all runs selected in the run grid into a single zip archive.
+    The runs are loaded and written in a background job whose progress is
+    shown in the given container.
+
+    Args:
+        progress_container (ui.column): Container to show the progress in
+    """
+    run_grid: ui.aggrid = app.storage.tab['run_grid']
+    selected_rows = await run_grid.get_selected_rows()
+    run_ids = sorted(row['run_id'] for row in selected_rows)
+    if len(run_ids) == 0:
+        ui.notify('Select runs in the grid to export them', type='warning')
+        return
+    settings = app.storage.tab["export_settings"]
+    job = register_export_job(BulkExportJob(
+        run_ids,
+        file_stem = f"runs_{run_ids[0]}-{run_ids[-1]}",
+        database_type = inspector.database_type,
+        db_path = inspector.qcodes_database_path,
+        export_format = settings['format'],
+        compression_level = settings['compression_level']
+    ))
+    progress_container.clear()
+    with progress_container:
+        label = ui.label(f'Exporting 0/{len(run_ids)} runs').classes('text-xs')
+        progress = ui.linear_progress(value=0, show_value=False)
+        ui.button(
+            'Cancel', color='red', on_click=job.cancel
+            ).props('dense').classes('w-full')
+    progress_container.set_visibility(True)
+
+    def update_progress():
+        label.set_text(f'Exporting {job.completed_runs}/{len(run_ids)} runs')
+        progress.set_value(job.progress)
+
+    progress_timer = ui.timer(0.5, update_progress)
+    try:
+        await nicegui_run.io_bound(job.write)
+    except ExportCancelled:
+        ui.notify('Export cancelled', type='warning', position='top-right')
+        return
+    except Exception as e:
+        ui.notify(f'Error exporting runs: {e}', type='negative', close_button='OK')
+        print("Error in export_selected_runs:", e)
+        return
+    finally:
+        progress_timer.cancel()
+        progress_container.set_visibility(False)
+    if job.failed_runs:
+        ui.notify(
+            f'Runs {list(job.failed_runs)} could not be exported',
+            type='warning', close_button='OK')
+    ui.download.from_url(job.url, job.file_name)
+
+def set_auto_refresh(active: bool) -> None:
+    """
+    Enable or disable the auto-refresh of the run selector. The tab then
+    subscribes to the poller of the selected day shared by all tabs.
+
+    Args:
+        active (bool): Whether auto-refresh is enabled
+    """
+    app.storage.tab['auto_refresh']['active'] = active
+    update_runs_subscription()
 
-def on_interval_change(e, timer) -> None:
+def on_interval_change(e) -> None:
     """
     Handles changes to the refresh interval input.
     
     Args:
         e: The event object containing the new value.
-        timer: The timer object to update the interval for.
     """
+    settings = app.storage.tab['auto_refresh']
     try:
         value = float(e.value)
         if value < 0.1:
             ui.notify('Interval must be at least 0.1 s', color='red')
-            e.sender.value = timer.interval  # revert
+            e.sender.value = settings['interval']  # revert
             return
-        timer.interval = value
+        settings['interval'] = value
+        update_runs_subscription()
         ui.notify(f'Refresh interval set to {value:.2f} s', color='green')
-    except ValueError:
+    except (TypeError, ValueError):
         ui.notify('Please enter a valid number', color='red')
-        e.sender.value = timer.interval  # revert
+        e.sender.value = settings['interval']  # revert
 
 def build_settings_section():
     """Build the database settings section."""
@@ -158,20 +256,12 @@ def build_settings_section():
 
             with ui.row().classes('items-center gap-2'):
                 ui.label("Auto-refresh")
-                timer = ui.timer(
-                    interval=DEFAULT_REFRESH_INTERVAL_S,
-                    callback=  lambda: trigger_update_run_selector(None),
-                    active=False
-                    )
-                # ui.label('Auto-plot')
-                ui.switch(
-                    on_change=lambda e: setattr(timer, 'active', e.value)
-                )
+                ui.switch(on_change=lambda e: set_auto_refresh(e.value))
                 ui.number(
                     # label='(s)',
                     value=DEFAULT_REFRESH_INTERVAL_S,
                     min=0.1,
                     step=0.1,
                     format='%.1f',
-                    on_change=lambda e: on_interval_change(e, timer),
+                    on_change=on_interval_change,
                 ).props('dense suffix="s"').classes('w-12')
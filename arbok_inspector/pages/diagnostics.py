@@ -0,0 +1,118 @@
+"""Diagnostics page and Prometheus endpoint showing timings and memory usage"""
+import math
+
+from fastapi.responses import PlainTextResponse
+from nicegui import ui, app
+
+from arbok_inspector.classes.timing_metrics import timing_metrics
+from arbok_inspector.classes.session_registry import session_registry
+
+TIMING_COLUMNS = [
+    {'name': 'span', 'label': 'Span', 'field': 'span', 'align': 'left'},
+    {'name': 'count', 'label': 'Count', 'field': 'count'},
+    {'name': 'mean', 'label': 'Mean (ms)', 'field': 'mean'},
+    {'name': 'p50', 'label': 'p50 (ms)', 'field': 'p50'},
+    {'name': 'p95', 'label': 'p95 (ms)', 'field': 'p95'},
+    {'name': 'max', 'label': 'Max (ms)', 'field': 'max'},
+    {'name': 'total', 'label': 'Total (s)', 'field': 'total'},
+]
+SESSION_COLUMNS = [
+    {'name': 'tab', 'label': 'Tab', 'field': 'tab', 'align': 'left'},
+    {'name': 'run', 'label': 'Run ID', 'field': 'run'},
+    {'name': 'held', 'label': 'Held (MB)', 'field': 'held'},
+    {'name': 'idle', 'label': 'Idle (s)', 'field': 'idle'},
+    {'name': 'released', 'label': 'Released', 'field': 'released'},
+]
+REFRESH_INTERVAL_S = 2
+
+@app.get('/metrics')
+def metrics() -> PlainTextResponse:
+    """Serve the span histograms and memory usage in the Prometheus text format"""
+    return PlainTextResponse(
+        timing_metrics.to_prometheus() + session_registry.to_prometheus(),
+        media_type = 'text/plain; version=0.0.4')
+
+@ui.page('/diagnostics')
+def diagnostics_page():
+    """Page showing the timing histograms of all spans and the memory of all tabs"""
+    ui.page_title('Arbok Inspector - Diagnostics')
+    with ui.column().classes('w-full'):
+        ui.label('Diagnostics').classes('text-3xl font-bold mb-1')
+        with ui.row().classes('items-center gap-4'):
+            ui.switch('Timing enabled').bind_value(timing_metrics, 'enabled')
+            ui.button(
+                'Reset', color='red',
+                on_click = lambda: (timing_metrics.reset(), update_timing_table(table))
+                ).props('dense')
+            ui.link('Prometheus metrics', '/metrics', new_tab=True)
+        ui.label(
+            'Percentiles are estimated from the histogram buckets'
+            ).classes('text-xs')
+        table = ui.table(
+            columns = TIMING_COLUMNS, rows = [], row_key = 'span'
+            ).classes('w-full')
+        ui.label('Memory').classes('text-xl font-semibold mt-4')
+        memory_label = ui.label().classes('text-sm')
+        session_table = ui.table(
+            columns = SESSION_COLUMNS, rows = [], row_key = 'tab'
+            ).classes('w-full')
+
+    def update():
+        update_timing_table(table)
+        update_session_table(session_table, memory_label)
+
+    update()
+    ui.timer(REFRESH_INTERVAL_S, update)
+
+def update_timing_table(table: ui.table) -> None:
+    """
+    Fill the table with the current summary of every span.
+
+    Args:
+        table (ui.table): Table to update
+    """
+    def ms(seconds: float) -> str:
+        return '-' if math.isnan(seconds) else f'{seconds * 1e3:.1f}'
+
+    rows = []
+    for name, summary in timing_metrics.summaries().items():
+        rows.append({
+            'span': name,
+            'count': summary['count'],
+            'mean': ms(summary['mean']),
+            'p50': ms(summary['p50']),
+            'p95': ms(summary['p95']),
+            'max': ms(summary['max']),
+            'total': f"{summary['mean'] * summary['count']:.2f}",
+        })
+    table.rows = rows
+    table.update()
+
+def update_session_table(table: ui.table, label: ui.label) -> None:
+    """
+    Fill the table with the memory held by every run tab.
+
+    Args:
+        table (ui.table): Table to update
+        label (ui.label): Label showing the total and the budget
+    """
+    budget = session_registry.budget_bytes
+    budget_text = 'no budget' if budget is None else f'budget {budget / 1024**2:.0f} MB'
+    label.set_text(
+        f'{session_registry.total_bytes() / 1024**2:.1f} MB held by '
+        f'{len(session_registry.sessions)} tab(s) and '
+        f'{session_registry.cached_bytes() / 1024**2:.1f} MB of cached runs, '
+        f'{budget_text}, '
+        f'{session_registry.released_bytes / 1024**2:.1f} MB released so far')
+    usage = session_registry.usage()
+    rows = []
+    for session in session_registry.sessions:
+        rows.append({
+            'tab': session.client.id[:8],
+            'run': session.run.run_id,
+            'held': f"{usage.get(session.client.id, 0) / 1024**2:.1f}",
+            'idle': f"{session.idle_seconds:.0f}",
+            'released': 'yes' if session.run.is_released else 'no',
+        })
+    table.rows = rows
+    table.update()
@@ -0,0 +1,26 @@
+"""Endpoint serving finished dataset exports from their temporary files"""
+from fastapi import HTTPException
+from fastapi.responses import FileResponse
+from nicegui import app
+
+from arbok_inspector.classes.export_job import get_export_job, cleanup_export_jobs
+
+@app.get('/export/{job_id}')
+def export_download(job_id: str) -> FileResponse:
+    """
+    Serve the file of a finished export job. Range requests are handled by
+    the FileResponse, so interrupted downloads can be resumed.
+
+    Args:
+        job_id (str): ID of the export job
+    """
+    job = get_export_job(job_id)
+    if job is None or job.status != 'done':
+        raise HTTPException(status_code=404, detail='Export not found')
+    return FileResponse(
+        job.file_path,
+        filename = job.file_name,
+        media_type = job.media_type
+    )
+
+app.on_shutdown(cleanup_export_jobs)
@@ -1,5 +1,4 @@
 """Module containing greeter page for arbok-inspector"""
-from tkinter import Tk, filedialog
 
 from nicegui import ui, run
 from arbok_inspector.state import inspector
@@ -22,6 +21,9 @@ async def greeter_page() -> None:
                 ui.label('Pick your database type:').classes(
                     'text-2xl font-bold text-center mb-6'
                 )
+                ui.switch(
+                    'Load results as float32 (halves memory, coordinates stay exact)'
+                ).bind_value(inspector, 'narrow_floats').props(f'color={ARBOK_PURPLE}')
             with ui.row().classes('w-full gap-4 items-stretch'):
                 with ui.card().classes('flex-1'):
                     build_qcodes_connection_section()
@@ -104,6 +106,7 @@ def build_native_arbok_connection_section() -> None:
         color=ARBOK_GREEN).classes('mb-4 w-full')
     
 def open_file_dialog():
+    from tkinter import Tk, filedialog
     root = Tk()
     root.withdraw()
     root.attributes('-topmost', True)
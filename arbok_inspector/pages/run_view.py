@@ -2,22 +2,34 @@
 from __future__ import annotations
 from typing import TYPE_CHECKING
 import json
+import asyncio
 import importlib.resources as resources
 
-from nicegui import ui, app
+from nicegui import ui, app, background_tasks
 from nicegui import run as nicegui_run
 
 from arbok_inspector.state import inspector
 from arbok_inspector.widgets.build_xarray_grid import build_xarray_grid
 from arbok_inspector.widgets.build_xarray_html import build_xarray_html
 from arbok_inspector.widgets.build_run_view_actions import build_run_view_actions
+from arbok_inspector.widgets.build_analysis_section import build_analysis_section
+from arbok_inspector.widgets.build_correlator_selector import build_correlator_selector
+from arbok_inspector.widgets.build_derived_results import build_derived_results
 from arbok_inspector.helpers.unit_formater import unit_formatter
-from arbok_inspector.classes.qcodes_run import QcodesRun
-from arbok_inspector.classes.native_run import NativeRun
+from arbok_inspector.helpers.reductions import STATISTICS
+from arbok_inspector.classes.run_factory import build_run
+from arbok_inspector.classes.run_prefetcher import run_prefetcher
+from arbok_inspector.classes.refresh_coordinator import (
+    reload_run_dataset, reload_if_released
+)
+from arbok_inspector.classes.session_registry import (
+    session_registry, MEMORY_CHECK_INTERVAL_S
+)
 
 from arbok_inspector.classes.dim import Dim
 
 if TYPE_CHECKING:
+    from nicegui import Client
     from nicegui.elements.slider import Slider
     from arbok_inspector.classes.base_run import BaseRun
 
@@ -29,10 +41,12 @@ RUN_TABLE_COLUMNS = [
     {'field': 'average', 'checkboxSelection': True},
 ]
 
-AXIS_OPTIONS = ['average', 'select_value', 'y-axis', 'x-axis']
+AXIS_OPTIONS = ['average', 'histogram', 'fft', 'select_value', 'y-axis', 'x-axis']
 
 EXPANSION_CLASSES = 'w-full p-0 gap-1 border border-gray-400 rounded-lg no-wrap items-start pt-0 mt-0'
 TITLE_CLASSES = 'text-lg font-semibold'
+### Fractions of a large run shown while it is loaded, the first one is awaited
+PROGRESSIVE_STAGES = (0.02, 0.1)
 
 @ui.page('/run/{run_id}')
 async def run_page(run_id: str):
@@ -53,8 +67,12 @@ async def run_page(run_id: str):
             ui.label('Loading dataset...')
             ui.spinner(size='lg')
     loading_dialog.open()
+    progressive = inspector.progressive_loading
     try:
-        run = await create_run(run_id)
+        if progressive:
+            ### Prefetched runs are shown at once
+            progressive = not await run_prefetcher.is_cached(run_id)
+        run = await create_run(run_id, progressive)
         app.storage.tab["run"] = run
     except Exception as e:
         loading_dialog.close()
@@ -68,6 +86,9 @@ async def run_page(run_id: str):
             loading_dialog.close()
     app.storage.tab["placeholders"] = {'plots': None}
     app.storage.tab["run"] = run
+    session = session_registry.register(ui.context.client, run)
+    session.on_release = show_released_placeholder
+    session_registry.enforce()
     with resources.files("arbok_inspector.configurations").joinpath("1d_plot.json").open("r") as f:
         app.storage.tab["plot_dict_1D"] = json.load(f)
     with resources.files("arbok_inspector.configurations").joinpath("2d_plot.json").open("r") as f:
@@ -93,6 +114,12 @@ async def run_page(run_id: str):
                         value = value,
                         on_change = lambda e, r=result: run.update_plot_selection(e.value, r),
                     ).classes('text-sm h-4').props('color=purple')
+            with ui.card().classes('w-full gap-2'):
+                ui.label("Derived results:").classes(TITLE_CLASSES)
+                build_derived_results()
+            with ui.card().classes('w-full gap-2'):
+                ui.label("Correlators:").classes(TITLE_CLASSES)
+                build_correlator_selector()
             with ui.card().classes('w-full gap-2'):
                 ui.label("Actions:").classes(TITLE_CLASSES)
                 build_run_view_actions()
@@ -108,10 +135,14 @@ async def run_page(run_id: str):
                         label = ui.label(f"{column_name.upper()}: ")
                     label.classes('font-semibold m-0 p-0"')
                     ui.label(value).classes("m-0 p-0 ml-5")
+                for option, n_bytes in run.saved_bytes.items():
+                    ui.label(f"SAVED BY {option.upper()}: ").classes('font-semibold m-0 p-0')
+                    ui.label(f"{n_bytes / 1024**2:.1f} MB").classes("m-0 p-0 ml-5")
 
         with ui.column().classes('flex-1 min-w-0'):
             with ui.expansion(f'plot: {run.name}', icon='stacked_line_chart', value=True)\
                 .classes(EXPANSION_CLASSES):
+                build_loading_progress()
                 app.storage.tab["placeholders"]["plots"] = ui.row().\
                     classes('w-full min-h-[50vh] p-1 items-stretch')
                 build_xarray_grid()
@@ -119,11 +150,12 @@ async def run_page(run_id: str):
                     #.style('line-height: 1rem; padding-top: 0; padding-bottom: 0;')
             with ui.expansion('xarray summary', icon='summarize', value=False)\
                 .classes(EXPANSION_CLASSES):
-                build_xarray_html()
+                app.storage.tab["placeholders"]["summary"] = ui.column().classes('w-full')
+                with app.storage.tab["placeholders"]["summary"]:
+                    build_xarray_html()
             with ui.expansion('analysis', icon='science', value=False)\
                 .classes(EXPANSION_CLASSES):
-                with ui.row():
-                    ui.label("Working on it!  -Andi").classes(TITLE_CLASSES)
+                build_analysis_section()
             with ui.expansion('metadata', icon='numbers', value=False)\
                 .classes(f"{EXPANSION_CLASSES}  overflow-x-auto"):
                 placeholder_metadata = {}
@@ -141,6 +173,30 @@ async def run_page(run_id: str):
                     text="download serialized qua program",
                     on_click = lambda: download_qua_code(run),
                 )
+    if run.loaded_fraction < 1:
+        background_tasks.create(refine_run(run, ui.context.client))
+
+def show_released_placeholder() -> None:
+    """Replace the plots of a tab whose data was released while it was idle."""
+    container = app.storage.tab["placeholders"]['plots']
+    container.clear()
+    with container:
+        ui.button(
+            'Data released while idle, click to show the plots again',
+            icon = 'refresh',
+            on_click = show_released_plots
+            ).props('flat')
+
+async def show_released_plots() -> None:
+    """Reload the released dataset of the tab's run and rebuild its plots."""
+    run: BaseRun = app.storage.tab["run"]
+    try:
+        await reload_run_dataset(run)
+    except Exception as e:
+        ui.notify(f"Error reloading dataset: {e}", type="negative", close_button="OK")
+        print("Error in show_released_plots:", e)
+        return
+    build_xarray_grid(has_new_data=True)
 
 def add_dim_dropdown(sweep_idx: int):
     """
@@ -168,10 +224,15 @@ def add_dim_dropdown(sweep_idx: int):
     ).classes(f"{width} text-sm m-0 p-0").props('dense')
     dim.ui_selector = ui_element
     local_placeholder["slider"] = ui.column().classes('w-full')
-    if dim.option == 'select_value':
-        build_dim_slider(run, dim)
+    with local_placeholder["slider"]:
+        if dim.option == 'select_value':
+            build_dim_slider(run, dim)
+        elif dim.option == 'average':
+            build_statistic_select(dim)
+        elif dim.option == 'histogram':
+            build_histogram_settings(run)
 
-def update_dim_selection(dim: Dim, value: str, slider_placeholder):
+async def update_dim_selection(dim: Dim, value: str, slider_placeholder):
     """
     Update the dimension/sweep selection and rebuild the plot grid.
 
@@ -181,16 +242,25 @@ def update_dim_selection(dim: Dim, value: str, slider_placeholder):
         slider_placeholder: The UI placeholder to update
     """
     run: BaseRun = app.storage.tab["run"]
+    await reload_if_released(run)
     if dim.slider is not None:
         print("DELETING SLIDER")
         dim.slider.delete()
         dim.slider = None
         dim.select_label.delete()
         dim.select_label = None
+    if dim.option in ['average', 'histogram']:
+        slider_placeholder.clear()
     print(value)
     if value == 'select_value':
         with slider_placeholder:
             build_dim_slider(run, dim)
+    if value == 'average':
+        with slider_placeholder:
+            build_statistic_select(dim)
+    if value == 'histogram':
+        with slider_placeholder:
+            build_histogram_settings(run)
     run.update_subset_dims(dim, value)
     dim.option = value
     build_xarray_grid()
@@ -216,9 +286,57 @@ def build_dim_slider(run: BaseRun, dim: Dim):
             dim.select_label, dim.slider, dim, plot = False)
         dim.slider.on(
             'update:model-value',
-            lambda e: update_value_from_dim_slider(dim.select_label, dim.slider, dim),
+            lambda e: move_dim_slider(dim),
             throttle=0.2, leading_events=False)
 
+async def move_dim_slider(dim: Dim):
+    """Show the value selected by the slider of a dim and rebuild the plot grid."""
+    await reload_if_released(app.storage.tab["run"])
+    update_value_from_dim_slider(dim.select_label, dim.slider, dim)
+
+
+def build_statistic_select(dim: Dim):
+    """
+    Build a select for the statistic the averaged dim is reduced with.
+
+    Args:
+        dim (Dim): The averaged dimension object
+    """
+    ui.select(
+        options = STATISTICS,
+        value = dim.statistic,
+        label = 'statistic',
+        on_change = lambda e: update_dim_statistic(dim, e.value)
+    ).classes('w-full text-xs').props('dense')
+
+async def update_dim_statistic(dim: Dim, statistic: str):
+    """Update the statistic of an averaged dim and rebuild the plot grid."""
+    await reload_if_released(app.storage.tab["run"])
+    dim.statistic = statistic
+    build_xarray_grid()
+
+async def rebuild_plots():
+    """Rebuild the plot grid, e.g. after changing the histogram settings."""
+    await reload_if_released(app.storage.tab["run"])
+    build_xarray_grid()
+
+def build_histogram_settings(run: BaseRun):
+    """
+    Build the inputs for the number of bins and the range of the histograms.
+    Leaving min or max empty uses the range of the data.
+
+    Args:
+        run (BaseRun): The run the histograms are computed for
+    """
+    with ui.row().classes("w-full items-center no-wrap gap-1"):
+        for key, label in [('bins', 'bins'), ('min', 'min'), ('max', 'max')]:
+            ui.number(
+                label = label,
+                format = '%.0f' if key == 'bins' else None,
+                min = 1 if key == 'bins' else None,
+                on_change = rebuild_plots,
+            ).bind_value(run.histogram_settings, key)\
+                .props('dense').classes('w-16 text-xs')
 
 def update_value_from_dim_slider(label, slider, dim: Dim, plot = True):
     """
@@ -235,7 +353,7 @@ def update_value_from_dim_slider(label, slider, dim: Dim, plot = True):
     if plot:
         build_xarray_grid()
 
-def update_sweep_dim_name(dim: Dim, new_name: str):
+async def update_sweep_dim_name(dim: Dim, new_name: str):
     """
     Update the name of the dimension in the sweep dict and the dim object.
     
@@ -243,6 +361,7 @@ def update_sweep_dim_name(dim: Dim, new_name: str):
         dim (Dim): The dimension object to update
         new_name (str): The new name for the dimension
     """
+    await reload_if_released(app.storage.tab["run"])
     dim.name = new_name
     dim.ui_selector.label = new_name.replace("__", ".")
     build_xarray_grid()
@@ -267,15 +386,106 @@ def download_qua_code(run: BaseRun) -> None:
         ui.notify(f'Error downloading QUA code: {str(e)}', type='negative')
         raise e
 
-async def create_run(run_id: int) -> BaseRun:
-    """Create a Run object for the given run ID."""
-    if inspector.database_type == 'qcodes':
-        run = QcodesRun(int(run_id))
-    elif inspector.database_type == 'arbok_native':
-        run = NativeRun(int(run_id))
-    else:
-        raise ValueError(
-            "Database type must be 'qcodes' or 'arbok_native is:"
-            f"{inspector.database_type}")
-    await nicegui_run.io_bound(run.prepare_run)
+async def create_run(run_id: int, progressive: bool = False) -> BaseRun:
+    """
+    Create a Run object for the given run ID, prefetched runs load instantly.
+
+    Args:
+        run_id (int): ID of the run
+        progressive (bool): Whether to load only the first part of a large
+            run, the rest is loaded by `refine_run` once the page is shown
+    Returns:
+        run (BaseRun): The loaded run
+    """
+    run = build_run(run_id)
+    partial = None
+    if progressive:
+        partial = await nicegui_run.io_bound(
+            run.load_partial_run, PROGRESSIVE_STAGES[0])
+    if partial is None:
+        await run_prefetcher.load_run(run)
+    await nicegui_run.io_bound(run.process_run_data)
     return run
+
+async def refine_run(run: BaseRun, client: Client) -> None:
+    """
+    Load the rest of a partially loaded run in the background. The full
+    dataset is loaded while larger parts of the run are read and shown in the
+    meantime, unless the full dataset or newer data arrived first. The plots
+    and the summary are rebuilt with the full dataset, which is dropped if a
+    reload or the auto-plot set newer data in the meantime.
+
+    Args:
+        run (BaseRun): The partially loaded run
+        client (Client): Client of the run's tab
+    """
+    full_load = asyncio.create_task(run_prefetcher.load_dataset(run))
+    ### Version of the data set here, any other version is newer data set by
+    ### a reload or the auto-plot
+    data_version = run.data_version
+    for fraction in PROGRESSIVE_STAGES[1:]:
+        try:
+            dataset = await nicegui_run.io_bound(run.load_partial_dataset, fraction)
+        except Exception as e:
+            print(f"Run {run.run_id}: error loading {fraction:.0%} of the data: {e}")
+            break
+        ### The full dataset is ready or newer data was set in the meantime
+        if dataset is None or full_load.done() or run.data_version != data_version:
+            break
+        if client.is_deleted:
+            return
+        run.full_data_set = dataset
+        data_version = run.data_version
+        run.loaded_fraction = fraction
+        with client:
+            build_xarray_grid(has_new_data=True)
+            update_loading_progress()
+    try:
+        dataset = await full_load
+    except Exception as e:
+        print(f"Error loading run {run.run_id}:", e)
+        if not client.is_deleted:
+            with client:
+                app.storage.tab["placeholders"]['progress_label'].set_text(
+                    f'Showing the first {run.loaded_fraction:.0%} of the data, '
+                    'loading the rest failed')
+                ui.notify(f"Error loading run: {e}", type="negative", close_button="OK")
+        return
+    run.loaded_fraction = 1.
+    if client.is_deleted:
+        return
+    if run.data_version != data_version:
+        ### The newer data is complete and already shown
+        print(f"Run {run.run_id}: newer data was loaded, dropping the full load")
+        with client:
+            update_loading_progress()
+        return
+    run.full_data_set = dataset
+    with client:
+        build_xarray_grid(has_new_data=True)
+        update_loading_progress()
+        summary = app.storage.tab["placeholders"]["summary"]
+        summary.clear()
+        with summary:
+            build_xarray_html()
+
+def build_loading_progress() -> None:
+    """Progress of loading the run, only visible while the run is refined."""
+    placeholders = app.storage.tab["placeholders"]
+    with ui.row().classes('w-full items-center gap-2 px-2') as placeholders['progress']:
+        ui.spinner(size='sm')
+        placeholders['progress_label'] = ui.label().classes('text-xs')
+        placeholders['progress_bar'] = ui.linear_progress(show_value=False)\
+            .classes('flex-1')
+    update_loading_progress()
+
+def update_loading_progress() -> None:
+    """Show the fraction of the run loaded so far."""
+    run: BaseRun = app.storage.tab["run"]
+    placeholders = app.storage.tab["placeholders"]
+    placeholders['progress'].set_visibility(run.loaded_fraction < 1)
+    placeholders['progress_bar'].set_value(run.loaded_fraction)
+    placeholders['progress_label'].set_text(
+        f'Showing the first {run.loaded_fraction:.0%} of the data, loading the rest...')
+
+app.timer(MEMORY_CHECK_INTERVAL_S, session_registry.enforce)
@@ -3,11 +3,7 @@ from pathlib import Path
 import asyncio
 from typing import Optional
 
-from qcodes.dataset import initialise_or_create_database_at
-
-import fsspec
 import sqlite3
-from sqlalchemy import create_engine
 
 class ArbokInspector:
     def __init__(self):
@@ -21,8 +17,16 @@ class ArbokInspector:
         self.database_engine = None
         self.minio_filesystem = None
         self.minio_bucket = None
+        ### Store results holding only zeros and ones with one bit per value
+        self.pack_boolean_results: bool = True
+        ### Load float results as float32, coordinates are kept exact
+        self.narrow_floats: bool = False
+        ### Show large runs from a partial read first and refine them after
+        self.progressive_loading: bool = True
         
     def connect_qcodes_database(self):
+        ### Backend libraries are imported once their database type is chosen
+        from qcodes.dataset import initialise_or_create_database_at
         self.conn = sqlite3.connect(self.qcodes_database_path)
         self.conn.row_factory = sqlite3.Row
         self.cursor = self.conn.cursor()
@@ -72,6 +76,9 @@ class ArbokInspector:
             minio_password (str): The MinIO password.
             minio_bucket (str): The MinIO bucket name.
         """
+        import fsspec
+        from sqlalchemy import create_engine
+
         self.qcodes_database_path = None
         self.conn = None
         self.cursor = None
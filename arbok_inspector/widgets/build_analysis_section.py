@@ -0,0 +1,227 @@
+"""Module containing the analysis section of the run view"""
+from __future__ import annotations
+from typing import TYPE_CHECKING
+
+import copy
+import plotly.graph_objects as go
+from nicegui import ui, app
+from nicegui import run as nicegui_run
+
+from arbok_inspector.analysis.batch_fit import BatchFit, FIT_MODELS
+from arbok_inspector.analysis.peak_tracking import PEAK_KINDS
+from arbok_inspector.widgets.build_xarray_grid import build_xarray_grid
+from arbok_inspector.classes.refresh_coordinator import reload_if_released
+from arbok_inspector.helpers.string_formaters import axis_label_formater
+
+if TYPE_CHECKING:
+    from xarray import Dataset
+    from plotly.graph_objs import Figure
+    from arbok_inspector.classes.base_run import BaseRun
+
+def build_analysis_section() -> None:
+    """Build the batch fitting controls and the placeholder for its results."""
+    run: BaseRun = app.storage.tab["run"]
+    results = list(run.full_data_set.data_vars)
+    dims = list(run.full_data_set.dims)
+    x_dim = run.dim_axis_option['x-axis']
+    settings = {
+        'model': 'rabi',
+        'result': run.plot_selection[0] if run.plot_selection else results[0],
+        'fit_dim': x_dim.name if x_dim is not None else dims[0],
+        'peak_kind': 'peak',
+    }
+    app.storage.tab["fit_settings"] = settings
+    with ui.column().classes('w-full gap-2 p-2'):
+        with ui.row().classes('items-center gap-2'):
+            ui.select(
+                options = list(FIT_MODELS), label = 'model'
+            ).bind_value(settings, 'model').props('dense').classes('w-24')
+            ui.select(
+                options = {r: r.replace("__", ".") for r in results},
+                label = 'result'
+            ).bind_value(settings, 'result').props('dense').classes('w-48')
+            ui.select(
+                options = dims, label = 'fit along'
+            ).bind_value(settings, 'fit_dim').props('dense').classes('w-32')
+            ui.button(
+                'Fit',
+                icon = 'functions',
+                color = 'purple',
+                on_click = lambda: run_batch_fit(fit_results)
+            ).props('dense')
+        with ui.row().classes('items-center gap-2'):
+            ui.select(
+                options = PEAK_KINDS, label = 'track'
+            ).bind_value(settings, 'peak_kind').props('dense').classes('w-24')
+            ui.button(
+                'Track on heatmap',
+                icon = 'timeline',
+                color = 'purple',
+                on_click = lambda: set_peak_tracking(True)
+            ).props('dense')
+            ui.button(
+                'Clear',
+                icon = 'clear',
+                on_click = lambda: set_peak_tracking(False)
+            ).props('dense flat')
+        fit_results = ui.column().classes('w-full')
+
+async def set_peak_tracking(enabled: bool) -> None:
+    """
+    Overlay the peak or dip of the selected result along the selected dim on
+    its heatmap, or remove the overlay. The peak is tracked again whenever
+    the plots are rebuilt, so it follows the selected values of other dims.
+
+    Args:
+        enabled (bool): Whether to show or remove the tracked curve
+    """
+    run: BaseRun = app.storage.tab["run"]
+    await reload_if_released(run)
+    settings = app.storage.tab["fit_settings"]
+    result = settings['result']
+    if not enabled:
+        run.peak_tracking.pop(result, None)
+    else:
+        run.peak_tracking[result] = {
+            'dim': settings['fit_dim'], 'kind': settings['peak_kind']}
+        if result not in run.plot_selection:
+            run.plot_selection.append(result)
+    build_xarray_grid()
+
+async def run_batch_fit(container: ui.column) -> None:
+    """
+    Fit the selected model along the selected dim of the current averaged
+    subset for every index of the remaining dims and show the parameter maps.
+
+    Args:
+        container (ui.column): Container to show the fit results in
+    """
+    run: BaseRun = app.storage.tab["run"]
+    await reload_if_released(run)
+    settings = app.storage.tab["fit_settings"]
+    if settings['result'] not in run.last_avg_subset:
+        ui.notify(
+            f"{settings['result']} is not in the shown histograms or spectra, "
+            "select it for plotting to fit it", type = 'warning')
+        return
+    data = run.last_avg_subset[settings['result']]
+    sel_dict = {
+        d.name: d.select_index for d in run.dim_axis_option['select_value']
+        if d.name != settings['fit_dim'] and d.name in data.dims}
+    data = data.isel(**sel_dict)
+    if settings['fit_dim'] not in data.dims:
+        ui.notify(
+            f"{settings['fit_dim']} is averaged, select it as an axis to fit along it",
+            type = 'warning')
+        return
+    if data.ndim > 3:
+        ui.notify('Fits are shown for at most two remaining dims', type='warning')
+        return
+    fit = BatchFit(data, settings['model'], settings['fit_dim'], run_id=run.run_id)
+    container.clear()
+    with container:
+        ui.spinner(size='lg')
+    try:
+        fit_result = await nicegui_run.io_bound(fit.fit)
+    except Exception as e:
+        container.clear()
+        ui.notify(f"Error fitting data: {e}", type="negative", close_button="OK")
+        print("Error in run_batch_fit:", e)
+        return
+    app.storage.tab["fit_result"] = fit_result
+    container.clear()
+    with container:
+        n_converged = int(fit_result['converged'].sum())
+        ui.label(
+            f"{fit.model.expression}  --  {n_converged}/{fit_result['converged'].size}"
+            " traces converged").classes('text-sm')
+        if len(fit_result['converged'].dims) == 0:
+            figures = [create_best_fit_figure(fit, fit_result)]
+            _build_parameter_table(fit, fit_result)
+        else:
+            figures = create_parameter_figures(fit, fit_result)
+        with ui.row().classes('w-full flex-wrap'):
+            for figure in figures:
+                ui.plotly(figure).classes('w-[45%]').style('min-height: 300px;')
+
+def create_parameter_figures(fit: BatchFit, fit_result: Dataset) -> list[Figure]:
+    """
+    Create one figure per fit parameter, a line plot with error bars if the
+    parameter map is 1D and a heatmap if it is 2D.
+
+    Args:
+        fit (BatchFit): The fit the results belong to
+        fit_result (Dataset): Parameter maps as returned by `BatchFit.fit`
+    Returns:
+        list[Figure]: The plotly figures
+    """
+    figures = []
+    for name in fit.model.param_names + ['r_squared']:
+        param = fit_result[name]
+        if param.ndim == 1:
+            dim = param.dims[0]
+            plot_dict = copy.deepcopy(app.storage.tab["plot_dict_1D"])
+            trace = {
+                "type": "scatter",
+                "mode": "markers",
+                "name": name,
+                "x": fit_result[dim].values.tolist(),
+                "y": param.values.tolist(),
+            }
+            if f'{name}_stderr' in fit_result:
+                trace["error_y"] = {
+                    "type": "data",
+                    "array": fit_result[f'{name}_stderr'].values.tolist(),
+                    "visible": True}
+            plot_dict["data"] = [trace]
+            plot_dict["layout"]["xaxis"]["title"]["text"] = axis_label_formater(
+                fit_result, dim)
+            plot_dict["layout"]["yaxis"]["title"]["text"] = name
+        else:
+            y_dim, x_dim = param.dims
+            plot_dict = copy.deepcopy(app.storage.tab["plot_dict_2D"])
+            plot_dict["data"][0]["z"] = param.values.tolist()
+            plot_dict["data"][0]["x"] = fit_result[x_dim].values.tolist()
+            plot_dict["data"][0]["y"] = fit_result[y_dim].values.tolist()
+            plot_dict["layout"]["xaxis"]["title"]["text"] = axis_label_formater(
+                fit_result, x_dim)
+            plot_dict["layout"]["yaxis"]["title"]["text"] = axis_label_formater(
+                fit_result, y_dim)
+        plot_dict["layout"]["title"]["text"] = f"<b>{name}</b>"
+        figures.append(go.Figure(plot_dict))
+    return figures
+
+def create_best_fit_figure(fit: BatchFit, fit_result: Dataset) -> Figure:
+    """Create a figure showing a single trace together with its best fit"""
+    plot_dict = copy.deepcopy(app.storage.tab["plot_dict_1D"])
+    x_values = fit.xr_data[fit.fit_dim].values.tolist()
+    plot_dict["data"] = [
+        {
+            "type": "scatter",
+            "mode": "markers",
+            "name": "data",
+            "x": x_values,
+            "y": fit.xr_data.values.tolist(),
+        },
+        {
+            "type": "scatter",
+            "mode": "lines",
+            "name": "fit",
+            "x": x_values,
+            "y": fit.evaluate(fit_result).values.tolist(),
+        },
+    ]
+    plot_dict["layout"]["xaxis"]["title"]["text"] = axis_label_formater(
+        fit.xr_data, fit.fit_dim)
+    plot_dict["layout"]["title"]["text"] = f"<b>{fit.model.name} fit</b>"
+    return go.Figure(plot_dict)
+
+def _build_parameter_table(fit: BatchFit, fit_result: Dataset) -> None:
+    rows = []
+    for name in fit.model.param_names:
+        rows.append({
+            'parameter': name,
+            'value': f"{float(fit_result[name]):.6g}",
+            'stderr': f"{float(fit_result[f'{name}_stderr']):.2g}",
+        })
+    ui.table(rows=rows).props('dense').classes('text-xs')
@@ -0,0 +1,82 @@
+"""Module containing the correlator selection of the run view"""
+from __future__ import annotations
+from typing import TYPE_CHECKING
+
+from nicegui import ui, app
+
+from arbok_inspector.helpers.reductions import CORRELATOR_KINDS
+from arbok_inspector.widgets.build_xarray_grid import build_xarray_grid
+from arbok_inspector.classes.refresh_coordinator import reload_if_released
+
+if TYPE_CHECKING:
+    from arbok_inspector.classes.base_run import BaseRun
+
+def build_correlator_selector() -> None:
+    """
+    Build the controls to correlate several results shot by shot. The
+    correlators are averaged over the averaged dims and shown as derived
+    results.
+    """
+    run: BaseRun = app.storage.tab["run"]
+    settings = {'results': [], 'kind': CORRELATOR_KINDS[0]}
+    ui.select(
+        options = {r: r.replace("__", ".") for r in run.full_data_set.data_vars},
+        label = 'results',
+        multiple = True,
+    ).bind_value(settings, 'results').props('dense use-chips').classes('w-full text-xs')
+    with ui.row().classes('w-full items-center no-wrap gap-1'):
+        ui.select(
+            options = CORRELATOR_KINDS, label = 'kind'
+        ).bind_value(settings, 'kind').props('dense').classes('flex-grow text-xs')
+        ui.button(
+            icon = 'add',
+            color = 'purple',
+            on_click = lambda: add_correlator(settings, correlator_list)
+        ).props('dense')
+    correlator_list = ui.column().classes('w-full gap-1')
+    build_correlator_list(correlator_list)
+
+async def add_correlator(settings: dict, container: ui.column) -> None:
+    """
+    Add a correlator of the selected results and rebuild the plot grid.
+
+    Args:
+        settings (dict): Selected 'results' and correlator 'kind'
+        container (ui.column): Container listing the correlators
+    """
+    run: BaseRun = app.storage.tab["run"]
+    await reload_if_released(run)
+    try:
+        name = run.add_correlator(settings['results'], settings['kind'])
+    except ValueError as e:
+        ui.notify(str(e), type='negative')
+        return
+    ui.notify(f'Correlator {name} added to plot selection', position='top-right')
+    build_correlator_list(container)
+    build_xarray_grid()
+
+async def remove_correlator(name: str, container: ui.column) -> None:
+    """Remove a correlator and rebuild the list and the plot grid."""
+    run: BaseRun = app.storage.tab["run"]
+    await reload_if_released(run)
+    run.remove_correlator(name)
+    build_correlator_list(container)
+    build_xarray_grid()
+
+def build_correlator_list(container: ui.column) -> None:
+    """List the correlators of the run with a plot checkbox and a delete button"""
+    run: BaseRun = app.storage.tab["run"]
+    container.clear()
+    with container:
+        for name in run.correlators:
+            with ui.row().classes('w-full items-center no-wrap gap-1'):
+                ui.checkbox(
+                    text = name,
+                    value = name in run.plot_selection,
+                    on_change = lambda e, n=name: run.update_plot_selection(e.value, n),
+                ).classes('text-sm h-4 flex-grow').props('color=purple')
+                ui.button(
+                    icon = 'delete',
+                    color = 'red',
+                    on_click = lambda n=name: remove_correlator(n, container)
+                ).props('dense flat size=sm')
@@ -0,0 +1,82 @@
+"""Module containing the derived results section of the run view"""
+from __future__ import annotations
+from typing import TYPE_CHECKING
+
+from nicegui import ui, app
+
+from arbok_inspector.helpers.expressions import FUNCTIONS
+from arbok_inspector.widgets.build_xarray_grid import build_xarray_grid
+from arbok_inspector.classes.refresh_coordinator import reload_if_released
+
+if TYPE_CHECKING:
+    from arbok_inspector.classes.base_run import BaseRun
+
+def build_derived_results() -> None:
+    """
+    Build the controls to define derived results by expressions over the
+    loaded results, e.g. 'sqrt(Q1.I**2 + Q1.Q**2)' or 'Q1.I > 0.2'.
+    """
+    settings = {'name': '', 'expression': ''}
+    ui.input(
+        label = 'expression',
+        placeholder = 'sqrt(Q1.I**2 + Q1.Q**2)',
+    ).bind_value(settings, 'expression').props('dense').classes('w-full text-xs')\
+        .tooltip(f"Functions: {', '.join(FUNCTIONS)}")
+    with ui.row().classes('w-full items-center no-wrap gap-1'):
+        ui.input(
+            label = 'name (optional)'
+        ).bind_value(settings, 'name').props('dense').classes('flex-grow text-xs')
+        ui.button(
+            icon = 'add',
+            color = 'purple',
+            on_click = lambda: add_derived_result(settings, derived_list)
+        ).props('dense')
+    derived_list = ui.column().classes('w-full gap-1')
+    build_derived_list(derived_list)
+
+async def add_derived_result(settings: dict, container: ui.column) -> None:
+    """
+    Add a derived result and rebuild the plot grid.
+
+    Args:
+        settings (dict): 'name' and 'expression' of the derived result
+        container (ui.column): Container listing the derived results
+    """
+    run: BaseRun = app.storage.tab["run"]
+    await reload_if_released(run)
+    try:
+        name = run.add_derived_result(settings['name'], settings['expression'])
+    except ValueError as e:
+        ui.notify(str(e), type='negative')
+        return
+    ui.notify(f'Derived result {name} added to plot selection', position='top-right')
+    settings['name'] = ''
+    build_derived_list(container)
+    build_xarray_grid()
+
+async def remove_derived_result(name: str, container: ui.column) -> None:
+    """Remove a derived result and rebuild the list and the plot grid."""
+    run: BaseRun = app.storage.tab["run"]
+    await reload_if_released(run)
+    run.remove_derived_result(name)
+    build_derived_list(container)
+    build_xarray_grid()
+
+def build_derived_list(container: ui.column) -> None:
+    """List the derived results with a plot checkbox and a delete button"""
+    run: BaseRun = app.storage.tab["run"]
+    container.clear()
+    with container:
+        for name, expression in run.derived_results.items():
+            with ui.row().classes('w-full items-center no-wrap gap-1'):
+                ui.checkbox(
+                    text = name,
+                    value = name in run.plot_selection,
+                    on_change = lambda e, n=name: run.update_plot_selection(e.value, n),
+                ).classes('text-sm h-4 flex-grow').props('color=purple')\
+                    .tooltip(expression.expression)
+                ui.button(
+                    icon = 'delete',
+                    color = 'red',
+                    on_click = lambda n=name: remove_derived_result(n, container)
+                ).props('dense flat size=sm')
@@ -2,26 +2,55 @@
 from __future__ import annotations
 from typing import TYPE_CHECKING
 import os
-import asyncio
-from io import BytesIO
+import time
 
 from nicegui import app, ui
 from nicegui import run as nicegui_run
 
-from arbok_inspector.classes.dim import Dim
+from arbok_inspector.classes.subscription_hub import subscription_hub
+from arbok_inspector.classes.refresh_coordinator import (
+    reload_run_dataset, reload_if_released
+)
+from arbok_inspector.classes.profile_capture import get_armed_capture
+from arbok_inspector.classes.refresh_pacer import RefreshPacer
+from arbok_inspector.classes.export_job import (
+    ExportJob,
+    ExportCancelled,
+    register_export_job,
+    EXPORT_FORMATS,
+    DEFAULT_COMPRESSION_LEVEL
+)
 from arbok_inspector.widgets.json_plot_settings_dialog import (
     JsonPlotSettingsDialog)
 from arbok_inspector.widgets.build_xarray_grid import build_xarray_grid
+from arbok_inspector.widgets.debug_dialog import DebugDialog
 
 if TYPE_CHECKING:
+    import xarray as xr
     from arbok_inspector.classes.base_run import BaseRun
 
 DEFAULT_REFRESH_INTERVAL_S = 2
+RENDER_REPORT_TIMEOUT_S = 10
+### Resolves once all plots of the container are drawn and painted
+RENDER_REPORT_JS = """
+const start = performance.now();
+const frame = () => new Promise(resolve => requestAnimationFrame(resolve));
+const root = getHtmlElement({container_id});
+await frame();
+while (root && performance.now() - start < {timeout_ms}) {{
+    const plots = [...root.querySelectorAll('.js-plotly-plot')];
+    if (plots.length >= {n_plots} && plots.every(plot => plot._fullLayout)) break;
+    await frame();
+}}
+await frame();
+return performance.now() - start;
+"""
 
 def build_run_view_actions() -> None:
     """Build the run view action buttons and controls."""
     with ui.column().classes('items-start'):  # compact vertical layout
         # Row 1: Update + Debug
+        debug_dialog = DebugDialog()
         with ui.row().classes('gap-2'):
             ui.button(
                 'Update',
@@ -30,7 +59,7 @@ def build_run_view_actions() -> None:
                 on_click=reload_dataset_and_refresh_plots
                 ).props('dense')
             ui.button(
-                'Debug', icon='info', color='red', on_click=print_debug
+                'Debug', icon='info', color='red', on_click=debug_dialog.open
                 ).props('dense')
 
         # Row 2: Settings buttons
@@ -45,23 +74,22 @@ def build_run_view_actions() -> None:
 
         # Row 3: Timer controls
         with ui.row().classes('items-center gap-2'):
-            timer = ui.timer(
-                interval=DEFAULT_REFRESH_INTERVAL_S,
-                callback=reload_dataset_and_refresh_plots,
-                active=False
-                )
+            app.storage.tab["auto_plot"] = {
+                'active': False, 'interval': DEFAULT_REFRESH_INTERVAL_S}
+            app.storage.tab["run_subscription"] = None
             ui.label('Auto-plot')
-            ui.switch(
-                on_change=lambda e: setattr(timer, 'active', e.value)
-            )
+            ui.switch(on_change=lambda e: set_auto_plot(e.value))
             ui.number(
                 # label='(s)',
                 value=DEFAULT_REFRESH_INTERVAL_S,
                 min=0.1,
                 step=0.1,
                 format='%.1f',
-                on_change=lambda e: on_interval_change(e, timer),
+                on_change=on_interval_change,
             ).props('dense suffix="s"').classes('w-12')
+        app.storage.tab["auto_plot_pacer"] = RefreshPacer()
+        app.storage.tab["auto_plot_status"] = ui.label('').classes('text-xs')
+        app.storage.tab["auto_plot_status"].set_visibility(False)
         # --- Row 4: Plot layout control ---
         with ui.row().classes('gap-2'):
             ui.number(
@@ -72,6 +100,26 @@ def build_run_view_actions() -> None:
             ).props('dense outlined').classes('w-24 h-8 text-xs')
 
         # --- Row 5: Download buttons ---
+        app.storage.tab["export_settings"] = {
+            'format': 'netcdf',
+            'compression_level': DEFAULT_COMPRESSION_LEVEL
+        }
+        with ui.row().classes('gap-2 items-center'):
+            ui.select(
+                options = list(EXPORT_FORMATS),
+                value = 'netcdf',
+                label = 'format',
+            ).bind_value(app.storage.tab["export_settings"], 'format')\
+                .props('dense').classes('w-24 text-xs')
+            ui.number(
+                label = 'compression',
+                value = DEFAULT_COMPRESSION_LEVEL,
+                min = 0,
+                max = 9,
+                step = 1,
+                format = '%.0f',
+            ).bind_value(app.storage.tab["export_settings"], 'compression_level')\
+                .props('dense').classes('w-24 text-xs')
         with ui.row().classes('gap-2'):
             ui.button(
                 'Full',
@@ -86,20 +134,51 @@ def build_run_view_actions() -> None:
                 on_click=download_data_selection
                 ).props('dense')
 
-def on_interval_change(e, timer):
+def set_auto_plot(active: bool) -> None:
+    """
+    Enable or disable auto-plotting. The tab subscribes to the poller of the
+    run shared by all tabs showing it, which loads new data only once.
+
+    Args:
+        active (bool): Whether auto-plot is enabled
+    """
+    settings = app.storage.tab["auto_plot"]
+    settings['active'] = active
+    subscription = app.storage.tab["run_subscription"]
+    if subscription is not None:
+        subscription.cancel()
+        app.storage.tab["run_subscription"] = None
+    app.storage.tab["auto_plot_pacer"] = RefreshPacer()
+    status_label: ui.label = app.storage.tab["auto_plot_status"]
+    status_label.set_text(app.storage.tab["auto_plot_pacer"].status_text())
+    status_label.set_visibility(active)
+    if active:
+        run: BaseRun = app.storage.tab["run"]
+        app.storage.tab["run_subscription"] = subscription_hub.subscribe_to_run(
+            run.run_id,
+            callback = apply_new_dataset,
+            interval = settings['interval']
+        )
+
+def on_interval_change(e):
+    settings = app.storage.tab["auto_plot"]
     try:
         value = float(e.value)
         if value < 0.1:
             ui.notify('Interval must be at least 0.1 s', color='red')
-            e.sender.value = timer.interval  # revert
+            e.sender.value = settings['interval']  # revert
             return
-        timer.interval = value
+        settings['interval'] = value
+        subscription = app.storage.tab["run_subscription"]
+        if subscription is not None:
+            pacer: RefreshPacer = app.storage.tab["auto_plot_pacer"]
+            subscription.set_interval(pacer.effective_interval(value))
         ui.notify(f'Refresh interval set to {value:.2f} s', color='green')
-    except ValueError:
+    except (TypeError, ValueError):
         ui.notify('Please enter a valid number', color='red')
-        e.sender.value = timer.interval  # revert
+        e.sender.value = settings['interval']  # revert
 
-def set_plots_per_column(value: int):
+async def set_plots_per_column(value: int):
     """
     Set the number of plots to display per column.
 
@@ -107,63 +186,137 @@ def set_plots_per_column(value: int):
         value (int): The number of plots per column
     """
     run = app.storage.tab["run"]
+    await reload_if_released(run)
     ui.notify(f'Setting plots per column to {value}', position='top-right')
     run.plots_per_column = int(value)
     build_xarray_grid()
 
-def download_full_dataset():
-    """Download the full dataset as a NetCDF file."""
+async def download_full_dataset():
+    """Download the full dataset as a NetCDF or zipped zarr file."""
     run = app.storage.tab["run"]
-    netcfd_bytes = dataset_to_netcdf_bytes(run.full_data_set)
-    ui.download(netcfd_bytes.getvalue(), f"{run.run_id}.nc")
+    await reload_if_released(run)
+    await export_and_download(run.full_data_set, f"{run.run_id}")
 
-def download_data_selection():
-    """Download the current data selection as a NetCDF file."""
+async def download_data_selection():
+    """Download the current data selection as a NetCDF or zipped zarr file."""
     run = app.storage.tab["run"]
-    netcfd_bytes = dataset_to_netcdf_bytes(run.last_avg_subset)
-    ui.download(netcfd_bytes.getvalue(), f"{run.run_id}_selection.nc")
+    await reload_if_released(run)
+    await export_and_download(run.last_avg_subset, f"{run.run_id}_selection")
 
-def print_debug(run: BaseRun):
-    """Print debugging information about the current run."""
-    print("\nDebugging BaseRun:")
-    run = app.storage.tab["run"]
-    for key, val in run.dim_axis_option.items():
-        if isinstance(val, list):
-            val_str = str([d.name for d in val])
-        elif isinstance(val, Dim):
-            val_str = val.name
-        else:
-            val_str = str(val)
-        print(f"{key}: \t {val_str}")
+async def export_and_download(dataset: xr.Dataset, file_stem: str) -> None:
+    """
+    Write the dataset to a temporary file on a worker thread while showing
+    the progress and hand the file to the browser once it is written.
 
-refresh_lock = asyncio.Lock()
+    Args:
+        dataset (xr.Dataset): The xarray Dataset to export
+        file_stem (str): File name of the export without suffix
+    """
+    settings = app.storage.tab["export_settings"]
+    job = register_export_job(ExportJob(
+        dataset,
+        file_stem,
+        export_format = settings['format'],
+        compression_level = int(settings['compression_level'] or 0)
+    ))
+    with ui.dialog().props('persistent') as dialog:
+        with ui.card().classes('p-6 items-center'):
+            ui.label(f'Exporting {job.file_name}...')
+            progress = ui.linear_progress(value=0, show_value=False).classes('w-64')
+            ui.button('Cancel', color='red', on_click=job.cancel).props('dense')
+    dialog.open()
+    progress_timer = ui.timer(0.2, lambda: progress.set_value(job.progress))
+    try:
+        await nicegui_run.io_bound(job.write)
+    except ExportCancelled:
+        ui.notify('Export cancelled', type='warning', position='top-right')
+        return
+    except Exception as e:
+        ui.notify(f'Error exporting dataset: {e}', type='negative', close_button='OK')
+        print("Error in export_and_download:", e)
+        return
+    finally:
+        progress_timer.cancel()
+        dialog.close()
+    ui.download.from_url(job.url, job.file_name)
 
 async def reload_dataset_and_refresh_plots() -> None:
-    """Reload the dataset and refresh the plots."""
-    if refresh_lock.locked():
+    """
+    Reload the dataset and refresh the plots. Tabs reloading the same run
+    at the same time share a single load. If a profile of the reload is
+    armed, the load and the rebuild after it are profiled.
+    """
+    run: BaseRun = app.storage.tab["run"]
+    capture = get_armed_capture('reload')
+    try:
+        if capture is None:
+            await reload_run_dataset(run)
+        else:
+            ### Not shared, joining the load of another tab would profile nothing
+            run.full_data_set = await nicegui_run.io_bound(
+                capture.run, run.load_dataset)
+    except Exception as e:
+        ui.notify(f"Error reloading dataset: {e}", type="negative", close_button="OK")
+        print("Error in reload_dataset_and_refresh_plots:", e)
         return
-    async with refresh_lock:
-        run: BaseRun = app.storage.tab["run"]
-        run.full_data_set = await nicegui_run.io_bound(run._load_dataset)
-        ui.notify("Dataset reloaded", color='green')
+    ui.notify("Dataset reloaded", color='green')
+    if capture is None:
         build_xarray_grid(has_new_data=True)
+    else:
+        capture.run(build_xarray_grid, has_new_data=True)
+        capture.count_call()
+
+async def apply_new_dataset(dataset: xr.Dataset) -> None:
+    """
+    Show a dataset broadcast by the run poller. Used as the callback of the
+    auto-plot subscription. Returns once the browser reported the plots as
+    rendered, newer datasets arriving in the meantime are coalesced by the
+    subscription. The polling interval of the tab is then adapted to the
+    measured cycle of loading, plotting and rendering.
 
-def dataset_to_netcdf_bytes(ds: xr.Dataset) -> BytesIO:
+    Args:
+        dataset (xr.Dataset): The newly loaded dataset of the run
     """
-    Convert an xarray Dataset to an in-memory NetCDF file (BytesIO)
-    using zlib compression.
+    run: BaseRun = app.storage.tab["run"]
+    start = time.perf_counter()
+    run.full_data_set = dataset
+    build_xarray_grid(has_new_data=True)
+    server_s = time.perf_counter() - start
+    start = time.perf_counter()
+    render_s = await measure_client_render(app.storage.tab["placeholders"]['plots'])
+    round_trip_s = time.perf_counter() - start if render_s is not None else None
+
+    subscription = app.storage.tab["run_subscription"]
+    if subscription is None:
+        return
+    pacer: RefreshPacer = app.storage.tab["auto_plot_pacer"]
+    pacer.record(subscription.poller.last_fetch_s, server_s, round_trip_s, render_s)
+    subscription.set_interval(
+        pacer.effective_interval(app.storage.tab["auto_plot"]['interval']))
+    app.storage.tab["auto_plot_status"].set_text(
+        f'{pacer.status_text(subscription.skipped_payloads)}, '
+        f'every {subscription.interval:.1f} s')
+
+async def measure_client_render(container: ui.element) -> float | None:
+    """
+    Wait until the browser has drawn all plots of the container.
 
     Args:
-        ds (xr.Dataset): The xarray Dataset to convert.
+        container (ui.element): Container holding the plots
     Returns:
-        BytesIO: In-memory bytes buffer containing the NetCDF data.
+        render_s (float | None): Render duration reported by the browser
+            in seconds, None if it did not report in time
     """
-    buffer = BytesIO()
-    ds.to_netcdf(
-        buffer,
-        mode="w",
-        # format="NETCDF4",
-        # engine="netcdf4",
-    )
-    buffer.seek(0)
-    return buffer
+    n_plots = sum(isinstance(e, ui.plotly) for e in container.descendants())
+    code = RENDER_REPORT_JS.format(
+        container_id = container.id,
+        n_plots = n_plots,
+        timeout_ms = RENDER_REPORT_TIMEOUT_S * 1e3)
+    try:
+        render_ms = await ui.run_javascript(code, timeout=RENDER_REPORT_TIMEOUT_S + 1)
+    except TimeoutError:
+        print("Browser did not report rendering the plots")
+        return None
+    if render_ms is None:
+        return None
+    return float(render_ms) / 1e3
@@ -11,12 +11,19 @@ from nicegui import ui, app
 from arbok_inspector.helpers.string_formaters import (
     title_formater, axis_label_formater
 )
+from arbok_inspector.helpers.reductions import get_histogram_result, SEM_SUFFIX
+from arbok_inspector.helpers.dtype_narrowing import payload_values
+from arbok_inspector.analysis.peak_tracking import PeakTracker
+from arbok_inspector.classes.timing_metrics import timing_metrics
+from arbok_inspector.classes.profile_capture import profiled
 
 if TYPE_CHECKING:
     from arbok_inspector.classes.base_run import BaseRun
     from plotly.graph_objs import Figure
     from xarray import DataArray
 
+@timing_metrics.timed('plot_rebuild')
+@profiled('rebuild')
 def build_xarray_grid(has_new_data: bool = False) -> None:
     """
     Build a grid of xarray plots for the given run.
@@ -27,6 +34,10 @@ def build_xarray_grid(has_new_data: bool = False) -> None:
     print("\nBuilding xarray grid of plots")
     run = app.storage.tab["run"]
     container = app.storage.tab["placeholders"]['plots']
+    if run.is_released:
+        ### Keeps the button of the released placeholder
+        ui.notify('Data released while idle, reload it to show the plots', type='warning')
+        return
     container.clear()
     if run.dim_axis_option['x-axis'] is None:
         ui.notify(
@@ -38,7 +49,10 @@ def build_xarray_grid(has_new_data: bool = False) -> None:
     results_2d = {}
     results_unshowable = {}
     for result_name in run.plot_selection:
-        result = ds[result_name]
+        if result_name not in ds:
+            ui.notify(f"{result_name} can not be shown with this selection", type="warning")
+            continue
+        result = get_histogram_result(ds, result_name)
         if len(result.dims) == 1:
             results_1d[result_name] = result
         elif len(result.dims) == 2:
@@ -46,9 +60,11 @@ def build_xarray_grid(has_new_data: bool = False) -> None:
         else:
             results_unshowable[result_name] = result
 
-    figures: list = create_1d_plot(run, results_1d)
-    figures += create_2d_plots(run, results_2d)
-    create_figures_ui_grid(figures, container, run)
+    with timing_metrics.span('payload_encoding'):
+        figures: list = create_1d_plot(run, results_1d)
+        figures += create_2d_plots(run, results_2d)
+    with timing_metrics.span('ui_push'):
+        create_figures_ui_grid(figures, container, run)
 
 def create_1d_plot(run: BaseRun, results_dict: dict[str, DataArray]) -> Figure:
     """
@@ -68,13 +84,22 @@ def create_1d_plot(run: BaseRun, results_dict: dict[str, DataArray]) -> Figure:
     plot_dict = copy.deepcopy(app.storage.tab["plot_dict_1D"])
     for result_name, result in results_dict.items():
         if x_dim in result.coords:
-            traces.append({
+            trace = {
                 "type": "scatter",
                 "mode": "lines+markers",
                 "name": result_name.replace("__", "."),
                 "x": result.coords[x_dim].values.tolist(),
-                "y": result.values.tolist(),
-            })
+                "y": payload_values(result.values, run.result_dtype),
+            }
+            if f"{result_name}{SEM_SUFFIX}" in result.coords:
+                trace["error_y"] = {
+                    "type": "data",
+                    "array": payload_values(
+                        result.coords[f"{result_name}{SEM_SUFFIX}"].values,
+                        run.result_dtype),
+                    "visible": True,
+                }
+            traces.append(trace)
             plot_dict["layout"]["xaxis"]["title"]["text"] = axis_label_formater(
                 result, x_dim)
  
@@ -128,13 +153,51 @@ def create_2d_figure(
     plot_dict["layout"]["xaxis"]["automargin"] = True
     if result[x_dim].dims[0] != result.dims[1]:
         result = result.transpose()
-    plot_dict["data"][0]["z"] = result.values.tolist()
+    plot_dict["data"][0]["z"] = payload_values(result.values, run.result_dtype)
     plot_dict["data"][0]["x"] = result.coords[x_dim].values.tolist()
     plot_dict["data"][0]["y"] = result.coords[y_dim].values.tolist()
+    if result_name in run.peak_tracking:
+        plot_dict["data"] += create_peak_track_traces(
+            result, run.peak_tracking[result_name], x_dim)
     title = result_name.replace("__", ".")
     plot_dict = add_title_to_plot_dict(run, plot_dict, title)
     return go.Figure(plot_dict)
 
+def create_peak_track_traces(
+        result: DataArray, settings: dict[str, str], x_dim: str) -> list[dict]:
+    """
+    Track the peak or dip of a 2D result along one of its axes and return the
+    tracked curve as trace to overlay on its heatmap.
+
+    Args:
+        result (DataArray): 2D result shown on the heatmap
+        settings (dict): 'dim' to track along and 'kind' ('peak' or 'dip')
+        x_dim (str): Name of the dim on the x-axis
+    Returns:
+        list[dict]: Scatter trace of the tracked curve, empty if the tracked
+            dim is not shown
+    """
+    if settings['dim'] not in result.dims:
+        ui.notify(
+            f"Peak tracking along {settings['dim']} needs it on an axis",
+            type = "warning")
+        return []
+    track = PeakTracker(
+        result, settings['dim'], kind=settings['kind'], avg_axes=None).track()
+    other_dim = track['position'].dims[0]
+    positions = track['position'].values.tolist()
+    others = track[other_dim].values.tolist()
+    return [{
+        "type": "scatter",
+        "mode": "lines+markers",
+        "name": f"{settings['kind']} along {settings['dim'].replace('__', '.')}",
+        "x": positions if settings['dim'] == x_dim else others,
+        "y": others if settings['dim'] == x_dim else positions,
+        "line": {"color": "cyan", "width": 1},
+        "marker": {"size": 4},
+        "showlegend": False,
+    }]
+
 def create_figures_ui_grid(figures: list[Figure], container, run: BaseRun) -> None:
     """
     Generates a grid of plotly figures in the given ui container
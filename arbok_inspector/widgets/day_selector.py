@@ -1,10 +1,13 @@
 """Module containing day selector grid generation and update functions"""
 from datetime import datetime
 from nicegui import ui, app
-from sqlalchemy import text
 
 from arbok_inspector.state import inspector
-from arbok_inspector.widgets.run_selector import update_run_selector
+from arbok_inspector.classes.subscription_hub import subscription_hub
+from arbok_inspector.classes.timing_metrics import timing_metrics
+from arbok_inspector.widgets.run_selector import (
+    update_run_selector, set_run_grid_rows
+)
 
 DAY_GRID_COLUMN_DEFS = [
     {'headerName': 'Day', 'field': 'day'},
@@ -21,6 +24,34 @@ async def trigger_update_run_selector(day):
             return
     await update_run_selector(day)
     app.storage.tab['last_selected_day'] = day
+    update_runs_subscription()
+
+def update_runs_subscription() -> None:
+    """
+    Subscribe the tab to the shared poller of the selected day if
+    auto-refresh is enabled, or cancel its subscription otherwise. A change of
+    the selected day moves the subscription to the poller of the new day.
+    """
+    settings: dict | None = app.storage.tab.get('auto_refresh')
+    if settings is None:
+        return
+    subscription = app.storage.tab.get('runs_subscription')
+    day = app.storage.tab.get('last_selected_day')
+    offset_hours = app.storage.general["timezone"]
+    if subscription is not None:
+        is_current = subscription.key[2:] == (day, offset_hours)
+        if settings['active'] and is_current:
+            subscription.set_interval(settings['interval'])
+            return
+        subscription.cancel()
+        app.storage.tab['runs_subscription'] = None
+    if settings['active'] and day is not None:
+        app.storage.tab['runs_subscription'] = subscription_hub.subscribe_to_day(
+            day,
+            offset_hours,
+            callback = set_run_grid_rows,
+            interval = settings['interval']
+        )
 
 def build_day_selector() -> ui.aggrid:
     """Build the day selector grid."""
@@ -47,12 +78,13 @@ def update_day_selector(day_grid: ui.aggrid | None = None) -> None:
             return
         day_grid: ui.aggrid = app.storage.tab['day_grid']
     offset_hours = app.storage.general["timezone"]
-    if inspector.database_type == 'qcodes':
-        rows = get_qcodes_days(offset_hours)
-    elif inspector.database_type == 'native_arbok':
-        rows = get_native_arbok_days(inspector.database_engine,offset_hours)
-    else:
-        raise ValueError(f"Invalid database type: {inspector.database_type}")
+    with timing_metrics.span('metadata_query'):
+        if inspector.database_type == 'qcodes':
+            rows = get_qcodes_days(offset_hours)
+        elif inspector.database_type == 'native_arbok':
+            rows = get_native_arbok_days(inspector.database_engine,offset_hours)
+        else:
+            raise ValueError(f"Invalid database type: {inspector.database_type}")
 
     day_grid.clear()
     row_data = []
@@ -97,6 +129,7 @@ def get_qcodes_days(offset_hours: float) -> list[tuple[str, datetime]]:
 
 def get_native_arbok_days(engine, offset_hours: float) -> list[tuple[str, datetime]]:
     """Retrieve available days from a native Arbok database, adjusted for timezone offset."""
+    from sqlalchemy import text
     query = text("""
         SELECT 
             day,
@@ -0,0 +1,166 @@
+"""
+Dialog showing debug information of the run view and capturing profiles.
+"""
+from __future__ import annotations
+from typing import TYPE_CHECKING
+
+from nicegui import app, ui
+
+from arbok_inspector.classes.dim import Dim
+from arbok_inspector.classes.profile_capture import (
+    ProfileCapture, PROFILE_TARGETS, PROFILE_SORT_KEYS, TAB_STORAGE_KEY
+)
+
+if TYPE_CHECKING:
+    from arbok_inspector.classes.base_run import BaseRun
+
+DEFAULT_PROFILED_CALLS = 5
+
+class DebugDialog:
+    """
+    Dialog showing the dim options of the run and recording a profile of the
+    next plot rebuilds or the next reload of the tab.
+    """
+    def __init__(self):
+        app.storage.tab[TAB_STORAGE_KEY] = None
+        self.settings = {
+            'target': 'rebuild',
+            'n_calls': DEFAULT_PROFILED_CALLS,
+            'sort_key': 'cumulative',
+        }
+        self.dim_label = None
+        self.status_label = None
+        self.summary_code = None
+        self.download_button = None
+        self.dialog = self.build_debug_dialog()
+
+    def build_debug_dialog(self) -> ui.dialog:
+        """
+        Build the dialog with the dim options and the profiling controls.
+        """
+        with ui.dialog() as dialog, ui.card().classes('w-full max-w-5xl'):
+            ui.label('Debug').classes('text-lg font-semibold')
+            self.dim_label = ui.label().classes('text-xs whitespace-pre font-mono')
+            ui.separator()
+            ui.label('Profiling').classes('text-lg font-semibold')
+            with ui.row().classes('items-center gap-2'):
+                ui.select(
+                    options = PROFILE_TARGETS,
+                    label = 'profile next',
+                ).bind_value(self.settings, 'target')\
+                    .props('dense').classes('w-24 text-xs')
+                ui.number(
+                    label = '# rebuilds',
+                    min = 1,
+                    format = '%.0f',
+                ).bind_value(self.settings, 'n_calls')\
+                    .bind_visibility_from(self.settings, 'target', value='rebuild')\
+                    .props('dense').classes('w-20 text-xs')
+                ui.button(
+                    'Start', icon='play_arrow', color='green',
+                    on_click=self.start_capture
+                    ).props('dense')
+                ui.button(
+                    'Stop', icon='stop', color='red',
+                    on_click=self.stop_capture
+                    ).props('dense')
+                ui.select(
+                    options = PROFILE_SORT_KEYS,
+                    label = 'sort by',
+                    on_change = lambda: self.show_summary(),
+                ).bind_value(self.settings, 'sort_key')\
+                    .props('dense').classes('w-24 text-xs')
+                self.download_button = ui.button(
+                    'Download', icon='file_download', color='blue',
+                    on_click=self.download_profile
+                    ).props('dense')
+                self.download_button.disable()
+            self.status_label = ui.label('No profile recorded').classes('text-xs')
+            self.summary_code = ui.code('', language='text')\
+                .classes('w-full text-xs overflow-x-auto whitespace-pre')
+            self.summary_code.set_visibility(False)
+            with ui.row().classes('w-full justify-end'):
+                ui.button('Close', color='red', on_click=dialog.close)
+        return dialog
+
+    def open(self) -> None:
+        """Print and show the dim options and open the dialog."""
+        self.dim_label.set_text(print_debug())
+        self.dialog.open()
+
+    def start_capture(self) -> None:
+        """Arm a new capture for the selected target, replacing the last one."""
+        target = self.settings['target']
+        n_calls = int(self.settings['n_calls'] or 1) if target == 'rebuild' else 1
+        app.storage.tab[TAB_STORAGE_KEY] = ProfileCapture(
+            target, n_calls, on_finished=self.on_capture_finished)
+        self.download_button.disable()
+        self.summary_code.set_visibility(False)
+        if target == 'rebuild':
+            text = f'Profiling the next {n_calls} plot rebuild(s)'
+        else:
+            text = 'Profiling the next reload, press Update to reload'
+        self.status_label.set_text(text)
+        ui.notify(text, position='top-right')
+
+    def stop_capture(self) -> None:
+        """Stop the running capture and show what was recorded so far."""
+        capture: ProfileCapture | None = app.storage.tab[TAB_STORAGE_KEY]
+        if capture is None or not capture.is_armed:
+            return
+        capture.n_calls = capture.recorded_calls
+        self.on_capture_finished(capture)
+
+    def on_capture_finished(self, capture: ProfileCapture) -> None:
+        """Show the summary of a finished capture and offer its download."""
+        if capture.error is not None:
+            self.status_label.set_text(capture.error)
+            ui.notify(capture.error, type='negative', close_button='OK')
+            return
+        self.status_label.set_text(
+            f'Recorded {capture.recorded_calls} {capture.target}(s) in '
+            f'{capture.profiled_seconds:.2f} s')
+        ui.notify('Profile recorded, see the debug dialog', type='positive')
+        self.show_summary()
+
+    def show_summary(self) -> None:
+        """Show the top functions of the last capture."""
+        capture: ProfileCapture | None = app.storage.tab[TAB_STORAGE_KEY]
+        if capture is None or capture.is_armed or capture.recorded_calls == 0:
+            return
+        self.summary_code.set_content(
+            capture.summary(sort_key=self.settings['sort_key']))
+        self.summary_code.set_visibility(True)
+        self.download_button.enable()
+
+    def download_profile(self) -> None:
+        """Download the last capture, readable by `pstats` or `snakeviz`."""
+        capture: ProfileCapture | None = app.storage.tab[TAB_STORAGE_KEY]
+        if capture is None or capture.recorded_calls == 0:
+            ui.notify('No profile recorded', type='warning')
+            return
+        run: BaseRun = app.storage.tab["run"]
+        ui.download(
+            capture.to_bytes(), f'run_{run.run_id}_{capture.target}.prof')
+
+def print_debug() -> str:
+    """
+    Print debugging information about the current run.
+
+    Returns:
+        text (str): The printed dim options
+    """
+    print("\nDebugging BaseRun:")
+    run: BaseRun = app.storage.tab["run"]
+    lines = []
+    for key, val in run.dim_axis_option.items():
+        if isinstance(val, list):
+            val_str = str([d.name for d in val])
+        elif isinstance(val, Dim):
+            val_str = val.name
+        else:
+            val_str = str(val)
+        lines.append(f"{key}: \t {val_str}")
+    text = '\n'.join(lines)
+    print(text)
+    return text
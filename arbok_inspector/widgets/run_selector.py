@@ -4,9 +4,10 @@ from datetime import datetime, timedelta
 
 from nicegui import ui, app
 from nicegui import run as nicegui_run
-from sqlalchemy import text
 
 from arbok_inspector.state import inspector
+from arbok_inspector.classes.timing_metrics import timing_metrics
+from arbok_inspector.classes.run_prefetcher import run_prefetcher
 
 small_col_width = 50
 med_col_width = 60
@@ -29,6 +30,12 @@ NATIVE_RUN_GRID_COLUMN_DEFS = [
     {'headerName': 'last result', 'field': 'completed_time', "width": med_col_width},
 ]
 AGGRID_STYLE = 'height: 95%; min-height: 0;'
+PREFETCH_THROTTLE_S = 0.3
+### Emits the run ID of the focused row, on clicks as well as keyboard navigation
+RUN_FOCUSED_JS = """(params) => {
+    const row = params.api.getDisplayedRowAtIndex(params.rowIndex);
+    if (row && row.data) emitEvent('run_grid_focused', row.data.run_id);
+}"""
 
 async def build_run_selector(target_day: str | None = None) -> ui.aggrid:
     """Build the run selector grid for the specified day."""
@@ -40,6 +47,9 @@ async def build_run_selector(target_day: str | None = None) -> ui.aggrid:
             'columnDefs': run_grid_columns,
             'rowData': run_grid_rows,
             'theme': 'balham',
+            'rowSelection': {'mode': 'multiRow', 'enableClickSelection': False},
+            ':getRowId': '(params) => String(params.data.run_id)',
+            ':onCellFocused': RUN_FOCUSED_JS,
         }, 
     ).style(
         AGGRID_STYLE
@@ -47,6 +57,11 @@ async def build_run_selector(target_day: str | None = None) -> ui.aggrid:
         'cellDoubleClicked',
         lambda event: open_run_page(event.args['data']['run_id'])
     )
+    ui.on(
+        'run_grid_focused',
+        lambda event: run_prefetcher.prefetch(int(event.args)),
+        throttle = PREFETCH_THROTTLE_S
+    )
     ui.notify(
         'Run selector updated: \n'
         f'found {len(run_grid_rows)} run(s)',
@@ -61,8 +76,20 @@ async def update_run_selector(target_day: str | None = None) -> None:
     """Update the run selector grid based on the last selected day."""
     if target_day is None:
         target_day: str = app.storage.tab.get('last_selected_day')
-    run_grid: ui.aggrid = app.storage.tab.get('run_grid')
     run_grid_rows, _ = await get_run_grid_data(target_day)
+    set_run_grid_rows(run_grid_rows)
+
+def set_run_grid_rows(run_grid_rows: list[dict]) -> None:
+    """
+    Replace the rows of the run selector grid of the current tab.
+
+    Args:
+        run_grid_rows (list[dict]): Formatted rows as returned by
+            `format_run_grid_rows`
+    """
+    run_grid: ui.aggrid = app.storage.tab.get('run_grid')
+    if run_grid is None:
+        return
     ui.run_javascript(f"""
         const grid = getElement('{run_grid.id}');
         if (grid && grid.api) {{
@@ -106,6 +133,24 @@ async def get_run_grid_data(target_day: str) -> tuple[list[dict], list[dict]]:
     finally:
         if loading_dialog.visible:
             loading_dialog.close()
+    run_grid_rows = format_run_grid_rows(rows, run_grid_columns, offset_hours)
+    return run_grid_rows, run_grid_columns
+
+def format_run_grid_rows(
+        rows: list[dict],
+        run_grid_columns: list[dict],
+        offset_hours: float
+        ) -> list[dict]:
+    """
+    Format database rows for the run selector grid, newest run first.
+
+    Args:
+        rows (list[dict]): Runs as returned by `get_runs_for_day`
+        run_grid_columns (list[dict]): Column definitions of the grid
+        offset_hours (float): The timezone offset in hours
+    Returns:
+        list[dict]: Rows with the grid columns and formatted timestamps
+    """
     run_grid_rows = []
     columns = [x['field'] for x in run_grid_columns]
     for run in rows:
@@ -122,8 +167,9 @@ async def get_run_grid_data(target_day: str) -> tuple[list[dict], list[dict]]:
                         value = 'N/A'
                 run_dict[key] = value
         run_grid_rows.insert(0, run_dict)
-    return run_grid_rows, run_grid_columns
+    return run_grid_rows
 
+@timing_metrics.timed('metadata_query')
 def get_runs_for_day(
         target_day, offset_hours) -> tuple[list[dict], list[dict]]:
     if inspector.database_type == 'qcodes':
@@ -204,6 +250,7 @@ def get_native_arbok_runs_for_day(
     Returns:
         list[dict]: List of runs as dictionaries
     """
+    from sqlalchemy import text
     query = text("""
         SELECT r.*, e.name AS experiment_name
         FROM runs r
@@ -0,0 +1,90 @@
+"""
+Benchmark of the batched fitting engine against a per-pixel
+`scipy.optimize.curve_fit` loop on synthetic Ramsey/Rabi/T1 data.
+
+Usage:
+    python benchmarks/bench_batch_fit.py --model ramsey --pixels 2000
+"""
+import time
+import argparse
+
+import numpy as np
+import xarray as xr
+
+from arbok_inspector.analysis.batch_fit import BatchFit, FIT_MODELS
+
+TRUE_PARAMS = {
+    'rabi': {'amplitude': 0.4, 'frequency': 3e6, 'phase': 0.3, 'offset': 0.5},
+    'ramsey': {
+        'amplitude': 0.4, 'frequency': 3e6, 'phase': 0.3, 't2': 1e-6, 'offset': 0.5},
+    't1': {'amplitude': 0.7, 't1': 4e-7, 'offset': 0.1},
+}
+
+def make_data(model: str, n_pixels: int, n_points: int, noise: float, seed: int = 0):
+    """Create traces with the frequency/time constant swept across pixels"""
+    rng = np.random.default_rng(seed)
+    x = np.linspace(0, 2e-6, n_points)
+    sweep = np.linspace(0.8, 1.2, n_pixels)
+    params = np.array([list(TRUE_PARAMS[model].values())] * n_pixels)
+    params[:, 1] *= sweep
+    y = FIT_MODELS[model].function(x, params)
+    y += noise * rng.standard_normal(y.shape)
+    data = xr.DataArray(
+        y, dims=('pixel', 'x'), coords={'pixel': np.arange(n_pixels), 'x': x})
+    return data, params
+
+def bench_batch(data: xr.DataArray, model: str) -> tuple[float, np.ndarray]:
+    start = time.perf_counter()
+    result = BatchFit(data, model, 'x').fit()
+    elapsed = time.perf_counter() - start
+    params = np.stack(
+        [result[name].values for name in FIT_MODELS[model].param_names], axis=1)
+    return elapsed, params
+
+def bench_curve_fit(data: xr.DataArray, model: str) -> tuple[float, np.ndarray]:
+    from scipy.optimize import curve_fit
+
+    fit_model = FIT_MODELS[model]
+    x = data['x'].values
+    y = data.values
+    ### Same initial guesses as the batched fit for a fair comparison
+    p0 = fit_model.guess(x, y)
+
+    def function(x, *p):
+        return fit_model.function(x, np.asarray(p)[None, :])[0]
+
+    params = np.full_like(p0, np.nan)
+    start = time.perf_counter()
+    for i in range(y.shape[0]):
+        try:
+            params[i], _ = curve_fit(function, x, y[i], p0=p0[i], maxfev=5000)
+        except RuntimeError:
+            pass
+    return time.perf_counter() - start, params
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--model', choices=list(FIT_MODELS), default='ramsey')
+    parser.add_argument('--pixels', type=int, default=2000)
+    parser.add_argument('--points', type=int, default=101)
+    parser.add_argument('--noise', type=float, default=0.03)
+    args = parser.parse_args()
+
+    data, true_params = make_data(args.model, args.pixels, args.points, args.noise)
+    print(f"model: {args.model}, pixels: {args.pixels}, points: {args.points}")
+    batch_time, batch_params = bench_batch(data, args.model)
+    batch_error = np.nanmedian(np.abs(batch_params[:, 1] / true_params[:, 1] - 1))
+    print(f"batched LM:      {batch_time:8.3f} s   median rel. error "
+          f"({FIT_MODELS[args.model].param_names[1]}): {batch_error:.2e}")
+    try:
+        loop_time, loop_params = bench_curve_fit(data, args.model)
+    except ImportError:
+        print("scipy is not installed, skipping the curve_fit baseline")
+        return
+    loop_error = np.nanmedian(np.abs(loop_params[:, 1] / true_params[:, 1] - 1))
+    print(f"curve_fit loop:  {loop_time:8.3f} s   median rel. error "
+          f"({FIT_MODELS[args.model].param_names[1]}): {loop_error:.2e}")
+    print(f"speed-up:        {loop_time / batch_time:8.1f} x")
+
+if __name__ == '__main__':
+    main()
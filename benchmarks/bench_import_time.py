@@ -0,0 +1,142 @@
+"""
+Benchmark of the cold start import time of the inspector.
+
+The entry module is imported in a fresh interpreter with `-X importtime`
+several times. The median total import time and the slowest imported
+packages are reported. The benchmark also guards the lazy imports: backend
+libraries (qcodes, SQLAlchemy, fsspec) are only imported once their database
+type is chosen and tools like tkinter only on first use, so none of them may
+be loaded by the import of the entry module. The script exits with status 1
+if one of them is, or if the median exceeds the given budget.
+
+Usage:
+    python benchmarks/bench_import_time.py --repeat 5 --budget 2.0 \
+        --output import.json --compare import_previous.json
+"""
+from __future__ import annotations
+
+import re
+import sys
+import json
+import argparse
+import platform
+import statistics
+import subprocess
+from pathlib import Path
+from datetime import datetime
+
+from bench_pipeline import package_versions
+
+ENTRY_MODULE = 'arbok_inspector.main'
+DEFERRED_PACKAGES = [
+    'qcodes', 'sqlalchemy', 'fsspec', 's3fs', 'psycopg2', 'tkinter', 'matplotlib',
+]
+IMPORT_TIME_LINE = re.compile(r'import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)')
+
+def measure_import(module: str) -> tuple[float, dict[str, float], list[str]]:
+    """
+    Import the module in a fresh interpreter.
+
+    Args:
+        module (str): Module to import
+    Returns:
+        total_s (float): Cumulative import time of the module in seconds
+        packages (dict[str, float]): Cumulative import time of every top
+            level package in seconds, including the packages it imports
+        loaded (list[str]): Names of all modules loaded afterwards
+    """
+    code = f'import sys, json, {module}; print(json.dumps(sorted(sys.modules)))'
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        capture_output = True, text = True, check = True)
+    total_s = 0.
+    packages = {}
+    ### Parents are printed after their imports, hence the reversed order
+    parents: list[tuple[int, str]] = []
+    for line in reversed(result.stderr.splitlines()):
+        match = IMPORT_TIME_LINE.match(line)
+        if match is None:
+            continue
+        cumulative_s = int(match.group(2)) / 1e6
+        depth, name = len(match.group(3)), match.group(4)
+        package = name.split('.')[0]
+        while parents and parents[-1][0] >= depth:
+            parents.pop()
+        ### Count a package where it is entered from another package
+        if not parents or parents[-1][1] != package:
+            packages[package] = packages.get(package, 0.) + cumulative_s
+        parents.append((depth, package))
+        if name == module:
+            total_s = cumulative_s
+    loaded = json.loads(result.stdout.splitlines()[-1])
+    return total_s, packages, loaded
+
+def deferred_packages_loaded(loaded: list[str]) -> list[str]:
+    """Deferred packages among the loaded modules"""
+    top_level = {name.split('.')[0] for name in loaded}
+    return [package for package in DEFERRED_PACKAGES if package in top_level]
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--module', default=ENTRY_MODULE)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--top', type=int, default=10)
+    parser.add_argument(
+        '--budget', type=float, default=None,
+        help='Fail if the median import time in seconds exceeds this')
+    parser.add_argument('--output', type=Path, default=None)
+    parser.add_argument('--compare', type=Path, default=None)
+    args = parser.parse_args()
+
+    ### The first import warms the file system cache and compiles the bytecode
+    measure_import(args.module)
+    totals = []
+    package_times: dict[str, list[float]] = {}
+    for _ in range(args.repeat):
+        total_s, packages, loaded = measure_import(args.module)
+        totals.append(total_s)
+        for package, seconds in packages.items():
+            package_times.setdefault(package, []).append(seconds)
+    median_s = statistics.median(totals)
+    packages = {
+        package: statistics.median(times)
+        for package, times in package_times.items()}
+    slowest = sorted(packages.items(), key=lambda item: item[1], reverse=True)
+    violations = deferred_packages_loaded(loaded)
+
+    line = f"import {args.module}: median {median_s * 1e3:.0f} ms"
+    line += f" (min {min(totals) * 1e3:.0f} ms, max {max(totals) * 1e3:.0f} ms)"
+    if args.compare is not None:
+        previous = json.loads(args.compare.read_text())
+        line += f"   {median_s / previous['median_s']:.2f} x previous"
+    print(line)
+    for package, seconds in slowest[:args.top]:
+        print(f"  {package:30s} {seconds * 1e3:8.0f} ms")
+
+    if args.output is not None:
+        report = {
+            'benchmark': 'import_time',
+            'date': datetime.now().isoformat(timespec='seconds'),
+            'platform': platform.platform(),
+            'versions': package_versions(),
+            'parameters': {'module': args.module, 'repeat': args.repeat},
+            'median_s': median_s,
+            'totals_s': totals,
+            'packages_s': dict(slowest),
+            'deferred_packages_loaded': violations,
+        }
+        args.output.write_text(json.dumps(report, indent=2))
+        print(f"\nwrote {args.output}")
+
+    failed = False
+    if violations:
+        print(f"Deferred packages imported at startup: {', '.join(violations)}")
+        failed = True
+    if args.budget is not None and median_s > args.budget:
+        print(f"Median import time exceeds the budget of {args.budget * 1e3:.0f} ms")
+        failed = True
+    if failed:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
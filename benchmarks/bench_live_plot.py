@@ -0,0 +1,224 @@
+"""
+End-to-end benchmark of the latency from writing results to plotting them.
+
+A writer process (see `live_writer.py`) appends one iteration per tick to a
+QCoDeS database while a simulated NiceGUI user shows the run at
+`/run/{run_id}` with auto-plot enabled. Every time the run view applied new
+data, the number of points it shows is matched with the write log of the
+writer. The latency is the time from the write of the newest shown point
+until the plots of the run view were rebuilt, i.e. without the transfer to a
+real browser. The CPU time of the server process is taken per plot update.
+
+Usage:
+    python benchmarks/bench_live_plot.py --rate 2 --shape 50 20 \
+        --iterations 100 --interval 0.5 --output live.json
+"""
+from __future__ import annotations
+
+import os
+import re
+import sys
+import json
+import time
+import queue
+import asyncio
+import argparse
+import platform
+import tempfile
+import statistics
+import importlib
+import multiprocessing
+from pathlib import Path
+from datetime import datetime
+from importlib.util import find_spec
+
+import numpy as np
+
+from bench_pipeline import package_versions
+from live_writer import write_live_run
+from synthetic_database import result_names
+
+def drain_log(log_queue, writes: list[tuple[int, float]]) -> bool:
+    """Move the entries of the writer log into writes, True once it is done"""
+    done = False
+    while True:
+        try:
+            entry = log_queue.get_nowait()
+        except queue.Empty:
+            return done
+        if entry[0] == 'write':
+            writes.append(entry[1:])
+        elif entry[0] == 'done':
+            done = True
+
+def write_time(writes: list[tuple[int, float]], n_points: int) -> float | None:
+    """Time of the first write after which n_points were in the database"""
+    for written, timestamp in writes:
+        if written >= n_points:
+            return timestamp
+    return None
+
+async def measure_live_plot(
+        db_path: Path,
+        shape: tuple[int, ...],
+        n_iterations: int,
+        rate: float,
+        interval: float,
+        n_results: int,
+        timeout: float
+        ) -> list[dict]:
+    """
+    Run the writer process and a simulated user with auto-plot enabled.
+
+    Returns:
+        ticks (list[dict]): One entry per plot update with the number of shown
+            points, the latency and the server CPU and wall time since the
+            previous update
+    """
+    from nicegui.testing.user_simulation import user_simulation
+
+    context = multiprocessing.get_context('spawn')
+    log_queue = context.Queue()
+    start_event = context.Event()
+    writer = context.Process(
+        target = write_live_run,
+        args = (db_path, shape, n_iterations, rate, n_results, log_queue, start_event),
+        daemon = True)
+    writer.start()
+    kind, run_id = log_queue.get(timeout=60)
+    assert kind == 'run_id'
+    writes: list[tuple[int, float]] = []
+    while not writes:
+        drain_log(log_queue, writes)
+        await asyncio.sleep(0.01)
+
+    sys.argv = ['arbok-inspector']
+    ### The user simulation is made for pytest, outside of it NiceGUI tries to
+    ### reset the storage of a real client when starting the simulation
+    os.environ.setdefault('PYTEST_CURRENT_TEST', 'bench_live_plot')
+    ticks = []
+    main_file = find_spec('arbok_inspector.main').origin
+    async with user_simulation(main_file=main_file) as user:
+        from nicegui import app
+        from arbok_inspector.state import inspector
+        ### The widgets package exports a function with the name of the module
+        actions = importlib.import_module(
+            'arbok_inspector.widgets.build_run_view_actions')
+
+        inspector.qcodes_database_path = db_path
+        inspector.database_type = 'qcodes'
+        user.javascript_rules[re.compile(r'(?s).*getTimezoneOffset')] = lambda _: 0
+        user.javascript_rules[re.compile(r'(?s)(?!.*getTimezoneOffset).*')] = lambda _: None
+        app.storage.general['result_keywords'] = ''
+        app.storage.general['avg_axis'] = 'iteration'
+        await user.open(f'/run/{run_id}')
+        await user.should_see('Actions:', retries=200)
+
+        counted_result = result_names(n_results)[-1]
+        apply_new_dataset = actions.apply_new_dataset
+        last = {'wall': time.perf_counter(), 'cpu': time.process_time()}
+
+        async def apply_and_measure(dataset) -> None:
+            await apply_new_dataset(dataset)
+            now = time.time()
+            wall, cpu = time.perf_counter(), time.process_time()
+            n_points = int(np.isfinite(dataset[counted_result].values).sum())
+            drain_log(log_queue, writes)
+            written = write_time(writes, n_points)
+            ticks.append({
+                'points': n_points,
+                'latency_s': None if written is None else now - written,
+                'cpu_s': cpu - last['cpu'],
+                'wall_s': wall - last['wall'],
+            })
+            last.update(wall=wall, cpu=cpu)
+
+        ### Looked up by set_auto_plot when subscribing
+        actions.apply_new_dataset = apply_and_measure
+        with user:
+            app.storage.tab['auto_plot']['interval'] = interval
+            actions.set_auto_plot(True)
+        start_event.set()
+        total_points = None
+        deadline = None
+        while True:
+            await asyncio.sleep(0.05)
+            if drain_log(log_queue, writes) and total_points is None:
+                total_points = writes[-1][0]
+                deadline = time.perf_counter() + timeout
+            if total_points is not None:
+                if ticks and ticks[-1]['points'] >= total_points:
+                    break
+                if time.perf_counter() > deadline:
+                    print("Timed out waiting for the last write to be plotted")
+                    break
+        with user:
+            actions.set_auto_plot(False)
+    writer.join(timeout=10)
+    return ticks
+
+def summarize(ticks: list[dict], n_groups: int = 4) -> dict:
+    """Latency and CPU statistics overall and for each part of the run"""
+    def stats(part: list[dict]) -> dict:
+        latencies = [t['latency_s'] for t in part if t['latency_s'] is not None]
+        if not latencies:
+            return {'updates': len(part)}
+        return {
+            'updates': len(part),
+            'points': [part[0]['points'], part[-1]['points']],
+            'latency_median_s': statistics.median(latencies),
+            'latency_p95_s': float(np.percentile(latencies, 95)),
+            'latency_max_s': max(latencies),
+            'cpu_per_update_s': statistics.fmean(t['cpu_s'] for t in part),
+        }
+    groups = [list(part) for part in np.array_split(np.array(ticks, dtype=object), n_groups)]
+    return {
+        'overall': stats(ticks),
+        'by_run_progress': [stats(part) for part in groups if len(part)],
+    }
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--shape', type=int, nargs='+', default=[50, 20])
+    parser.add_argument('--iterations', type=int, default=100)
+    parser.add_argument('--rate', type=float, default=2., help='Iterations per second')
+    parser.add_argument('--interval', type=float, default=0.5, help='Auto-plot interval')
+    parser.add_argument('--results', type=int, default=2)
+    parser.add_argument('--timeout', type=float, default=30.)
+    parser.add_argument('--output', type=Path, default=None)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        ticks = asyncio.run(measure_live_plot(
+            Path(tmp_dir) / 'live.db', tuple(args.shape), args.iterations,
+            args.rate, args.interval, args.results, args.timeout))
+    summary = summarize(ticks)
+    print()
+    for name, part in [('overall', summary['overall'])] + [
+            (f'part {i + 1}', part) for i, part in enumerate(summary['by_run_progress'])]:
+        if 'latency_median_s' not in part:
+            continue
+        print(
+            f"{name:8s} points {part['points'][0]:>8d} - {part['points'][1]:<8d} "
+            f"latency median {part['latency_median_s'] * 1e3:8.1f} ms  "
+            f"p95 {part['latency_p95_s'] * 1e3:8.1f} ms  "
+            f"cpu/update {part['cpu_per_update_s'] * 1e3:8.1f} ms")
+    if args.output is not None:
+        report = {
+            'benchmark': 'live_plot',
+            'date': datetime.now().isoformat(timespec='seconds'),
+            'platform': platform.platform(),
+            'versions': package_versions(),
+            'parameters': {
+                'shape': args.shape, 'iterations': args.iterations,
+                'rate': args.rate, 'interval': args.interval,
+                'results': args.results,
+            },
+            'summary': summary,
+            'ticks': ticks,
+        }
+        args.output.write_text(json.dumps(report, indent=2))
+        print(f"\nwrote {args.output}")
+
+if __name__ == '__main__':
+    main()
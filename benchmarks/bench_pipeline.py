@@ -0,0 +1,199 @@
+"""
+Benchmark of the inspector pipeline on a synthetic QCoDeS database.
+
+Every hot path from browsing the database to plotting and exporting a run is
+timed on its own. The run view parts are timed inside a simulated NiceGUI
+user session, so they run with the same tab storage as in the browser.
+Results are written as JSON, pass a previous result file with --compare to
+print the change of every timing.
+
+Usage:
+    python benchmarks/bench_pipeline.py --runs 20 --shape 50 20 \
+        --iterations 100 --output bench.json --compare bench_previous.json
+"""
+from __future__ import annotations
+
+import os
+import re
+import sys
+import json
+import time
+import asyncio
+import argparse
+import platform
+import tempfile
+import statistics
+from pathlib import Path
+from datetime import datetime
+from importlib.metadata import version, PackageNotFoundError
+from importlib.util import find_spec
+from typing import Callable
+
+from synthetic_database import create_synthetic_database
+
+PACKAGES = ['arbok-inspector', 'nicegui', 'numpy', 'plotly', 'qcodes', 'xarray']
+
+def time_call(function: Callable, repeat: int) -> dict[str, float]:
+    """Call the function repeat times and return statistics of the durations"""
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        durations.append(time.perf_counter() - start)
+    return {
+        'repeat': repeat,
+        'min': min(durations),
+        'median': statistics.median(durations),
+        'mean': statistics.fmean(durations),
+        'max': max(durations),
+    }
+
+def bench_browser(db_path: Path, repeat: int) -> dict[str, dict]:
+    """Time the database queries of the day and run selectors"""
+    from arbok_inspector.state import inspector
+    from arbok_inspector.widgets.day_selector import get_qcodes_days
+    from arbok_inspector.widgets.run_selector import get_qcodes_runs_for_day
+
+    inspector.qcodes_database_path = db_path
+    inspector.database_type = 'qcodes'
+    days = get_qcodes_days(0)
+    last_day = days[-1][0]
+    return {
+        'get_qcodes_days': time_call(lambda: get_qcodes_days(0), repeat),
+        'get_qcodes_runs_for_day': time_call(
+            lambda: get_qcodes_runs_for_day(last_day, 0), repeat),
+    }
+
+async def bench_session(
+        db_path: Path, run_id: int, repeat: int) -> dict[str, dict]:
+    """
+    Time browsing the database and loading, reducing, plotting and exporting
+    a run in a simulated user session. The inspector is only imported inside
+    the session, since the simulation resets the globals of NiceGUI.
+    """
+    from nicegui.testing.user_simulation import user_simulation
+
+    sys.argv = ['arbok-inspector']
+    ### The user simulation is made for pytest, outside of it NiceGUI tries to
+    ### reset the storage of a real client when starting the simulation
+    os.environ.setdefault('PYTEST_CURRENT_TEST', 'bench_pipeline')
+    timings = {}
+    ### Not imported here, the pages have to be registered by the simulation
+    main_file = find_spec('arbok_inspector.main').origin
+    async with user_simulation(main_file=main_file) as user:
+        from nicegui import app
+        from arbok_inspector.classes.qcodes_run import QcodesRun
+        from arbok_inspector.widgets.build_xarray_grid import (
+            create_1d_plot, create_2d_figure
+        )
+        from arbok_inspector.classes.export_job import write_dataset, EXPORT_FORMATS
+        timings.update(bench_browser(db_path, repeat))
+        ### The pages ask the browser for its timezone, answer with UTC
+        user.javascript_rules[re.compile(r'(?s).*getTimezoneOffset')] = lambda _: 0
+        user.javascript_rules[re.compile(r'(?s)(?!.*getTimezoneOffset).*')] = lambda _: None
+        app.storage.general['result_keywords'] = ''
+        app.storage.general['avg_axis'] = 'iteration'
+        await user.open(f'/run/{run_id}')
+        ### The run is loaded in the background after the page connected
+        await user.should_see('Actions:', retries=200)
+        with user:
+            timings['QcodesRun.prepare_run'] = time_call(
+                lambda: QcodesRun(run_id, db_path).prepare_run(), repeat)
+            run = app.storage.tab['run']
+
+            def generate_cold_subset():
+                run.reduction_cache.invalidate()
+                run.generate_subset()
+
+            timings['BaseRun.generate_subset (cold)'] = time_call(
+                generate_cold_subset, repeat)
+            timings['BaseRun.generate_subset (cached)'] = time_call(
+                run.generate_subset, repeat)
+            subset = run.generate_subset()
+            y_dim = run.dim_axis_option['y-axis'].name
+            results_1d = {
+                name: subset[name].isel({y_dim: 0}) for name in run.plot_selection}
+            timings['create_1d_plot'] = time_call(
+                lambda: create_1d_plot(run, results_1d), repeat)
+            name = run.plot_selection[0]
+            timings['create_2d_figure'] = time_call(
+                lambda: create_2d_figure(name, subset[name], run), repeat)
+            with tempfile.TemporaryDirectory() as export_dir:
+                for export_format, options in EXPORT_FORMATS.items():
+                    file_path = Path(export_dir) / f"export{options['suffix']}"
+
+                    def export(export_format=export_format, file_path=file_path):
+                        file_path.unlink(missing_ok=True)
+                        write_dataset(run.full_data_set, file_path, export_format)
+
+                    timings[f'write_dataset ({export_format})'] = time_call(
+                        export, repeat)
+    return timings
+
+def package_versions() -> dict[str, str | None]:
+    """Versions of the packages the timings depend on"""
+    versions = {'python': platform.python_version()}
+    for package in PACKAGES:
+        try:
+            versions[package] = version(package)
+        except PackageNotFoundError:
+            versions[package] = None
+    return versions
+
+def print_timings(timings: dict[str, dict], previous: dict | None = None) -> None:
+    """Print the median timings and their change against a previous result"""
+    for name, timing in timings.items():
+        line = f"{name:34s} {timing['median'] * 1e3:10.2f} ms"
+        if previous and name in previous.get('timings', {}):
+            ratio = timing['median'] / previous['timings'][name]['median']
+            line += f"   {ratio:6.2f} x previous"
+        print(line)
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--runs', type=int, default=20)
+    parser.add_argument('--days', type=int, default=5)
+    parser.add_argument('--results', type=int, default=4)
+    parser.add_argument('--shape', type=int, nargs='+', default=[50, 20])
+    parser.add_argument('--iterations', type=int, default=100)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument(
+        '--database', type=Path, default=None,
+        help='Reuse this database instead of creating a temporary one')
+    parser.add_argument('--output', type=Path, default=None)
+    parser.add_argument('--compare', type=Path, default=None)
+    args = parser.parse_args()
+
+    parameters = {
+        'runs': args.runs, 'days': args.days, 'results': args.results,
+        'shape': args.shape, 'iterations': args.iterations, 'repeat': args.repeat,
+        'database': str(args.database) if args.database else None,
+    }
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = args.database
+        if db_path is None or not db_path.exists():
+            db_path = db_path or Path(tmp_dir) / 'benchmark.db'
+            start = time.perf_counter()
+            create_synthetic_database(
+                db_path, args.runs, args.days, args.results, tuple(args.shape),
+                args.iterations)
+            print(f"created {db_path} in {time.perf_counter() - start:.1f} s")
+        timings = asyncio.run(bench_session(db_path, 1, args.repeat))
+
+    report = {
+        'benchmark': 'pipeline',
+        'date': datetime.now().isoformat(timespec='seconds'),
+        'platform': platform.platform(),
+        'versions': package_versions(),
+        'parameters': parameters,
+        'timings': timings,
+    }
+    previous = json.loads(args.compare.read_text()) if args.compare else None
+    print()
+    print_timings(timings, previous)
+    if args.output is not None:
+        args.output.write_text(json.dumps(report, indent=2))
+        print(f"\nwrote {args.output}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+"""
+Simulator of a running measurement appending results to a QCoDeS database.
+
+A run with the given shape is created and one iteration (all sweep points of
+one repetition) is written per tick at the given rate, like a measurement
+averaging repeated shots. Every write is flushed to the database right away.
+Used on its own to watch a growing run in the inspector, or by
+`bench_live_plot.py` to measure the latency from write to plot.
+
+Usage:
+    python benchmarks/live_writer.py live.db --rate 2 --shape 50 20 \
+        --iterations 200
+"""
+from __future__ import annotations
+from typing import TYPE_CHECKING
+
+import time
+import argparse
+from pathlib import Path
+
+import numpy as np
+from qcodes.dataset import (
+    Measurement, initialise_or_create_database_at, load_or_create_experiment
+)
+from qcodes.parameters import Parameter
+
+from synthetic_database import SWEEPS, result_names
+
+if TYPE_CHECKING:
+    from multiprocessing.queues import Queue
+    from multiprocessing.synchronize import Event
+
+def write_live_run(
+        db_path: str | Path,
+        shape: tuple[int, ...] = (50, 20),
+        n_iterations: int = 200,
+        rate: float = 2.,
+        n_results: int = 2,
+        log_queue: Queue | None = None,
+        start_event: Event | None = None,
+        seed: int = 0
+        ) -> int:
+    """
+    Create a run and append one iteration per tick until all are written.
+    The first iteration is written right away, the others only after the
+    start event is set, e.g. once a client opened the run.
+
+    Args:
+        db_path (str | Path): QCoDeS database, created if it does not exist
+        shape (tuple[int, ...]): Sizes of the one to three sweep dims
+        n_iterations (int): Number of iterations to write
+        rate (float): Iterations written per second
+        n_results (int): Number of results, see `result_names`
+        log_queue (Queue | None): Receives ('run_id', run_id) after the run
+            was created, ('write', n_points, timestamp) after every flushed
+            write and ('done', n_points, timestamp) at the end
+        start_event (Event | None): Event to wait for after the first write
+        seed (int): Seed of the random data
+    Returns:
+        run_id (int): ID of the written run
+    """
+    initialise_or_create_database_at(db_path)
+    experiment = load_or_create_experiment('live', sample_name='synthetic')
+    rng = np.random.default_rng(seed)
+    iteration = Parameter('iteration', set_cmd=None)
+    sweeps = [
+        Parameter(name, unit=unit, set_cmd=None) for name, unit, _ in SWEEPS[:len(shape)]]
+    results = [
+        Parameter(name, unit='' if 'state' in name else 'V', get_cmd=None)
+        for name in result_names(n_results)]
+    grids = np.meshgrid(
+        *[np.linspace(0, span, n) for (_, _, span), n in zip(SWEEPS, shape)],
+        indexing = 'ij')
+    probability = 0.5 + 0.4 * np.cos(
+        2 * np.pi * sum(grid / grid.max() if grid.max() else grid for grid in grids))
+    measurement = Measurement(exp=experiment, name='live')
+    measurement.register_parameter(iteration)
+    for parameter in sweeps:
+        measurement.register_parameter(parameter)
+    for parameter in results:
+        measurement.register_parameter(parameter, setpoints=[iteration] + sweeps)
+    measurement.set_shapes(
+        {p.full_name: (n_iterations,) + tuple(shape) for p in results})
+    n_points = 0
+    with measurement.run() as datasaver:
+        if log_queue is not None:
+            log_queue.put(('run_id', datasaver.run_id))
+        next_tick = time.perf_counter()
+        for i in range(n_iterations):
+            values = []
+            for parameter in results:
+                if 'state' in parameter.name:
+                    data = (rng.random(probability.shape) < probability).astype(float)
+                else:
+                    data = probability + 0.2 * rng.standard_normal(probability.shape)
+                values.append((parameter, data.ravel()))
+            datasaver.add_result(
+                (iteration, np.full(probability.size, i)),
+                *[(p, grid.ravel()) for p, grid in zip(sweeps, grids)],
+                *values)
+            datasaver.flush_data_to_database(block=True)
+            n_points += probability.size
+            if log_queue is not None:
+                log_queue.put(('write', n_points, time.time()))
+            if i == 0 and start_event is not None:
+                start_event.wait()
+                next_tick = time.perf_counter()
+            next_tick += 1 / rate
+            time.sleep(max(0., next_tick - time.perf_counter()))
+        run_id = datasaver.run_id
+    if log_queue is not None:
+        log_queue.put(('done', n_points, time.time()))
+    return run_id
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('path', type=Path)
+    parser.add_argument('--shape', type=int, nargs='+', default=[50, 20])
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--rate', type=float, default=2.)
+    parser.add_argument('--results', type=int, default=2)
+    args = parser.parse_args()
+    start = time.perf_counter()
+    run_id = write_live_run(
+        args.path, tuple(args.shape), args.iterations, args.rate, args.results)
+    print(f"wrote run {run_id} in {time.perf_counter() - start:.1f} s")
+
+if __name__ == '__main__':
+    main()
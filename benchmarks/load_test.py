@@ -0,0 +1,308 @@
+"""
+Load test of one shared inspector server with many concurrent browser tabs.
+
+Every tab is a simulated NiceGUI user with its own tab storage, connected to
+the same server. All tabs run the same session concurrently: open the
+database browser, click through the days, open a run and scrub the slider of
+a selected dim. The shared `inspector` state, the general storage passing
+the settings from the browser to the run page and the tab storages are
+exercised the same way as by several users in the lab. For every number of
+tabs the throughput, the latency percentiles of every action and the peak
+memory of the server process are reported. After its session every tab
+checks that its storage still holds its own run.
+
+Usage:
+    python benchmarks/load_test.py --tabs 1 2 4 8 --runs 10 \
+        --shape 20 10 5 --iterations 50 --output load.json
+"""
+from __future__ import annotations
+
+import os
+import re
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import platform
+import resource
+import tempfile
+from pathlib import Path
+from datetime import datetime
+from collections import defaultdict
+from importlib.util import find_spec
+
+import numpy as np
+
+from bench_pipeline import package_versions
+from synthetic_database import create_synthetic_database
+
+ACTIONS = ['open_browser', 'select_day', 'open_run', 'scrub_slider']
+
+def current_rss() -> int:
+    """Resident memory of this process in bytes, the peak if not available"""
+    try:
+        with open('/proc/self/statm') as file:
+            return int(file.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return peak_rss()
+
+def peak_rss() -> int:
+    """Peak resident memory of this process in bytes"""
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    ### Linux reports kilobytes, macOS bytes
+    return max_rss if sys.platform == 'darwin' else max_rss * 1024
+
+async def sample_memory(samples: list[int], period: float = 0.05) -> None:
+    """Append the resident memory to samples until cancelled"""
+    while True:
+        samples.append(current_rss())
+        await asyncio.sleep(period)
+
+def new_user():
+    """Simulated user on its own HTTP client, i.e. a new browser tab"""
+    import httpx
+    from nicegui import core
+    from nicegui.testing.user import User
+
+    user = User(httpx.AsyncClient(
+        transport=httpx.ASGITransport(core.app), base_url='http://test'))
+    ### The pages ask the browser for its timezone, answer with UTC
+    user.javascript_rules[re.compile(r'(?s).*getTimezoneOffset')] = lambda _: 0
+    ### Only awaited calls wait for an answer, others have no request ID
+    user.javascript_rules[re.compile(r'(?s).*new Promise')] = lambda _: None
+    return user
+
+async def simulate_tab(
+        tab_index: int,
+        run_id: int,
+        days: list[str],
+        n_scrubs: int,
+        think_time: float,
+        latencies: dict[str, list[float]],
+        errors: list[str]
+        ) -> None:
+    """
+    Browse the days, open a run and scrub its slider like a user in one tab.
+
+    Args:
+        tab_index (int): Index of the tab, seeds its random think times
+        run_id (int): Run to open
+        days (list[str]): Days to click through in the day selector
+        n_scrubs (int): Number of slider positions to show
+        think_time (float): Mean pause between two actions in seconds
+        latencies (dict[str, list[float]]): Receives the duration of every
+            action by its name
+        errors (list[str]): Receives a description of every failed action
+    """
+    from nicegui import app
+    from arbok_inspector.widgets.day_selector import trigger_update_run_selector
+    from arbok_inspector.pages.run_view import update_value_from_dim_slider
+
+    rng = random.Random(tab_index)
+    user = new_user()
+
+    async def timed(name: str, action) -> bool:
+        await asyncio.sleep(rng.expovariate(1 / think_time) if think_time else 0)
+        start = time.perf_counter()
+        try:
+            await action()
+        except Exception as e:
+            errors.append(f"tab {tab_index} {name}: {type(e).__name__}: {e}")
+            return False
+        latencies[name].append(time.perf_counter() - start)
+        return True
+
+    async def open_browser():
+        await user.open('/browser')
+        await user.should_see('Reload Days', retries=200)
+
+    async def select_day(day: str):
+        with user:
+            await trigger_update_run_selector(day)
+
+    async def open_run():
+        ### Like a double click in the run grid, without the navigation to a
+        ### new tab, which the simulation does for the last active user only
+        with user:
+            app.storage.general['avg_axis'] = app.storage.tab['avg_axis_input'].value
+            app.storage.general['result_keywords'] = \
+                app.storage.tab['result_keyword_input'].value
+        await user.open(f'/run/{run_id}')
+        ### The run is loaded in the background after the page connected
+        await user.should_see('Actions:', retries=200)
+
+    if not await timed('open_browser', open_browser):
+        return
+    for day in days:
+        await timed('select_day', lambda day=day: select_day(day))
+    if not await timed('open_run', open_run):
+        return
+    with user:
+        run = app.storage.tab['run']
+    dims = [dim for dim in run.dim_axis_option['select_value'] if dim.slider is not None]
+    if not dims:
+        errors.append(f"tab {tab_index}: run {run_id} has no dim with a slider")
+        return
+    dim = dims[0]
+    size = run.full_data_set.sizes[dim.name]
+
+    async def scrub(index: int):
+        with user:
+            ### Same as dragging the slider: on_change, then the throttled update
+            dim.slider.value = index
+            update_value_from_dim_slider(dim.select_label, dim.slider, dim)
+
+    for step in range(n_scrubs):
+        await timed('scrub_slider', lambda step=step: scrub((step + 1) % size))
+    with user:
+        shown_run = app.storage.tab['run']
+    if shown_run.run_id != run_id or dim.select_index != n_scrubs % size:
+        errors.append(
+            f"tab {tab_index}: storage shows run {shown_run.run_id} at index "
+            f"{dim.select_index}, expected run {run_id} at {n_scrubs % size}")
+
+async def run_load_test(
+        db_path: Path,
+        tab_counts: list[int],
+        n_runs: int,
+        n_days: int,
+        n_scrubs: int,
+        think_time: float
+        ) -> list[dict]:
+    """
+    Run the tab sessions for every number of concurrent tabs on one server.
+
+    Returns:
+        levels (list[dict]): Throughput, latency percentiles by action, peak
+            memory and errors for every number of tabs
+    """
+    from nicegui.testing.user_simulation import user_simulation
+
+    sys.argv = ['arbok-inspector']
+    ### The user simulation is made for pytest, outside of it NiceGUI tries to
+    ### reset the storage of a real client when starting the simulation
+    os.environ.setdefault('PYTEST_CURRENT_TEST', 'load_test')
+    levels = []
+    main_file = find_spec('arbok_inspector.main').origin
+    async with user_simulation(main_file=main_file):
+        from nicegui import app, Client
+        from arbok_inspector.state import inspector
+        from arbok_inspector.widgets.day_selector import get_qcodes_days
+
+        inspector.qcodes_database_path = db_path
+        inspector.database_type = 'qcodes'
+        app.storage.general['timezone'] = 0
+        days = [day for day, _ in get_qcodes_days(0)][-n_days:]
+        for n_tabs in tab_counts:
+            latencies: dict[str, list[float]] = defaultdict(list)
+            errors: list[str] = []
+            samples: list[int] = []
+            sampler = asyncio.create_task(sample_memory(samples))
+            rss_before = current_rss()
+            start = time.perf_counter()
+            await asyncio.gather(*[
+                simulate_tab(
+                    i, i % n_runs + 1, days, n_scrubs, think_time, latencies, errors)
+                for i in range(n_tabs)])
+            duration = time.perf_counter() - start
+            sampler.cancel()
+            samples.append(current_rss())
+            n_actions = sum(len(values) for values in latencies.values())
+            levels.append({
+                'tabs': n_tabs,
+                'duration_s': duration,
+                'actions': n_actions,
+                'throughput_per_s': n_actions / duration,
+                'latency_s': {
+                    name: latency_statistics(latencies[name])
+                    for name in ACTIONS if latencies[name]},
+                'rss_before_mb': rss_before / 1024**2,
+                'rss_peak_mb': max(samples) / 1024**2,
+                'clients': len(Client.instances),
+                'errors': errors,
+            })
+            print_level(levels[-1])
+            for client in list(Client.instances.values()):
+                client.delete()
+    return levels
+
+def latency_statistics(values: list[float]) -> dict[str, float]:
+    """Count and percentiles of the latencies of one action"""
+    return {
+        'count': len(values),
+        'median': float(np.percentile(values, 50)),
+        'p95': float(np.percentile(values, 95)),
+        'p99': float(np.percentile(values, 99)),
+        'max': max(values),
+    }
+
+def print_level(level: dict) -> None:
+    """Print the summary of one number of concurrent tabs"""
+    print(
+        f"\n{level['tabs']:3d} tabs: {level['throughput_per_s']:7.1f} actions/s, "
+        f"peak RSS {level['rss_peak_mb']:.0f} MB "
+        f"(+{level['rss_peak_mb'] - level['rss_before_mb']:.0f} MB), "
+        f"{len(level['errors'])} errors")
+    for name, stats in level['latency_s'].items():
+        print(
+            f"    {name:14s} median {stats['median'] * 1e3:8.1f} ms  "
+            f"p95 {stats['p95'] * 1e3:8.1f} ms  p99 {stats['p99'] * 1e3:8.1f} ms  "
+            f"max {stats['max'] * 1e3:8.1f} ms")
+    for error in level['errors'][:5]:
+        print(f"    {error}")
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--tabs', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--days', type=int, default=3)
+    parser.add_argument('--results', type=int, default=2)
+    parser.add_argument('--shape', type=int, nargs='+', default=[20, 10, 5])
+    parser.add_argument('--iterations', type=int, default=50)
+    parser.add_argument('--scrubs', type=int, default=20)
+    parser.add_argument(
+        '--think-time', type=float, default=0.05,
+        help='Mean pause between two actions of a tab in seconds')
+    parser.add_argument(
+        '--database', type=Path, default=None,
+        help='Reuse this database instead of creating a temporary one')
+    parser.add_argument('--output', type=Path, default=None)
+    args = parser.parse_args()
+    if len(args.shape) < 3:
+        parser.error('The slider needs a third sweep dim, e.g. --shape 20 10 5')
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = args.database
+        if db_path is None or not db_path.exists():
+            db_path = db_path or Path(tmp_dir) / 'load_test.db'
+            start = time.perf_counter()
+            create_synthetic_database(
+                db_path, args.runs, args.days, args.results, tuple(args.shape),
+                args.iterations)
+            print(f"created {db_path} in {time.perf_counter() - start:.1f} s")
+        levels = asyncio.run(run_load_test(
+            db_path, args.tabs, args.runs, args.days, args.scrubs, args.think_time))
+
+    if args.output is not None:
+        report = {
+            'benchmark': 'load_test',
+            'date': datetime.now().isoformat(timespec='seconds'),
+            'platform': platform.platform(),
+            'versions': package_versions(),
+            'parameters': {
+                'tabs': args.tabs, 'runs': args.runs, 'days': args.days,
+                'results': args.results, 'shape': args.shape,
+                'iterations': args.iterations, 'scrubs': args.scrubs,
+                'think_time': args.think_time,
+            },
+            'levels': levels,
+        }
+        args.output.write_text(json.dumps(report, indent=2))
+        print(f"\nwrote {args.output}")
+    if any(level['errors'] for level in levels):
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
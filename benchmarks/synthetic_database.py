@@ -0,0 +1,133 @@
+"""
+Generator of synthetic QCoDeS databases for benchmarks.
+
+Every run sweeps an 'iteration' dim over repeated shots and up to three sweep
+dims. Half of the results are single shot qubit states (0/1), the others are
+noisy Rabi-like IQ values. Run timestamps are spread evenly over the given
+number of days, ending today.
+
+Usage:
+    python benchmarks/synthetic_database.py bench.db --runs 20 --days 5 \
+        --results 4 --shape 50 20 --iterations 100
+"""
+from __future__ import annotations
+
+import time
+import sqlite3
+import argparse
+from pathlib import Path
+
+import numpy as np
+from qcodes.dataset import (
+    Measurement, initialise_or_create_database_at, load_or_create_experiment
+)
+from qcodes.parameters import Parameter
+
+SWEEPS = [('amplitude', 'V', 0.5), ('detuning', 'Hz', 2e7), ('time', 's', 2e-6)]
+SECONDS_PER_DAY = 24 * 3600
+
+def result_names(n_results: int) -> list[str]:
+    """Names of the results, alternating between qubit states and IQ values"""
+    names = []
+    for i in range(n_results):
+        qubit = i // 2 + 1
+        names.append(f'Q{qubit}__state' if i % 2 == 0 else f'Q{qubit}__I')
+    return names
+
+def create_synthetic_database(
+        path: str | Path,
+        n_runs: int = 20,
+        n_days: int = 5,
+        n_results: int = 4,
+        shape: tuple[int, ...] = (50, 20),
+        n_iterations: int = 100,
+        seed: int = 0
+        ) -> Path:
+    """
+    Create a QCoDeS database with synthetic runs. An existing file is replaced.
+
+    Args:
+        path (str | Path): Path of the database file
+        n_runs (int): Number of runs
+        n_days (int): Number of days the runs are spread over
+        n_results (int): Number of results per run
+        shape (tuple[int, ...]): Sizes of the one to three sweep dims
+        n_iterations (int): Number of repeated shots per sweep point
+        seed (int): Seed of the random data
+    Returns:
+        path (Path): Path of the created database
+    """
+    if not 1 <= len(shape) <= len(SWEEPS):
+        raise ValueError(f"Shape must have 1 to {len(SWEEPS)} sweep dims. Is {shape}")
+    path = Path(path)
+    for file in path.parent.glob(f'{path.name}*'):
+        file.unlink()
+    initialise_or_create_database_at(path)
+    experiment = load_or_create_experiment('benchmark', sample_name='synthetic')
+    rng = np.random.default_rng(seed)
+    iteration = Parameter('iteration', set_cmd=None)
+    sweeps = [
+        Parameter(name, unit=unit, set_cmd=None) for name, unit, _ in SWEEPS[:len(shape)]]
+    setpoints = [iteration] + sweeps
+    full_shape = (n_iterations,) + tuple(shape)
+    results = [
+        Parameter(name, unit='' if 'state' in name else 'V', get_cmd=None)
+        for name in result_names(n_results)]
+    grids = np.meshgrid(
+        np.arange(n_iterations),
+        *[np.linspace(0, span, n) for (_, _, span), n in zip(SWEEPS, shape)],
+        indexing = 'ij')
+    phase = sum(grid / grid.max() if grid.max() else grid for grid in grids[1:])
+    timestamps = np.linspace(
+        time.time() - (n_days - 1) * SECONDS_PER_DAY, time.time(), n_runs)
+    for run_index in range(n_runs):
+        measurement = Measurement(exp=experiment, name=f'synthetic_{run_index}')
+        for parameter in setpoints:
+            measurement.register_parameter(parameter)
+        for parameter in results:
+            measurement.register_parameter(parameter, setpoints=setpoints)
+        measurement.set_shapes({p.full_name: full_shape for p in results})
+        with measurement.run() as datasaver:
+            probability = 0.5 + 0.4 * np.cos(2 * np.pi * phase + run_index)
+            values = []
+            for parameter in results:
+                if 'state' in parameter.name:
+                    data = (rng.random(full_shape) < probability).astype(float)
+                else:
+                    data = probability + 0.2 * rng.standard_normal(full_shape)
+                values.append((parameter, data.ravel()))
+            datasaver.add_result(
+                *[(p, grid.ravel()) for p, grid in zip(setpoints, grids)], *values)
+        run_id = datasaver.run_id
+        _set_run_timestamp(path, run_id, float(timestamps[run_index]))
+    return path
+
+def _set_run_timestamp(path: Path, run_id: int, timestamp: float) -> None:
+    """Move a run to the given time, QCoDeS always stamps runs with now"""
+    conn = sqlite3.connect(path)
+    try:
+        conn.execute(
+            "UPDATE runs SET run_timestamp = ?, completed_timestamp = ? "
+            "WHERE run_id = ?", (timestamp, timestamp + 1, run_id))
+        conn.commit()
+    finally:
+        conn.close()
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('path', type=Path)
+    parser.add_argument('--runs', type=int, default=20)
+    parser.add_argument('--days', type=int, default=5)
+    parser.add_argument('--results', type=int, default=4)
+    parser.add_argument('--shape', type=int, nargs='+', default=[50, 20])
+    parser.add_argument('--iterations', type=int, default=100)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    start = time.perf_counter()
+    create_synthetic_database(
+        args.path, args.runs, args.days, args.results, tuple(args.shape),
+        args.iterations, args.seed)
+    print(f"created {args.path} in {time.perf_counter() - start:.1f} s")
+
+if __name__ == '__main__':
+    main()
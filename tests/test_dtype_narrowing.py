@@ -0,0 +1,27 @@
+"""Tests narrowing float results of datasets holding bit-packed results"""
+import numpy as np
+import xarray as xr
+
+from arbok_inspector.classes.packed_boolean_array import (
+    pack_boolean_variables, get_packed_array
+)
+from arbok_inspector.helpers.dtype_narrowing import narrow_float_variables
+
+def test_narrowing_keeps_packed_variables_packed():
+    rng = np.random.default_rng(0)
+    states = rng.integers(0, 2, size=(100, 60, 20)).astype(float)
+    signal = rng.normal(size=(100, 60, 20))
+    dataset = xr.Dataset({
+        'state': (('iteration', 'x', 'y'), states),
+        'signal': (('iteration', 'x', 'y'), signal),
+    })
+    packed, packing_saved = pack_boolean_variables(dataset)
+    narrowed, narrowing_saved = narrow_float_variables(packed)
+
+    assert get_packed_array(narrowed['state']) is not None
+    assert narrowed['state'].dtype == np.float64
+    np.testing.assert_array_equal(narrowed['state'].values, states)
+    assert narrowed['signal'].dtype == np.float32
+    assert packing_saved == states.nbytes - get_packed_array(narrowed['state']).nbytes
+    assert narrowing_saved == signal.nbytes // 2
+    assert packing_saved + narrowing_saved < dataset.nbytes